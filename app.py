@@ -1,10 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for
-from database import DatabaseManager
-from gpt_processor import GPTProcessor
-from text_preprocessing import TextPreprocessor
-from neo4j_manager import Neo4jManager
+from startup import StartupReport, LazyComponent
+startup_report = StartupReport()
+
+with startup_report.timed_import('flask'):
+    from flask import Flask, Response, render_template, request, url_for, jsonify, abort, g
+with startup_report.timed_import('database'):
+    from database import DatabaseManager
+with startup_report.timed_import('extraction_backend'):
+    from extraction_backend import create_extraction_backend
+with startup_report.timed_import('text_preprocessing'):
+    from text_preprocessing import TextPreprocessor
+with startup_report.timed_import('neo4j_manager'):
+    from neo4j_manager import Neo4jManager, GraphSyncScheduler, GRAPH_FILTERS
+with startup_report.timed_import('memory_graph'):
+    from memory_graph import MemoryGraph
+from pipeline import ReviewPipeline
+from job_queue import JobQueue
+from extraction_cache import ExtractionCache
+from graph_cache import GraphCache
+from metrics import PipelineMetrics
+from profiling import RequestProfiler
+from entity_canonicalizer import EntityCanonicalizer
+with startup_report.timed_import('graph_analytics'):
+    from graph_analytics import GraphAnalytics, AnalyticsScheduler
+import json
 import os
-import pandas as pd
+import time
 
 app = Flask(__name__)
 
@@ -13,46 +33,235 @@ DB_PATH = 'amazon_reviews.db'
 NEO4J_URI = "neo4j+s://67d73379.databases.neo4j.io"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = ""
-OPENAI_API_KEY = ''
+# 'neo4j' for the remote graph, 'memory' for the in-process MemoryGraph (no external service)
+GRAPH_BACKEND = os.getenv('GRAPH_BACKEND', 'neo4j')
+# Set to '1' to merge near-duplicate entity names at ingest (see entity_canonicalizer.py)
+CANONICALIZE_ENTITIES = os.getenv('CANONICALIZE_ENTITIES', '0') == '1'
+# How often the degree/PageRank/community tables are refreshed; 0 disables the scheduler
+ANALYTICS_REFRESH_SECONDS = float(os.getenv('ANALYTICS_REFRESH_SECONDS', '300'))
+# How often the graph picks up rows and rewrites made outside this process; 0 disables the scheduler
+GRAPH_SYNC_SECONDS = float(os.getenv('GRAPH_SYNC_SECONDS', '60'))
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+# 'openai' for GPT-4, 'local' for the deterministic offline stand-in used in load tests
+EXTRACTION_BACKEND = os.getenv('EXTRACTION_BACKEND', 'openai')
+LOCAL_EXTRACTION_LATENCY = float(os.getenv('LOCAL_EXTRACTION_LATENCY', '0'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+# Set to '' to keep jobs in memory only
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', DB_PATH)
+# Set to '' to disable the GPT extraction cache
+EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', 'extraction_cache.db')
+# Memory budget for cached graph reads; set to 0 to disable the cache
+GRAPH_CACHE_MAX_BYTES = int(os.getenv('GRAPH_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Endpoints (e.g. 'show_graph,index') whose requests may be profiled with an X-Profile header or
+# ?profile=1; empty disables profiling entirely. With PROFILE_TOKEN set, the header must equal it.
+PROFILE_ENDPOINTS = [name for name in os.getenv('PROFILE_ENDPOINTS', '').split(',') if name]
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN') or None
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_FORMAT = os.getenv('PROFILE_FORMAT', 'collapsed')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+GRAPH_PAGE_SIZE = 100
+GRAPH_MAX_PAGE_SIZE = 1000
+
+def build_extraction_backend():
+    if EXTRACTION_BACKEND == 'openai':
+        return create_extraction_backend('openai', api_key=OPENAI_API_KEY,
+                                         cache=extraction_cache.resolve() if extraction_cache else None)
+    return create_extraction_backend(EXTRACTION_BACKEND, latency=LOCAL_EXTRACTION_LATENCY)
+
+def build_graph_analytics():
+    # The analytics tables are computed from the triples table the database component creates
+    db_manager.resolve()
+    return GraphAnalytics(DB_PATH)
+
+def build_graph_store():
+    if GRAPH_BACKEND == 'neo4j':
+        return Neo4jManager(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, graph_cache=graph_cache)
+    if GRAPH_BACKEND == 'memory':
+        # The database component creates the processed_reviews view the graph loads from
+        db_manager.resolve()
+        return MemoryGraph(DB_PATH, graph_cache=graph_cache)
+    raise ValueError(f"Unknown graph backend: {GRAPH_BACKEND!r}")
+
+# Initialize components. Each one is built on first use, so importing the app never
+# opens a database, loads NLTK data or creates the OpenAI and Neo4j clients.
+db_manager = LazyComponent('database', lambda: DatabaseManager(DB_PATH), startup_report)
+extraction_cache = LazyComponent('extraction_cache', lambda: ExtractionCache(EXTRACTION_CACHE_PATH), startup_report) if EXTRACTION_CACHE_PATH else None
+extraction_backend = LazyComponent('extraction_backend', build_extraction_backend, startup_report)
+text_preprocessor = LazyComponent('text_preprocessor', TextPreprocessor, startup_report)
+canonicalizer = LazyComponent('canonicalizer', lambda: EntityCanonicalizer(DB_PATH), startup_report) if CANONICALIZE_ENTITIES else None
+graph_cache = GraphCache(max_bytes=GRAPH_CACHE_MAX_BYTES) if GRAPH_CACHE_MAX_BYTES else None
+graph_store = LazyComponent('graph', build_graph_store, startup_report)
+pipeline_metrics = PipelineMetrics()
+review_pipeline = ReviewPipeline(text_preprocessor, extraction_backend, db_manager, graph_store, DB_PATH, canonicalizer,
+                                 metrics=pipeline_metrics)
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_ENDPOINTS, PROFILE_TOKEN, PROFILE_INTERVAL_MS / 1000, PROFILE_FORMAT).install(app)
+
+def process_review(review, report_progress=None, resume_stage=None):
+    # A profiled POST / also profiles its ingest job, where the pipeline actually runs
+    if review.pop('profile', False):
+        with request_profiler.profile('ingest_job'):
+            return review_pipeline.process(review, report_progress, resume_stage)
+    return review_pipeline.process(review, report_progress, resume_stage)
 
-# Initialize components
-db_manager = DatabaseManager(DB_PATH)
-gpt_processor = GPTProcessor(OPENAI_API_KEY)
-text_preprocessor = TextPreprocessor()
-neo4j_manager = Neo4jManager(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+job_queue = LazyComponent('job_queue', lambda: JobQueue(process_review, num_workers=INGEST_WORKERS, db_path=JOBS_DB_PATH or None), startup_report)
+graph_analytics = LazyComponent('graph_analytics', build_graph_analytics, startup_report)
+analytics_scheduler = AnalyticsScheduler(graph_analytics, ANALYTICS_REFRESH_SECONDS) if ANALYTICS_REFRESH_SECONDS > 0 else None
+graph_sync_scheduler = GraphSyncScheduler(graph_store, DB_PATH, GRAPH_SYNC_SECONDS) if GRAPH_SYNC_SECONDS > 0 else None
+startup_report.mark_ready()
+
+@app.before_request
+def start_ingest_workers():
+    # Started on first request so the debug reloader's parent process never runs jobs
+    job_queue.start()
+    if analytics_scheduler is not None:
+        analytics_scheduler.start()
+    if graph_sync_scheduler is not None:
+        graph_sync_scheduler.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are timed until their first byte is ready, not until the body is sent
+    start = g.get('request_start')
+    if start is not None:
+        pipeline_metrics.observe_request(request.endpoint, request.method, response.status_code, time.perf_counter() - start)
+    return response
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         # Get input from form
-        review_text = request.form['review_text']
-        user_id = request.form['user_id']
-        review_rating = request.form['review_rating']
-        brand = request.form['brand']
-        category = request.form['category']
-        sub_category = request.form['sub_category']
+        review = {
+            'review_text': request.form['review_text'],
+            'user_id': request.form['user_id'],
+            'review_rating': request.form['review_rating'],
+            'brand': request.form['brand'],
+            'category': request.form['category'],
+            'sub_category': request.form['sub_category'],
+        }
+        if 'index' in request_profiler.allowed_endpoints and request_profiler.requested(request.headers, request.args):
+            review['profile'] = True
 
-        # Preprocess text
-        cleaned_text = text_preprocessor.preprocess(review_text)
+        # Preprocessing, GPT extraction, storage and the graph sync run on the ingestion workers
+        job_id = job_queue.submit(review)
+        status_url = url_for('job_status', job_id=job_id)
+        return jsonify({'job_id': job_id, 'status_url': status_url}), 202, {'Location': status_url}
 
-        # Process with GPT and store in DB
-        entities_dict = gpt_processor.extract_entities(cleaned_text)
-        print("Entities Dictionary:- \n",entities_dict)
-        entities_df = gpt_processor.prepare_dataframe(entities_dict, user_id, review_rating, brand, category, sub_category)
-        db_manager.insert_data(cleaned_text, entities_df)
+    return render_template('index.html')
 
-        # Load data to Neo4j
-        neo4j_manager.load_data_from_sqlite(db_path=DB_PATH)
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
 
-        return redirect(url_for('show_graph'))
+@app.route('/cache/extraction')
+def extraction_cache_stats():
+    if extraction_cache is None:
+        abort(404)
+    return jsonify(extraction_cache.stats())
 
-    return render_template('index.html')
+@app.route('/cache/graph')
+def graph_cache_stats():
+    if graph_cache is None:
+        abort(404)
+    return jsonify(graph_cache.stats())
+
+@app.route('/analytics/status')
+def analytics_status():
+    return jsonify(graph_analytics.last_run())
+
+@app.route('/analytics/top-entities')
+def analytics_top_entities():
+    try:
+        limit = int(request.args.get('limit', 20))
+        rows = graph_analytics.top_entities(
+            brand=request.args.get('brand'), sub_category=request.args.get('sub_category'),
+            sentiment=request.args.get('sentiment'), entity_type=request.args.get('type'),
+            order_by=request.args.get('order_by', 'pagerank'), limit=limit,
+        )
+    except ValueError as e:
+        abort(400, str(e))
+    return jsonify(rows)
+
+@app.route('/analytics/communities')
+def analytics_communities():
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        abort(400, "limit must be an integer")
+    return jsonify(graph_analytics.communities(limit=limit))
+
+@app.route('/analytics/entities/<path:name>')
+def analytics_entity(name):
+    metrics = graph_analytics.entity(name)
+    if metrics is None:
+        abort(404)
+    return jsonify(metrics)
+
+@app.route('/metrics')
+def metrics():
+    return Response(pipeline_metrics.render(), content_type=pipeline_metrics.content_type)
+
+@app.route('/startup')
+def startup_timings():
+    return jsonify(startup_report.as_dict())
+
+def graph_query_args(default_limit=GRAPH_PAGE_SIZE):
+    """
+    Read the keyset cursor (after), page size (limit) and GRAPH_FILTERS from the
+    query string. Empty filter values are ignored.
+    """
+    try:
+        after = int(request.args.get('after', 0))
+        limit = request.args.get('limit', default_limit)
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        abort(400, "after and limit must be integers")
+    if limit is not None and not 1 <= limit <= GRAPH_MAX_PAGE_SIZE:
+        abort(400, f"limit must be between 1 and {GRAPH_MAX_PAGE_SIZE}")
+    filters = {name: request.args[name] for name in GRAPH_FILTERS if request.args.get(name)}
+    return after, limit, filters
+
+def next_page_url(endpoint, cursor, limit, filters):
+    if cursor is None:
+        return None
+    return url_for(endpoint, after=cursor, limit=limit, **filters)
+
+@app.route('/api/graph')
+def graph_api():
+    after, limit, filters = graph_query_args()
+    with pipeline_metrics.stage('graph_retrieval'):
+        page = graph_store.query_graph(after=after, limit=limit, **filters)
+    page['next'] = next_page_url('graph_api', page['next_cursor'], limit, filters)
+    return jsonify(page)
+
+@app.route('/graph/stream')
+def graph_stream():
+    # One JSON object per line, written as records arrive from the graph; no limit by default
+    after, limit, filters = graph_query_args(default_limit=None)
+    return Response(stream_records(graph_store.stream_graph(after=after, limit=limit, **filters)),
+                    mimetype='application/x-ndjson')
+
+def stream_records(records):
+    # Times the whole stream, from the query to the last record written
+    with pipeline_metrics.stage('graph_retrieval'):
+        for record in records:
+            yield json.dumps(record) + '\n'
 
 @app.route('/graph')
 def show_graph():
-    # Retrieve graph data from Neo4j
-    graph_data = neo4j_manager.retrieve_graph_data()
-    return render_template('graph.html', graph_data=graph_data)
+    # Retrieve one page of graph data
+    after, limit, filters = graph_query_args()
+    with pipeline_metrics.stage('graph_retrieval'):
+        page = graph_store.query_graph(after=after, limit=limit, **filters)
+    next_url = next_page_url('show_graph', page['next_cursor'], limit, filters)
+    return render_template('graph.html', graph_data=page['edges'], filters=filters, filter_names=list(GRAPH_FILTERS),
+                           limit=limit, next_url=next_url)
 
 if __name__ == "__main__":
     app.run(debug=True)
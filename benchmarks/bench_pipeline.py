@@ -0,0 +1,386 @@
+"""
+End-to-end benchmark of the ingestion and query pipeline on synthetic review
+corpora, fully offline: LocalExtractionBackend stands in for OpenAI and an
+in-process driver (StandInNeo4jDriver) stands in for Neo4j.
+
+For every scale a corpus shaped like the sample CSV (same columns, brands,
+categories, rating mix, vocabulary and review lengths) is generated chunk by
+chunk and pushed through the stages
+
+    preprocess          TextPreprocessor.preprocess_batch, per chunk
+    extract             LocalExtractionBackend.extract_entities_with_usage, per review
+    prepare_dataframe   ExtractionBackend.prepare_dataframe, per review
+    insert              DatabaseManager.insert_many, per chunk
+    neo4j_load          Neo4jManager.load_data_from_sqlite, per UNWIND batch
+    retrieve_graph_data Neo4jManager.retrieve_graph_data, per call
+
+and the throughput, p50/p99 latency and peak RSS of each stage are written to a
+JSON file. Compare two runs (e.g. from two commits) with compare_benchmarks.py.
+
+    python benchmarks/bench_pipeline.py --scales 1k,100k --output before.json
+    python benchmarks/bench_pipeline.py --scales 1k,100k,1m --output after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+from extraction_backend import LocalExtractionBackend
+from neo4j_manager import Neo4jManager
+from text_preprocessing import TextPreprocessor, ensure_nltk_data
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(REPO_ROOT, 'amazon_com-product_reviews__20200101_20200331_sample.csv')
+STAGES = ['preprocess', 'extract', 'prepare_dataframe', 'insert', 'neo4j_load', 'retrieve_graph_data']
+SCALE_SUFFIXES = {'k': 1000, 'm': 1000000}
+WORD_PATTERN = re.compile(r"[A-Za-z']+")
+
+
+def parse_scale(value):
+    value = value.strip().lower()
+    if value[-1:] in SCALE_SUFFIXES:
+        return int(float(value[:-1]) * SCALE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class CorpusModel:
+    """
+    Column value distributions of the sample CSV, used to generate any number of
+    reviews that look like it. Generation is deterministic for a given seed and
+    chunk index, so every run benchmarks the same corpus.
+    """
+    def __init__(self, csv_path):
+        df = pd.read_csv(csv_path, usecols=['Review Title', 'Review Content', 'Review Rating', 'User Id', 'Brand',
+                                            'Category', 'Sub Category'], dtype=str)
+        self.scopes = list(df[['Brand', 'Category', 'Sub Category']].fillna('Unknown').itertuples(index=False, name=None))
+        self.ratings = pd.to_numeric(df['Review Rating'], errors='coerce').dropna().astype(int).tolist() or [5]
+        counts = Counter(word for text in df['Review Content'].fillna('') for word in WORD_PATTERN.findall(text))
+        self.words = list(counts)
+        self.weights = list(counts.values())
+        self.lengths = [len(WORD_PATTERN.findall(text)) for text in df['Review Content'].fillna('')] or [40]
+        self.title_words = [word for title in df['Review Title'].fillna('') for word in WORD_PATTERN.findall(title)] or ['Review']
+
+    def chunk(self, seed, index, start, size):
+        rng = random.Random(f"{seed}:{index}")
+        reviews = []
+        for i in range(start, start + size):
+            brand, category, sub_category = rng.choice(self.scopes)
+            words = rng.choices(self.words, weights=self.weights, k=max(1, rng.choice(self.lengths)))
+            reviews.append({
+                'Uniq Id': f"synthetic-{i}",
+                'Review Title': ' '.join(rng.choices(self.title_words, k=rng.randint(1, 5))),
+                'Review Content': ' '.join(words) + '.',
+                'Review Rating': rng.choice(self.ratings),
+                'User Id': f"user-{rng.randrange(max(1, (start + size) // 3))}",
+                'Brand': brand,
+                'Category': category,
+                'Sub Category': sub_category,
+            })
+        return reviews
+
+
+class _StandInSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute_write(self, work, *args):
+        return work(self, *args)
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.run(query, dict(parameters or {}, **kwargs))
+
+
+class _StandInResult:
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        return None
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+
+class StandInNeo4jDriver:
+    """
+    In-process replacement for the neo4j driver, with the MERGE semantics of
+    Neo4jManager's UNWIND write (entities by key, RELATED edges by row_id) and
+    the reads retrieve_graph_data and query_graph issue. It costs roughly what
+    building the rows and parameters costs on the client side, not what a
+    server would spend, so neo4j_load measures our side of the sync.
+    """
+    def __init__(self):
+        self.entities = {}
+        self.edges = {}
+        self._lock = threading.Lock()
+
+    def session(self, **kwargs):
+        return _StandInSession(self)
+
+    def close(self):
+        pass
+
+    def run(self, query, params):
+        if 'UNWIND $rows' in query:
+            with self._lock:
+                for row in params['rows']:
+                    for side in ('entity1', 'entity2'):
+                        self.entities[row[side + '_key']] = {
+                            'name': row[side], 'brand': row['brand'],
+                            'category': row['category'], 'sub_category': row['sub_category'],
+                        }
+                    self.edges[row['id']] = (row['entity1_key'], row['entity2_key'], row['relation'], row['sentiment'])
+            return _StandInResult([])
+        if 'RETURN e1.name as Entity1' in query and 'RowId' not in query:
+            return _StandInResult([{'Entity1': self.entities[key1]['name'], 'Entity2': self.entities[key2]['name'],
+                                    'Relation': relation} for key1, key2, relation, _ in self.edges.values()])
+        if 'RowId' in query:
+            return _StandInResult(self._page(params))
+        if 'DELETE r' in query:
+            with self._lock:
+                deleted = list(self.edges)[:params['limit']]
+                for row_id in deleted:
+                    del self.edges[row_id]
+            return _StandInResult([[len(deleted)]])
+        if 'DETACH DELETE e' in query:
+            with self._lock:
+                used = {key for key1, key2, _, _ in self.edges.values() for key in (key1, key2)}
+                orphans = [key for key in self.entities if key not in used][:params['limit']]
+                for key in orphans:
+                    del self.entities[key]
+            return _StandInResult([[len(orphans)]])
+        return _StandInResult([])
+
+    def _page(self, params):
+        records = []
+        for row_id in sorted(self.edges):
+            if row_id <= params['after']:
+                continue
+            key1, key2, relation, sentiment = self.edges[row_id]
+            e1 = self.entities[key1]
+            if any(params.get(name) is not None and params[name] != value for name, value in
+                   (('category', e1['category']), ('sub_category', e1['sub_category']), ('brand', e1['brand']),
+                    ('relation', relation), ('sentiment', sentiment))):
+                continue
+            records.append({'RowId': row_id, 'Entity1': e1['name'], 'Entity2': self.entities[key2]['name'],
+                            'Relation': relation, 'Sentiment': sentiment, 'Brand': e1['brand'],
+                            'Category': e1['category'], 'SubCategory': e1['sub_category']})
+            if 'limit' in params and len(records) >= params['limit']:
+                break
+        return records
+
+
+def stand_in_neo4j_manager(batch_size=1000):
+    manager = Neo4jManager('bolt://localhost:7687', 'neo4j', '', batch_size=batch_size, create_schema=False)
+    manager.driver.close()
+    manager.driver = StandInNeo4jDriver()
+    return manager
+
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the process high-water mark
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class StageRecorder:
+    """
+    Collects per-call latencies and item counts per stage, and samples the
+    process RSS in a background thread to attribute a peak to whichever stage
+    is running.
+    """
+    def __init__(self, sample_interval=0.01):
+        self.stats = {stage: {'items': 0, 'seconds': 0.0, 'latencies': [], 'peak_rss': 0} for stage in STAGES}
+        self.sample_interval = sample_interval
+        self.current = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            stage = self.current
+            if stage is not None:
+                self._observe(stage)
+
+    def _observe(self, stage):
+        stats = self.stats[stage]
+        stats['peak_rss'] = max(stats['peak_rss'], current_rss_bytes())
+
+    def time(self, stage, fn, items=1):
+        """
+        Run fn() as one call of stage covering items items (None: as many as
+        fn returns).
+        """
+        self.current = stage
+        start = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            seconds = time.perf_counter() - start
+            self._observe(stage)
+            self.current = None
+        stats = self.stats[stage]
+        stats['items'] += len(result) if items is None else items
+        stats['seconds'] += seconds
+        stats['latencies'].append(seconds)
+        return result
+
+    def summary(self):
+        summary = {}
+        for stage, stats in self.stats.items():
+            summary[stage] = {
+                'items': stats['items'],
+                'calls': len(stats['latencies']),
+                'seconds': round(stats['seconds'], 6),
+                'throughput_per_sec': round(stats['items'] / stats['seconds'], 3) if stats['seconds'] else 0.0,
+                'p50_ms': round(percentile(stats['latencies'], 0.50) * 1000, 4),
+                'p99_ms': round(percentile(stats['latencies'], 0.99) * 1000, 4),
+                'peak_rss_mb': round(stats['peak_rss'] / (1024 * 1024), 2),
+            }
+        return summary
+
+
+def run_scale(model, rows, args, workdir):
+    db_path = os.path.join(workdir, f"bench_{rows}.db")
+    db_manager = DatabaseManager(db_path)
+    text_preprocessor = TextPreprocessor()
+    backend = LocalExtractionBackend(latency=args.backend_latency)
+    neo4j_manager = stand_in_neo4j_manager(args.neo4j_batch_size)
+
+    with StageRecorder() as recorder:
+        for index, start in enumerate(range(0, rows, args.chunk_size)):
+            reviews = model.chunk(args.seed, index, start, min(args.chunk_size, rows - start))
+            texts = [f"{review['Review Title']} {review['Review Content']}" for review in reviews]
+            cleaned = recorder.time('preprocess', lambda: text_preprocessor.preprocess_batch(texts), len(texts))
+
+            prepared = []
+            for review, cleaned_text in zip(reviews, cleaned):
+                try:
+                    entities_dict, _ = recorder.time('extract', lambda: backend.extract_entities_with_usage(cleaned_text))
+                except ValueError:
+                    continue
+                entities_df = recorder.time('prepare_dataframe', lambda: backend.prepare_dataframe(
+                    entities_dict, review['User Id'], review['Review Rating'], review['Brand'], review['Category'],
+                    review['Sub Category']))
+                prepared.append((cleaned_text, entities_df))
+
+            triples = sum(len(entities_df) for _, entities_df in prepared)
+            recorder.time('insert', lambda: db_manager.insert_many(prepared), triples)
+
+        # Time each UNWIND batch by wrapping the manager's batch writer
+        write_batch = neo4j_manager._write_batch
+        neo4j_manager._write_batch = lambda session, batch: recorder.time(
+            'neo4j_load', lambda: write_batch(session, batch), len(batch))
+        neo4j_manager.load_data_from_sqlite(db_path)
+
+        for _ in range(args.retrieve_repeats):
+            recorder.time('retrieve_graph_data', neo4j_manager.retrieve_graph_data, items=None)
+
+    db_manager.close_connection()
+    neo4j_manager.close()
+    result = recorder.summary()
+    result['_corpus'] = {'reviews': rows, 'triples': len(neo4j_manager.driver.edges),
+                         'entities': len(neo4j_manager.driver.entities),
+                         'db_bytes': os.path.getsize(db_path)}
+    if not args.keep_db:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=SAMPLE_CSV, help="CSV whose column distributions the corpus copies.")
+    parser.add_argument('--scales', default='1k,100k', help="Comma-separated corpus sizes in reviews, e.g. 1k,100k,1m.")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Reviews per preprocess/insert call.")
+    parser.add_argument('--neo4j-batch-size', type=int, default=1000)
+    parser.add_argument('--backend-latency', type=float, default=0.0, help="Seconds the extraction stand-in sleeps per call.")
+    parser.add_argument('--retrieve-repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="Directory for the benchmark databases (default: a temporary directory).")
+    parser.add_argument('--keep-db', action='store_true')
+    parser.add_argument('--output', default='bench_pipeline.json')
+    args = parser.parse_args()
+
+    ensure_nltk_data('stopwords')
+    model = CorpusModel(args.csv)
+    scales = [parse_scale(scale) for scale in args.scales.split(',') if scale.strip()]
+    report = {
+        'benchmark': 'pipeline',
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'workdir', 'keep_db')},
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in scales:
+            print(f"Scale {rows} reviews")
+            result = run_scale(model, rows, args, args.workdir or tmpdir)
+            report['results'][str(rows)] = result
+            for stage in STAGES:
+                stats = result[stage]
+                print(f"  {stage:<20} {stats['throughput_per_sec']:>12,.0f}/s  p50 {stats['p50_ms']:>9.3f}ms  "
+                      f"p99 {stats['p99_ms']:>9.3f}ms  peak RSS {stats['peak_rss_mb']:>8.1f}MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark the compiled relation classifier against the original per-row if-chain.
+
+    python benchmarks/bench_relation_classifier.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from relation_classifier import RELATION_RULES, classify_relations
+
+
+def legacy_classify_relation(row):
+    # The if-chain GPTProcessor.classify_relation used before the rule table
+    entity2_lower = row['entity2'].lower()
+
+    if 'ingredient' in entity2_lower or 'charcoal' in entity2_lower or 'magnesium' in entity2_lower:
+        return 'Has Ingredient'
+    if 'irritation' in entity2_lower or 'rash' in entity2_lower or 'sensitivity' in entity2_lower:
+        return 'Causes'
+    if 'scent' in entity2_lower or 'fragrance' in entity2_lower or 'smell' in entity2_lower:
+        return 'Has Scent'
+    if 'absorb' in entity2_lower or 'protection' in entity2_lower or 'long-lasting' in entity2_lower:
+        return 'Provides Benefit'
+    if 'price' in entity2_lower or 'expensive' in entity2_lower or 'cost' in entity2_lower:
+        return 'Worth'
+    if 'application' in entity2_lower or 'apply' in entity2_lower:
+        return 'Easy To Apply'
+
+    if 'like' in entity2_lower or 'love' in entity2_lower or 'recommend' in entity2_lower:
+        return 'Liked By'
+    if 'dislike' in entity2_lower or 'hate' in entity2_lower or 'not recommend' in entity2_lower:
+        return 'Disliked By'
+    if 'recommend' in entity2_lower:
+        return 'Recommended By'
+    if 'not recommend' in entity2_lower or 'avoid' in entity2_lower:
+        return 'Not Recommended By'
+
+    if 'sensitive skin' in entity2_lower or 'dry skin' in entity2_lower or 'oily skin' in entity2_lower:
+        return 'Suitable For'
+    if 'daily use' in entity2_lower or 'travel' in entity2_lower:
+        return 'Used For'
+
+    if 'effective' in entity2_lower or 'works' in entity2_lower:
+        return 'Effective For'
+    if 'lasts' in entity2_lower or 'durable' in entity2_lower:
+        return 'Long-Lasting'
+    if 'quick results' in entity2_lower or 'immediate' in entity2_lower:
+        return 'Quick Results'
+
+    if 'better than' in entity2_lower or 'superior to' in entity2_lower:
+        return 'Better Than'
+    if 'worse than' in entity2_lower or 'inferior to' in entity2_lower:
+        return 'Worse Than'
+
+    return 'Related To'
+
+
+FILLER = ['product', 'deodorant', 'stick', 'formula', 'texture', 'packaging', 'quality', 'size', 'skin', 'odor',
+          'feel', 'results', 'use', 'very', 'not', 'the', 'than', 'to', 'daily', 'quick']
+
+
+def synthetic_entities(rows, vocabulary_size, seed):
+    """
+    rows entity2 strings drawn from vocabulary_size distinct phrases that mix rule
+    keywords (in any case) with filler words, roughly like GPT output.
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for _, rule_keywords in RELATION_RULES for keyword in rule_keywords]
+    vocabulary = []
+    for _ in range(vocabulary_size):
+        words = rng.sample(FILLER, rng.randint(1, 3))
+        if rng.random() < 0.7:
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        phrase = ' '.join(words)
+        vocabulary.append(phrase.title() if rng.random() < 0.2 else phrase)
+    return pd.Series([rng.choice(vocabulary) for _ in range(rows)], dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=50000, help="Distinct entity2 strings in the corpus.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-legacy', action='store_true', help="Only time the compiled classifier.")
+    args = parser.parse_args()
+
+    entities_df = pd.DataFrame({'entity2': synthetic_entities(args.rows, args.vocabulary, args.seed)})
+    print(f"{args.rows} rows, {entities_df['entity2'].nunique()} distinct entity2 values")
+
+    start = time.perf_counter()
+    compiled = classify_relations(entities_df['entity2'])
+    compiled_seconds = time.perf_counter() - start
+    print(f"compiled: {compiled_seconds:.3f}s ({args.rows / compiled_seconds:,.0f} rows/sec)")
+
+    if args.skip_legacy:
+        return
+
+    start = time.perf_counter()
+    legacy = entities_df.apply(legacy_classify_relation, axis=1)
+    legacy_seconds = time.perf_counter() - start
+    print(f"legacy:   {legacy_seconds:.3f}s ({args.rows / legacy_seconds:,.0f} rows/sec)")
+    print(f"speedup:  {legacy_seconds / compiled_seconds:.1f}x")
+
+    mismatches = int((compiled != legacy).sum())
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark SQLite write throughput: the original iterrows/execute insert path on a
+default-journal connection against DatabaseManager.insert_many with WAL.
+
+    python benchmarks/bench_sqlite_writer.py --reviews 20000 --triples 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+
+def synthetic_reviews(reviews, triples, seed):
+    rng = random.Random(seed)
+    words = ['scent', 'price', 'deodorant', 'smell', 'skin', 'stick', 'charcoal', 'protection', 'texture', 'value']
+    for i in range(reviews):
+        text = ' '.join(rng.choice(words) for _ in range(40))
+        rating = rng.randint(1, 5)
+        entities_df = pd.DataFrame({
+            'entity1': ['deodorant'] * triples,
+            'entity2': [rng.choice(words) for _ in range(triples)],
+            'type': ['Product-Feature'] * triples,
+            'relation': ['Related To'] * triples,
+            'user_id': [f'user{i}'] * triples,
+            'rating': [rating] * triples,
+            'sentiment': ['Positive' if rating >= 4 else 'Negative'] * triples,
+            'brand': ["Schmidt's Deodorant"] * triples,
+            'category': ['Beauty & Personal Care'] * triples,
+            'sub_category': ['Personal Care'] * triples,
+        })
+        yield text, entities_df
+
+
+def legacy_insert(db_path, reviews):
+    # What DatabaseManager.insert_data did before insert_many: one execute per row,
+    # one commit per review, default rollback journal
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS processed_reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, cleaned_review_content TEXT, user_id TEXT,
+        entity1 TEXT, entity2 TEXT, type TEXT, relation TEXT, rating REAL, sentiment TEXT,
+        brand TEXT, category TEXT, sub_category TEXT
+    )
+    ''')
+    for cleaned_review_content, entities_df in reviews:
+        for _, row in entities_df.iterrows():
+            cursor.execute('''
+            INSERT INTO processed_reviews (
+                cleaned_review_content, user_id, entity1, entity2, type, relation,
+                rating, sentiment, brand, category, sub_category
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                cleaned_review_content, row['user_id'], row['entity1'], row['entity2'], row['type'],
+                row['relation'], int(row['rating']), row['sentiment'], row['brand'], row['category'], row['sub_category']
+            ))
+        conn.commit()
+    conn.close()
+
+
+def bulk_insert(db_path, reviews, batch_commit_size, synchronous):
+    db_manager = DatabaseManager(db_path, synchronous=synchronous, batch_commit_size=batch_commit_size)
+    db_manager.insert_many(reviews)
+    db_manager.close_connection()
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    print(f"{label:<32} {seconds:8.3f}s {rows / seconds:12,.0f} rows/sec")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--triples', type=int, default=5, help="Triples per review.")
+    parser.add_argument('--batch-commit-size', type=int, default=10000)
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'])
+    parser.add_argument('--skip-legacy', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    reviews = list(synthetic_reviews(args.reviews, args.triples, args.seed))
+    rows = args.reviews * args.triples
+    print(f"{args.reviews} reviews, {rows} rows")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bulk = timed(f"insert_many (WAL, {args.synchronous})", rows,
+                     lambda: bulk_insert(os.path.join(tmp, 'bulk.db'), reviews, args.batch_commit_size, args.synchronous))
+        if not args.skip_legacy:
+            legacy = timed("legacy iterrows + execute", rows, lambda: legacy_insert(os.path.join(tmp, 'legacy.db'), reviews))
+            print(f"speedup: {legacy / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark TextPreprocessor.preprocess_batch against the original per-review path,
+tokenize_text(clean_text()) (two re.sub passes plus NLTK word_tokenize), on the
+sample CSV repeated --scale times.
+
+    python benchmarks/bench_text_preprocessing.py --scale 200 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nltk.tokenize import word_tokenize
+from text_preprocessing import TextPreprocessor
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'amazon_com-product_reviews__20200101_20200331_sample.csv')
+
+
+def load_texts(csv_path, scale):
+    df = pd.read_csv(csv_path, usecols=['Review Title', 'Review Content'], dtype=str)
+    texts = (df['Review Title'].fillna('') + ' ' + df['Review Content'].fillna('')).tolist()
+    return texts * scale
+
+
+def legacy_preprocess_all(text_preprocessor, texts):
+    try:
+        return [text_preprocessor.tokenize_text(text_preprocessor.clean_text(text)) for text in texts]
+    except LookupError:
+        # No Punkt model installed; clean_text output has no sentence punctuation,
+        # so tokenizing the whole line gives the same tokens
+        print("punkt_tab not available, legacy path uses word_tokenize(preserve_line=True)")
+        results = []
+        for text in texts:
+            tokens = word_tokenize(text_preprocessor.clean_text(text), preserve_line=True)
+            results.append(' '.join(word for word in tokens if word not in text_preprocessor.stop_words))
+        return results
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {seconds:8.3f}s {count / seconds:12,.0f} reviews/sec")
+    return seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=SAMPLE_CSV)
+    parser.add_argument('--scale', type=int, default=200, help="Times to repeat the CSV's reviews.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    texts = load_texts(args.csv, args.scale)
+    print(f"{len(texts)} reviews")
+    text_preprocessor = TextPreprocessor()
+
+    serial, serial_result = timed("preprocess_batch (1 process)", len(texts),
+                                  lambda: text_preprocessor.preprocess_batch(texts, workers=1))
+    parallel, parallel_result = timed(f"preprocess_batch ({args.workers} procs)", len(texts),
+                                      lambda: text_preprocessor.preprocess_batch(texts, workers=args.workers,
+                                                                                 chunk_size=args.chunk_size,
+                                                                                 parallel_threshold=0))
+    if parallel_result != serial_result:
+        print("parallel and serial batch output differ")
+        sys.exit(1)
+
+    if args.skip_legacy:
+        return
+
+    legacy, legacy_result = timed("legacy clean + word_tokenize", len(texts), lambda: legacy_preprocess_all(text_preprocessor, texts))
+    print(f"speedup: {legacy / serial:.1f}x (1 process), {legacy / parallel:.1f}x ({args.workers} procs)")
+
+    mismatches = sum(1 for fast, slow in zip(serial_result, legacy_result) if fast != slow)
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare two bench_pipeline.py result files, e.g. from a base and a head commit.
+Prints the relative change of throughput, p50/p99 latency and peak RSS per
+scale and stage, and exits with status 1 when a stage got slower or bigger
+than --threshold allows.
+
+    python benchmarks/compare_benchmarks.py base.json head.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+# metric -> True when a higher value is better
+METRICS = {
+    'throughput_per_sec': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def relative_change(base, head):
+    if not base:
+        return None
+    return (head - base) / base
+
+
+def compare(base, head, threshold):
+    """
+    Rows of (scale, stage, metric, base, head, change, regressed) for every
+    scale and stage present in both reports.
+    """
+    rows = []
+    for scale, base_stages in base['results'].items():
+        head_stages = head['results'].get(scale)
+        if head_stages is None:
+            continue
+        for stage, base_stats in base_stages.items():
+            head_stats = head_stages.get(stage)
+            if stage.startswith('_') or head_stats is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                change = relative_change(base_stats[metric], head_stats[metric])
+                regressed = change is not None and (-change if higher_is_better else change) > threshold
+                rows.append((scale, stage, metric, base_stats[metric], head_stats[metric], change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression.")
+    parser.add_argument('--metrics', default=','.join(METRICS), help="Comma-separated metrics to check.")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    metrics = set(args.metrics.split(','))
+
+    print(f"base {base.get('commit') or args.base}  head {head.get('commit') or args.head}")
+    # Scales are matched up per result, so runs over different scale lists still compare
+    base_config = {key: value for key, value in base.get('config', {}).items() if key != 'scales'}
+    head_config = {key: value for key, value in head.get('config', {}).items() if key != 'scales'}
+    if base_config != head_config:
+        print("Warning: the runs used different configurations; differences may not be due to the code.")
+
+    regressions = 0
+    for scale, stage, metric, base_value, head_value, change, regressed in compare(base, head, args.threshold):
+        if metric not in metrics:
+            continue
+        change_text = 'n/a' if change is None else f"{change:+.1%}"
+        marker = '  REGRESSION' if regressed else ''
+        print(f"{scale:>8} {stage:<20} {metric:<18} {base_value:>14,.3f} {head_value:>14,.3f} {change_text:>8}{marker}")
+        regressions += regressed
+
+    if regressions:
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
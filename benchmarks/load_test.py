@@ -0,0 +1,285 @@
+"""
+HTTP load test for the Flask app: drives POST / (review submissions) and
+GET /graph (graph pages) at a fixed concurrency (closed loop) or a fixed
+arrival rate (open loop), and reports throughput, error rate and latency
+percentiles per endpoint, plus how long submitted ingest jobs took to finish.
+
+Without --url the app is started in-process on a free port, in a temporary
+working directory, with the local extraction stand-in (EXTRACTION_BACKEND=local)
+and the in-memory graph (GRAPH_BACKEND=memory), so no OpenAI or Neo4j access is
+needed. Review payloads are synthetic reviews shaped like the sample CSV.
+
+    python benchmarks/load_test.py --concurrency 16 --duration 30 --post-fraction 0.2
+    python benchmarks/load_test.py --rate 50 --duration 60 --llm-latency 0.5
+    python benchmarks/load_test.py --url http://localhost:5000 --concurrency 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import SAMPLE_CSV, CorpusModel, git_commit, percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINISHED_JOB_STATES = ('succeeded', 'failed')
+
+
+def start_local_app(workdir, llm_latency, workers):
+    """
+    Import app.py configured with the local stand-ins, with workdir as the
+    current directory so its databases are created there, and serve it from a
+    background thread. Returns (base_url, server).
+    """
+    os.chdir(workdir)
+    os.environ.update({
+        'EXTRACTION_BACKEND': 'local',
+        'LOCAL_EXTRACTION_LATENCY': str(llm_latency),
+        'GRAPH_BACKEND': 'memory',
+        'INGEST_WORKERS': str(workers),
+    })
+    sys.path.insert(0, REPO_ROOT)
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+class LoadTest:
+    """
+    Sends the requests and records (kind, status, latency, error) per request.
+    Latency is measured from when a request was due, so in open-loop mode time
+    spent waiting for a free client thread counts against the server.
+    """
+    def __init__(self, base_url, model, post_fraction, graph_limit, timeout, seed, first_review=0):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.post_fraction = post_fraction
+        self.graph_limit = graph_limit
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.results = []
+        self.jobs = {}
+        self._review_index = first_review
+        self._lock = threading.Lock()
+
+    def next_review(self):
+        with self._lock:
+            index = self._review_index
+            self._review_index += 1
+        review = self.model.chunk('load-test', index, index, 1)[0]
+        return {
+            'review_text': f"{review['Review Title']} {review['Review Content']}",
+            'user_id': review['User Id'],
+            'review_rating': str(review['Review Rating']),
+            'brand': review['Brand'],
+            'category': review['Category'],
+            'sub_category': review['Sub Category'],
+        }
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers={'Accept': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def send(self, kind, due):
+        status, error, payload = None, None, None
+        try:
+            if kind == 'post':
+                status, payload = self.request('/', self.next_review())
+            else:
+                status, payload = self.request(f"/graph?limit={self.graph_limit}")
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        ok = error is None and status < 400
+        if kind == 'post' and ok:
+            job = json.loads(payload)
+            with self._lock:
+                self.jobs[job['job_id']] = {'submitted': finished, 'finished': None, 'status': None}
+        with self._lock:
+            self.results.append((kind, status, finished - due, error, finished))
+
+    def pick_kind(self):
+        with self._lock:
+            return 'post' if self.rng.random() < self.post_fraction else 'graph'
+
+    def run_closed_loop(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+
+        def client():
+            while time.perf_counter() < deadline:
+                self.send(self.pick_kind(), time.perf_counter())
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open_loop(self, rate, concurrency, duration):
+        # Poisson arrivals; each request is handed to the pool at its due time
+        start = time.perf_counter()
+        due = start
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                due += self.rng.expovariate(rate)
+                if due - start >= duration:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, self.pick_kind(), due)
+
+    def poll_jobs(self, timeout, stop=None):
+        """
+        Poll the submitted ingest jobs every 0.1s (which bounds the completion
+        time resolution) until stop is set, then wait up to timeout seconds
+        more for the remaining ones to finish. Job polls are not recorded as
+        load requests.
+        """
+        deadline = None
+        while True:
+            if stop is None or stop.is_set():
+                deadline = deadline or time.perf_counter() + timeout
+                if time.perf_counter() >= deadline:
+                    return
+            with self._lock:
+                pending = [job_id for job_id, job in self.jobs.items() if job['finished'] is None]
+            if not pending and deadline is not None:
+                return
+            for job_id in pending:
+                try:
+                    _, payload = self.request(f"/jobs/{job_id}")
+                    status = json.loads(payload).get('status')
+                except Exception:
+                    continue
+                if status in FINISHED_JOB_STATES:
+                    with self._lock:
+                        self.jobs[job_id].update(finished=time.perf_counter(), status=status)
+            time.sleep(0.1)
+
+    def report(self, duration):
+        endpoints = {}
+        for kind, label in (('post', 'POST /'), ('graph', 'GET /graph')):
+            rows = [row for row in self.results if row[0] == kind]
+            latencies = [row[2] for row in rows]
+            errors = sum(1 for row in rows if row[3] is not None or row[1] >= 400)
+            endpoints[label] = {
+                'requests': len(rows),
+                'errors': errors,
+                'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+                'throughput_per_sec': round((len(rows) - errors) / duration, 3),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+                'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+                'error_kinds': sorted({str(row[3] or row[1]) for row in rows if row[3] is not None or row[1] >= 400}),
+            }
+        finished = [job for job in self.jobs.values() if job['finished'] is not None]
+        completion = [job['finished'] - job['submitted'] for job in finished]
+        jobs = {
+            'submitted': len(self.jobs),
+            'succeeded': sum(1 for job in finished if job['status'] == 'succeeded'),
+            'failed': sum(1 for job in finished if job['status'] == 'failed'),
+            'unfinished': len(self.jobs) - len(finished),
+            'p50_ms': round(percentile(completion, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(completion, 0.99) * 1000, 3),
+        }
+        return {'endpoints': endpoints, 'ingest_jobs': jobs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="Base URL of a running app; default: start one in-process with local stand-ins.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Client threads (closed loop) or the open-loop pool size.")
+    parser.add_argument('--rate', type=float, help="Requests per second (open loop); default: closed loop.")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load.")
+    parser.add_argument('--post-fraction', type=float, default=0.2, help="Share of requests that are POST / submissions.")
+    parser.add_argument('--graph-limit', type=int, default=100, help="Page size of the GET /graph requests.")
+    parser.add_argument('--seed-reviews', type=int, default=200, help="Reviews submitted (and finished) before the load starts.")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="Seconds the in-process extraction stand-in sleeps per call.")
+    parser.add_argument('--ingest-workers', type=int, default=2, help="Ingest worker threads of the in-process app.")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help="Seconds to wait for submitted jobs after the load.")
+    parser.add_argument('--csv', default=SAMPLE_CSV)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the report as JSON to this file.")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    model = CorpusModel(args.csv)
+    workdir = None
+    base_url = args.url
+    if base_url is None:
+        workdir = tempfile.TemporaryDirectory()
+        base_url, _ = start_local_app(workdir.name, args.llm_latency, args.ingest_workers)
+        print(f"Started the app at {base_url} in {workdir.name}")
+
+    if args.seed_reviews:
+        seeder = LoadTest(base_url, model, 1.0, args.graph_limit, args.timeout, args.seed)
+        for _ in range(args.seed_reviews):
+            seeder.send('post', time.perf_counter())
+        seeder.poll_jobs(args.drain_timeout)
+        print(f"Seeded {seeder.report(1.0)['ingest_jobs']['succeeded']} reviews")
+
+    # Numbered after the seed reviews, so the load submits new reviews
+    load_test = LoadTest(base_url, model, args.post_fraction, args.graph_limit, args.timeout, args.seed + 1,
+                         first_review=args.seed_reviews)
+    load_done = threading.Event()
+    poller = threading.Thread(target=load_test.poll_jobs, args=(args.drain_timeout, load_done), daemon=True)
+    poller.start()
+    start = time.perf_counter()
+    if args.rate:
+        load_test.run_open_loop(args.rate, args.concurrency, args.duration)
+    else:
+        load_test.run_closed_loop(args.concurrency, args.duration)
+    elapsed = time.perf_counter() - start
+    load_done.set()
+    poller.join()
+
+    report = load_test.report(elapsed)
+    report.update({
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'seconds': round(elapsed, 3),
+    })
+    mode = f"open loop at {args.rate}/s" if args.rate else "closed loop"
+    print(f"{mode}, concurrency {args.concurrency}, {elapsed:.1f}s")
+    for label, stats in report['endpoints'].items():
+        print(f"  {label:<11} {stats['requests']:>7} req  {stats['throughput_per_sec']:>9.1f}/s  "
+              f"errors {stats['error_rate']:>6.1%}  p50 {stats['p50_ms']:>8.1f}ms  p90 {stats['p90_ms']:>8.1f}ms  "
+              f"p99 {stats['p99_ms']:>8.1f}ms  max {stats['max_ms']:>8.1f}ms")
+        if stats['error_kinds']:
+            print(f"              errors: {', '.join(stats['error_kinds'])}")
+    jobs = report['ingest_jobs']
+    print(f"  ingest jobs {jobs['submitted']:>7} submitted, {jobs['succeeded']} succeeded, {jobs['failed']} failed, "
+          f"{jobs['unfinished']} unfinished; completion p50 {jobs['p50_ms']:.1f}ms p99 {jobs['p99_ms']:.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if workdir is not None:
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import os
+import time
+import pandas as pd
+from database import DatabaseManager
+from extraction_cache import ExtractionCache
+from extraction_executor import ConcurrentExtractor
+from entity_canonicalizer import EntityCanonicalizer
+from extraction_backend import create_extraction_backend
+from text_preprocessing import TextPreprocessor
+
+CSV_COLUMNS = ['Uniq Id', 'Review Title', 'Review Content', 'Review Rating', 'User Id', 'Brand', 'Category', 'Sub Category']
+
+DONE = 'done'
+FAILED = 'failed'
+
+class BulkIngestor:
+    """
+    Stream an Amazon review CSV through preprocessing, GPT extraction and SQLite.
+
+    The CSV is read in chunks so memory stays bounded, and every row's outcome is
+    recorded in bulk_ingest_progress keyed by Uniq Id, so a restarted run skips
+    reviews that were already processed. Pass a ConcurrentExtractor to run the
+    GPT calls for each chunk concurrently, or reviews_per_request > 1 to pack
+    several reviews into each GPT call. Pass an EntityCanonicalizer to replace
+    entity names with their canonical forms before they are stored.
+    """
+    def __init__(self, db_manager, gpt_processor, text_preprocessor, chunk_size=1000, retry_failed=False, extractor=None,
+                 reviews_per_request=1, canonicalizer=None):
+        self.db_manager = db_manager
+        self.canonicalizer = canonicalizer
+        self.extractor = extractor
+        self.reviews_per_request = reviews_per_request
+        self.gpt_processor = gpt_processor
+        self.text_preprocessor = text_preprocessor
+        self.chunk_size = chunk_size
+        self.retry_failed = retry_failed
+        self.create_progress_table()
+
+    def create_progress_table(self):
+        with self.db_manager.connections.writer() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS bulk_ingest_progress (
+                uniq_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                entities INTEGER,
+                error TEXT,
+                processed_at REAL NOT NULL
+            )
+            ''')
+
+    def ingest(self, csv_path, limit=None):
+        """
+        Process every not-yet-done review in csv_path. Returns a dict of counts.
+        """
+        stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'entities': 0}
+        start = time.perf_counter()
+        seen = 0
+
+        for chunk in pd.read_csv(csv_path, usecols=CSV_COLUMNS, dtype={'Uniq Id': str}, chunksize=self.chunk_size):
+            chunk = chunk.dropna(subset=['Uniq Id'])
+            done = self._finished_ids(chunk['Uniq Id'].tolist())
+
+            pending = []
+            for row in chunk[CSV_COLUMNS].itertuples(index=False, name=None):
+                if limit is not None and seen >= limit:
+                    break
+                seen += 1
+                review = dict(zip(CSV_COLUMNS, row))
+                if review['Uniq Id'] in done:
+                    stats['skipped'] += 1
+                    continue
+                pending.append(review)
+            self._process_reviews(pending, stats)
+
+            print(f"Bulk ingest: {seen} rows read, {stats['processed']} processed, {stats['skipped']} skipped, {stats['failed']} failed")
+            if limit is not None and seen >= limit:
+                break
+
+        return self._finish(stats, start)
+
+    def _process_reviews(self, reviews, stats):
+        cleaned = {}
+        texts = [f"{review['Review Title']} {review['Review Content']}" for review in reviews]
+        try:
+            for review, cleaned_text in zip(reviews, self.text_preprocessor.preprocess_batch(texts)):
+                cleaned[review['Uniq Id']] = cleaned_text
+        except Exception:
+            for review, full_review_text in zip(reviews, texts):
+                try:
+                    cleaned[review['Uniq Id']] = self.text_preprocessor.preprocess(full_review_text)
+                except Exception as e:
+                    self._fail(review['Uniq Id'], e, stats)
+
+        by_id = {review['Uniq Id']: review for review in reviews}
+        prepared = []
+        for uniq_id, entities_dict, error in self._extract(cleaned):
+            if error is not None:
+                self._fail(uniq_id, error, stats)
+                continue
+            entities_df = self._prepare(by_id[uniq_id], entities_dict, stats)
+            if entities_df is not None:
+                prepared.append((uniq_id, cleaned[uniq_id], entities_df))
+        if self.canonicalizer is not None:
+            prepared = self._canonicalize(prepared)
+        self._store(prepared, stats)
+
+    def _canonicalize(self, prepared):
+        # One alias lookup pass and one commit for the whole chunk
+        names = [name for _, _, entities_df in prepared for column in ('entity1', 'entity2') for name in entities_df[column].dropna()]
+        mapping = self.canonicalizer.canonicalize_names(names)
+        canonicalized = []
+        for uniq_id, cleaned_text, entities_df in prepared:
+            entities_df = entities_df.copy()
+            for column in ('entity1', 'entity2'):
+                entities_df[column] = entities_df[column].map(lambda name: mapping.get(name, name))
+            canonicalized.append((uniq_id, cleaned_text, entities_df))
+        return canonicalized
+
+    def _extract(self, cleaned):
+        if self.extractor is not None:
+            for result in self.extractor.extract_many(cleaned.items()):
+                yield result['key'], result['entities'], result['error']
+            return
+        if self.reviews_per_request > 1:
+            uniq_ids = list(cleaned)
+            try:
+                results = self.gpt_processor.extract_entities_batch([cleaned[uniq_id] for uniq_id in uniq_ids], self.reviews_per_request)
+            except Exception as e:
+                results = [{"error": f"{type(e).__name__}: {e}"}] * len(uniq_ids)
+            for uniq_id, entities_dict in zip(uniq_ids, results):
+                if 'error' in entities_dict:
+                    yield uniq_id, None, ValueError(entities_dict['error'])
+                else:
+                    yield uniq_id, entities_dict, None
+            return
+        for uniq_id, cleaned_text in cleaned.items():
+            try:
+                yield uniq_id, self.gpt_processor.extract_entities(cleaned_text), None
+            except Exception as e:
+                yield uniq_id, None, e
+
+    def _prepare(self, review, entities_dict, stats):
+        try:
+            return self.gpt_processor.prepare_dataframe(
+                entities_dict, review['User Id'], review['Review Rating'],
+                review['Brand'], review['Category'], review['Sub Category']
+            )
+        except Exception as e:
+            self._fail(review['Uniq Id'], e, stats)
+            return None
+
+    def _store(self, prepared, stats):
+        # The progress rows go into the same transaction as the chunk's triples, so
+        # a crash can never leave a review stored but not marked as done
+        with self.db_manager.connections.writer() as conn:
+            for uniq_id, _, entities_df in prepared:
+                self._record(conn, uniq_id, DONE, entities=len(entities_df))
+            self.db_manager.insert_many(
+                ((cleaned_text, entities_df) for _, cleaned_text, entities_df in prepared),
+                batch_commit_size=0
+            )
+        stats['processed'] += len(prepared)
+        stats['entities'] += sum(len(entities_df) for _, _, entities_df in prepared)
+
+    def _fail(self, uniq_id, error, stats):
+        print(f"Error processing review {uniq_id}: {type(error).__name__}: {error}")
+        with self.db_manager.connections.writer() as conn:
+            self._record(conn, uniq_id, FAILED, error=f"{type(error).__name__}: {error}")
+        stats['failed'] += 1
+
+    @staticmethod
+    def _record(conn, uniq_id, status, entities=None, error=None):
+        conn.execute('''
+        INSERT INTO bulk_ingest_progress (uniq_id, status, entities, error, processed_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(uniq_id) DO UPDATE SET
+            status = excluded.status, entities = excluded.entities,
+            error = excluded.error, processed_at = excluded.processed_at
+        ''', (uniq_id, status, entities, error, time.time()))
+
+    def _finished_ids(self, uniq_ids):
+        statuses = (DONE,) if self.retry_failed else (DONE, FAILED)
+        finished = set()
+        # Stay under SQLite's bound-parameter limit
+        with self.db_manager.connections.reader() as conn:
+            for i in range(0, len(uniq_ids), 500):
+                batch = uniq_ids[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                status_placeholders = ','.join('?' * len(statuses))
+                rows = conn.execute(f'''
+                SELECT uniq_id FROM bulk_ingest_progress
+                WHERE uniq_id IN ({placeholders}) AND status IN ({status_placeholders})
+                ''', (*batch, *statuses)).fetchall()
+                finished.update(row[0] for row in rows)
+        return finished
+
+    @staticmethod
+    def _finish(stats, start):
+        stats['seconds'] = time.perf_counter() - start
+        print(f"Bulk ingest finished: {stats}")
+        return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest an Amazon review CSV into SQLite, resuming from previous runs.")
+    parser.add_argument('csv_path', nargs='?', default='./amazon_com-product_reviews__20200101_20200331_sample.csv')
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--chunk-size', type=int, default=1000, help="CSV rows read per chunk.")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many CSV rows.")
+    parser.add_argument('--retry-failed', action='store_true', help="Also retry reviews that failed in an earlier run.")
+    parser.add_argument('--concurrency', type=int, default=1, help="GPT requests in flight; 1 keeps the calls sequential.")
+    parser.add_argument('--rpm', type=int, default=500, help="Requests-per-minute budget when --concurrency > 1.")
+    parser.add_argument('--tpm', type=int, default=80000, help="Tokens-per-minute budget when --concurrency > 1.")
+    parser.add_argument('--reviews-per-request', type=int, default=1, help="Reviews packed into each GPT call (sequential mode only).")
+    parser.add_argument('--backend', default='openai', choices=['openai', 'local'], help="Extraction backend; 'local' runs offline.")
+    parser.add_argument('--local-latency', type=float, default=0.0, help="Artificial per-call latency of the local backend, in seconds.")
+    parser.add_argument('--cache-path', default='extraction_cache.db', help="GPT extraction cache; '' disables it.")
+    parser.add_argument('--canonicalize', action='store_true', help="Merge near-duplicate entity names before storing them.")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db_path)
+    cache = ExtractionCache(args.cache_path) if args.cache_path else None
+    if args.backend == 'openai':
+        # The executor does its own backoff, so the client should not retry underneath it
+        max_retries = 0 if args.concurrency > 1 else 2
+        gpt_processor = create_extraction_backend('openai', api_key=os.getenv('OPENAI_API_KEY', ''), max_retries=max_retries, cache=cache)
+    else:
+        gpt_processor = create_extraction_backend(args.backend, latency=args.local_latency)
+    extractor = None
+    if args.concurrency > 1:
+        extractor = ConcurrentExtractor(gpt_processor, max_workers=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    ingestor = BulkIngestor(
+        db_manager,
+        gpt_processor,
+        TextPreprocessor(),
+        chunk_size=args.chunk_size,
+        retry_failed=args.retry_failed,
+        extractor=extractor,
+        reviews_per_request=args.reviews_per_request,
+        canonicalizer=EntityCanonicalizer(args.db_path) if args.canonicalize else None,
+    )
+    try:
+        ingestor.ingest(args.csv_path, limit=args.limit)
+        if cache is not None:
+            print(f"Extraction cache: {cache.stats()}")
+    finally:
+        db_manager.close_connection()
@@ -1,57 +1,327 @@
+import argparse
 import sqlite3
-import pandas as pd
+import time
+from db_connection import get_connection_manager
+
+INSERT_COLUMNS = ['user_id', 'entity1', 'entity2', 'type', 'relation', 'rating', 'sentiment', 'brand', 'category', 'sub_category']
+
+# Interned name tables: table -> processed_reviews column(s) whose values it holds
+DICTIONARY_TABLES = {
+    'entities': ('entity1', 'entity2'),
+    'entity_types': ('type',),
+    'relations': ('relation',),
+    'brands': ('brand',),
+    'categories': ('category',),
+    'sub_categories': ('sub_category',),
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entities (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS entity_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS relations (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS brands (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS sub_categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    content TEXT,
+    user_id TEXT,
+    rating REAL,
+    sentiment TEXT,
+    brand_id INTEGER REFERENCES brands(id),
+    category_id INTEGER REFERENCES categories(id),
+    sub_category_id INTEGER REFERENCES sub_categories(id)
+);
+
+CREATE TABLE IF NOT EXISTS triples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    review_id INTEGER NOT NULL REFERENCES reviews(id),
+    entity1_id INTEGER REFERENCES entities(id),
+    entity2_id INTEGER REFERENCES entities(id),
+    type_id INTEGER REFERENCES entity_types(id),
+    relation_id INTEGER REFERENCES relations(id)
+);
+
+-- One row per in-place rewrite of existing triples (e.g. recanonicalization), which neither
+-- adds rows nor raises MAX(triples.id), so readers include MAX(id) in their graph versions
+CREATE TABLE IF NOT EXISTS triple_rewrites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rewritten_at REAL NOT NULL,
+    reason TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_triples_entity1 ON triples (entity1_id, relation_id, entity2_id, review_id);
+CREATE INDEX IF NOT EXISTS idx_triples_entity2 ON triples (entity2_id, relation_id, entity1_id, review_id);
+CREATE INDEX IF NOT EXISTS idx_triples_review ON triples (review_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_scope ON reviews (category_id, sub_category_id, brand_id, sentiment);
+CREATE INDEX IF NOT EXISTS idx_reviews_brand ON reviews (brand_id, sentiment);
+
+CREATE VIEW IF NOT EXISTS processed_reviews AS
+SELECT
+    t.id AS id,
+    r.content AS cleaned_review_content,
+    r.user_id AS user_id,
+    e1.name AS entity1,
+    e2.name AS entity2,
+    ty.name AS type,
+    rel.name AS relation,
+    r.rating AS rating,
+    r.sentiment AS sentiment,
+    b.name AS brand,
+    c.name AS category,
+    sc.name AS sub_category
+FROM triples t
+JOIN reviews r ON r.id = t.review_id
+LEFT JOIN entities e1 ON e1.id = t.entity1_id
+LEFT JOIN entities e2 ON e2.id = t.entity2_id
+LEFT JOIN entity_types ty ON ty.id = t.type_id
+LEFT JOIN relations rel ON rel.id = t.relation_id
+LEFT JOIN brands b ON b.id = r.brand_id
+LEFT JOIN categories c ON c.id = r.category_id
+LEFT JOIN sub_categories sc ON sc.id = r.sub_category_id;
+'''
+
+
+def _clean(value):
+    # pandas hands missing CSV fields over as NaN; store them as NULL
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def mark_triples_rewritten(conn, reason=None):
+    """
+    Record that existing triples were changed in place, in conn's transaction.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS triple_rewrites (id INTEGER PRIMARY KEY AUTOINCREMENT, rewritten_at REAL NOT NULL, reason TEXT)
+    ''')
+    conn.execute('INSERT INTO triple_rewrites (rewritten_at, reason) VALUES (?, ?)', (time.time(), reason))
+
+
+def triples_revision(conn):
+    """
+    (id, time) of the last in-place rewrite of triples, or (0, 0.0) if there was none.
+    """
+    try:
+        row = conn.execute('SELECT id, rewritten_at FROM triple_rewrites ORDER BY id DESC LIMIT 1').fetchone()
+    except sqlite3.OperationalError:
+        # Databases created before triple_rewrites existed
+        return 0, 0.0
+    return row if row is not None else (0, 0.0)
+
 
 class DatabaseManager:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path,check_same_thread=False)
-        self.cursor = self.conn.cursor()
+    """
+    Stores processed reviews in a normalized schema.
+
+    Review text and review-level fields live once in reviews; entity, type,
+    relation, brand and category names are interned in dictionary tables; and
+    triples holds integer foreign keys. The processed_reviews view joins it all
+    back into the original wide shape, so existing readers keep working.
+
+    Connections come from the shared ConnectionManager for db_path: writes
+    hold its write connection, so the manager can be used from any thread.
+    """
+    def __init__(self, db_path, synchronous='NORMAL', cache_size_kb=65536, batch_commit_size=10000):
+        self.connections = get_connection_manager(db_path)
+        self.batch_commit_size = batch_commit_size
+        self._reset_id_cache()
+        # Ids handed out inside a rolled back transaction no longer exist
+        self.connections.add_rollback_hook(self._reset_id_cache)
+        self.configure(synchronous, cache_size_kb)
         self.create_table()
 
+    def configure(self, synchronous='NORMAL', cache_size_kb=65536):
+        self.connections.configure(synchronous, cache_size_kb)
+
     def create_table(self):
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS processed_reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cleaned_review_content TEXT,
-            user_id TEXT,
-            entity1 TEXT,
-            entity2 TEXT,
-            type TEXT,
-            relation TEXT,
-            rating REAL,
-            sentiment TEXT,
-            brand TEXT,
-            category TEXT,
-            sub_category TEXT
-        )
-        ''')
-        self.conn.commit()
+        with self.connections.writer() as conn:
+            legacy = self._has_legacy_table(conn)
+            if not legacy:
+                conn.executescript(SCHEMA)
+        if legacy:
+            self.migrate_legacy_schema()
+
+    @staticmethod
+    def _has_legacy_table(conn):
+        row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'processed_reviews'").fetchone()
+        return row is not None and row[0] == 'table'
+
+    def migrate_legacy_schema(self):
+        """
+        Move a wide processed_reviews table into the normalized schema.
+
+        Rows that share review text and review-level fields become one reviews
+        row. Every triple keeps its original id, so the Neo4j sync watermark
+        stays valid. Runs in a single transaction.
+        """
+        with self.connections.writer() as conn:
+            # The explicit BEGIN below needs no implicit transaction to be open
+            self.connections.commit()
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            cursor.execute('ALTER TABLE processed_reviews RENAME TO processed_reviews_legacy')
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    cursor.execute(statement)
+
+            for table, columns in DICTIONARY_TABLES.items():
+                for column in columns:
+                    cursor.execute(f'''
+                    INSERT OR IGNORE INTO {table} (name)
+                    SELECT DISTINCT {column} FROM processed_reviews_legacy WHERE {column} IS NOT NULL
+                    ''')
+
+            cursor.execute('''
+            CREATE TEMP TABLE legacy_rows AS
+            SELECT *, MIN(id) OVER (
+                PARTITION BY cleaned_review_content, user_id, rating, sentiment, brand, category, sub_category
+            ) AS review_id
+            FROM processed_reviews_legacy
+            ''')
+            cursor.execute('''
+            INSERT INTO reviews (id, content, user_id, rating, sentiment, brand_id, category_id, sub_category_id)
+            SELECT l.review_id, l.cleaned_review_content, l.user_id, l.rating, l.sentiment, b.id, c.id, sc.id
+            FROM legacy_rows l
+            LEFT JOIN brands b ON b.name = l.brand
+            LEFT JOIN categories c ON c.name = l.category
+            LEFT JOIN sub_categories sc ON sc.name = l.sub_category
+            WHERE l.id = l.review_id
+            ''')
+            cursor.execute('''
+            INSERT INTO triples (id, review_id, entity1_id, entity2_id, type_id, relation_id)
+            SELECT l.id, l.review_id, e1.id, e2.id, ty.id, rel.id
+            FROM legacy_rows l
+            LEFT JOIN entities e1 ON e1.name = l.entity1
+            LEFT JOIN entities e2 ON e2.name = l.entity2
+            LEFT JOIN entity_types ty ON ty.name = l.type
+            LEFT JOIN relations rel ON rel.name = l.relation
+            ORDER BY l.id
+            ''')
+            # Keep new triple ids above any id the legacy table ever handed out
+            legacy_seq = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'processed_reviews_legacy'").fetchone()
+            if legacy_seq is not None:
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'triples'", legacy_seq)
+                if cursor.rowcount == 0:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('triples', ?)", legacy_seq)
+            migrated = cursor.execute('SELECT COUNT(*) FROM legacy_rows').fetchone()[0]
+            reviews = cursor.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+            cursor.execute('DROP TABLE legacy_rows')
+            cursor.execute('DROP TABLE processed_reviews_legacy')
+        self._reset_id_cache()
+        print(f"Migrated {migrated} processed_reviews rows into {reviews} reviews.")
+        return migrated
 
     def insert_data(self, cleaned_review_content, entities_df):
         if entities_df.empty:
             print("Warning: No entities to insert into the database.")
             return
-        
-        for _, row in entities_df.iterrows():
-            self.cursor.execute('''
-            INSERT INTO processed_reviews (
-                cleaned_review_content, user_id, entity1, entity2, type, relation, 
-                rating, sentiment, brand, category, sub_category
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                cleaned_review_content,
-                row['user_id'],
-                row['entity1'],
-                row['entity2'],
-                row['type'],
-                row['relation'],
-                row['rating'],
-                row['sentiment'],
-                row['brand'],
-                row['category'],
-                row['sub_category']
-            ))
-        self.conn.commit()
+        self.insert_many([(cleaned_review_content, entities_df)])
+
+    def insert_many(self, reviews, batch_commit_size=None):
+        """
+        Insert the triples of many reviews with executemany.
+
+        reviews is an iterable of (cleaned_review_content, entities_df) pairs. Rows
+        are committed every batch_commit_size rows (0 means one transaction for
+        everything). When called inside a caller's writer() block nothing is
+        committed early; the rows become part of the caller's transaction.
+        Returns the number of triples inserted.
+        """
+        batch_commit_size = self.batch_commit_size if batch_commit_size is None else batch_commit_size
+        inserted = 0
+        pending = []
+        pending_rows = 0
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+            for cleaned_review_content, entities_df in reviews:
+                if entities_df.empty:
+                    continue
+                # One tolist() per column yields plain Python values without boxing each row;
+                # items() avoids the per-column __getitem__ overhead on small frames
+                columns = {column: values.tolist() for column, values in entities_df.items()}
+                pending.append((cleaned_review_content, [columns[column] for column in INSERT_COLUMNS]))
+                pending_rows += len(entities_df)
+                if batch_commit_size and pending_rows >= batch_commit_size:
+                    inserted += self._write_reviews(cursor, pending)
+                    self.connections.commit()
+                    pending = []
+                    pending_rows = 0
+            if pending:
+                inserted += self._write_reviews(cursor, pending)
+        return inserted
+
+    def _write_reviews(self, cursor, pending):
+        names = {table: set() for table in DICTIONARY_TABLES}
+        for _, columns in pending:
+            row = dict(zip(INSERT_COLUMNS, columns))
+            for table, source_columns in DICTIONARY_TABLES.items():
+                for column in source_columns:
+                    names[table].update(row[column])
+        ids = {table: self._intern(cursor, table, values) for table, values in names.items()}
+
+        def lookup(table, value):
+            value = _clean(value)
+            return None if value is None else ids[table][value]
+
+        triples = []
+        for cleaned_review_content, columns in pending:
+            user_id, entity1, entity2, type_, relation, rating, sentiment, brand, category, sub_category = columns
+            review_ids = {}
+            for i in range(len(entity1)):
+                review_key = tuple(_clean(value) for value in (user_id[i], rating[i], sentiment[i], brand[i], category[i], sub_category[i]))
+                review_id = review_ids.get(review_key)
+                if review_id is None:
+                    cursor.execute('''
+                    INSERT INTO reviews (content, user_id, rating, sentiment, brand_id, category_id, sub_category_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        cleaned_review_content, _clean(user_id[i]), _clean(rating[i]), _clean(sentiment[i]),
+                        lookup('brands', brand[i]), lookup('categories', category[i]), lookup('sub_categories', sub_category[i])
+                    ))
+                    review_id = review_ids[review_key] = cursor.lastrowid
+                triples.append((
+                    review_id, lookup('entities', entity1[i]), lookup('entities', entity2[i]),
+                    lookup('entity_types', type_[i]), lookup('relations', relation[i])
+                ))
+
+        cursor.executemany('''
+        INSERT INTO triples (review_id, entity1_id, entity2_id, type_id, relation_id)
+        VALUES (?, ?, ?, ?, ?)
+        ''', triples)
+        return len(triples)
+
+    def _intern(self, cursor, table, values):
+        """
+        Return the name -> id cache for table, after adding any names in values
+        that are not in it yet.
+        """
+        cache = self._ids[table]
+        missing = [value for value in {_clean(value) for value in values} if value is not None and value not in cache]
+        if missing:
+            cursor.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in missing])
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for id_, name in cursor.execute(f'SELECT id, name FROM {table} WHERE name IN ({placeholders})', chunk):
+                    cache[name] = id_
+        return cache
+
+    def _reset_id_cache(self):
+        self._ids = {table: {} for table in DICTIONARY_TABLES}
 
     def close_connection(self):
-        self.conn.close()
+        self.connections.remove_rollback_hook(self._reset_id_cache)
+        self.connections.release()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the review database to the normalized schema.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    args = parser.parse_args()
+
+    # Opening the database creates the schema and migrates a legacy processed_reviews table
+    db_manager = DatabaseManager(args.db_path)
+    db_manager.close_connection()
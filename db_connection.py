@@ -0,0 +1,189 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+class ConnectionManager:
+    """
+    SQLite connections for one database file, shared by every thread.
+
+    Writes go through writer(): a single write connection guarded by a
+    reentrant lock, so one thread writes at a time and the block commits (or
+    rolls back on an exception) as one transaction. Reads go through reader(),
+    which lends out a connection from a pool of up to read_pool_size
+    query-only connections. In WAL mode readers see the last committed state
+    and keep running while a write is in progress. Cursors should be consumed
+    inside the with block, since the connection goes back to the pool at its
+    end.
+
+    Use get_connection_manager() to share one manager per database file across
+    components, so their writes are serialized by the same lock.
+    """
+    def __init__(self, db_path, read_pool_size=8, timeout=30.0, synchronous='NORMAL', cache_size_kb=65536):
+        self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.references = 0
+        self._readers = queue.LifoQueue()
+        self._opened_readers = 0
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._rollback_hooks = []
+        self._writer = self.connect()
+        # WAL is a property of the database file, so setting it once is enough
+        self._writer.execute('PRAGMA journal_mode=WAL')
+
+    def connect(self, read_only=False):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        self._configure(conn)
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    def _configure(self, conn):
+        # NORMAL only fsyncs at checkpoints, which is still crash-safe in WAL mode
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size={-int(self.cache_size_kb)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+    def configure(self, synchronous='NORMAL', cache_size_kb=65536):
+        """
+        Change the per-connection pragmas, for the write connection now and for
+        read connections as they are opened.
+        """
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        with self._write_lock:
+            self._configure(self._writer)
+
+    @contextmanager
+    def writer(self):
+        """
+        The write connection, held exclusively for the block. Nested blocks in
+        the same thread share the outermost transaction, so code inside a block
+        should commit with commit() rather than on the connection.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield self._writer
+                if self._write_depth == 1:
+                    self._writer.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    self._writer.rollback()
+                    for hook in list(self._rollback_hooks):
+                        hook()
+                raise
+            finally:
+                self._write_depth -= 1
+
+    def commit(self):
+        """
+        Commit the work done so far inside the calling thread's writer() block,
+        if that block is the outermost one; inside a nested block this does
+        nothing and the outer transaction commits as a whole. Returns whether
+        it committed.
+        """
+        with self._write_lock:
+            if self._write_depth != 1:
+                return False
+            self._writer.commit()
+            return True
+
+    def add_rollback_hook(self, hook):
+        """
+        Call hook() whenever a write transaction is rolled back, e.g. to drop
+        caches of row ids written inside it.
+        """
+        self._rollback_hooks.append(hook)
+
+    def remove_rollback_hook(self, hook):
+        if hook in self._rollback_hooks:
+            self._rollback_hooks.remove(hook)
+
+    @contextmanager
+    def reader(self):
+        """
+        A query-only connection for the block, from the pool. Blocks when all
+        read_pool_size connections are lent out.
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def _checkout(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            create = self._opened_readers < self.read_pool_size
+            if create:
+                self._opened_readers += 1
+        if not create:
+            return self._readers.get()
+        try:
+            return self.connect(read_only=True)
+        except Exception:
+            with self._readers_lock:
+                self._opened_readers -= 1
+            raise
+
+    def stats(self):
+        return {
+            'db_path': self.db_path,
+            'readers_open': self._opened_readers,
+            'readers_idle': self._readers.qsize(),
+            'read_pool_size': self.read_pool_size,
+            'references': self.references,
+        }
+
+    def release(self):
+        """
+        Drop one reference taken by get_connection_manager(); the last one
+        closes the connections.
+        """
+        with _managers_lock:
+            self.references -= 1
+            if self.references > 0:
+                return
+            if _managers.get(self.db_path) is self:
+                del _managers[self.db_path]
+        self.close()
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_connection_manager(db_path, **options):
+    """
+    The process-wide ConnectionManager for db_path, created with options on
+    first use. Every call takes a reference; give it back with release().
+    """
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(key, **options)
+        manager.references += 1
+        return manager
+
+if __name__ == "__main__":
+    pass
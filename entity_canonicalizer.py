@@ -0,0 +1,329 @@
+import argparse
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from database import mark_triples_rewritten
+from db_connection import get_connection_manager
+
+MERSENNE_PRIME = (1 << 31) - 1
+LEADING_WORDS = {'the', 'a', 'an', 'this', 'that', 'these', 'those', 'my', 'its', 'their'}
+NON_ALNUM_PATTERN = re.compile(r'[^0-9a-z]+')
+# Words that flip a name's meaning; "don't" normalizes to "don t", hence 't'
+NEGATION_WORDS = frozenset({'not', 'no', 'never', 'non', 'nor', 'neither', 'without', 't', 'cannot', 'hardly', 'barely'})
+NEGATING_PREFIXES = ('un', 'non', 'dis', 'in', 'im', 'ir', 'il', 'anti')
+
+
+def normalize_name(name):
+    """
+    Case-, punctuation- and plural-insensitive form of an entity name, e.g.
+    "The Scents" -> "scent", "long-lasting" -> "long lasting".
+    """
+    words = NON_ALNUM_PATTERN.sub(' ', str(name).lower()).split()
+    while len(words) > 1 and words[0] in LEADING_WORDS:
+        words = words[1:]
+    return ' '.join(_singular(word) for word in words)
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def opposite_polarity(a, b):
+    """
+    Whether two normalized names differ by a negation: a negation word only one
+    of them has ("not effective" / "effective"), or a word that is the other's
+    word with a negating prefix or a -less suffix ("unscented" / "scented").
+    """
+    words_a, words_b = a.split(), b.split()
+    if [w for w in words_a if w in NEGATION_WORDS] != [w for w in words_b if w in NEGATION_WORDS]:
+        return True
+    only_a = set(words_a) - set(words_b)
+    only_b = set(words_b) - set(words_a)
+    for negated, plain in ((only_a, only_b), (only_b, only_a)):
+        for word in negated:
+            if word.endswith('less') and word[:-4] in plain:
+                return True
+            if any(word.startswith(prefix) and word[len(prefix):] in plain for prefix in NEGATING_PREFIXES):
+                return True
+    return False
+
+
+def token_distance(a, b):
+    """
+    Levenshtein distance between two words.
+    """
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def near_identical_words(a, b):
+    """
+    Whether two words can only be spellings of one another: equal, or words of
+    at least 4 letters without digits that are one edit apart (two for words
+    longer than 8 letters), e.g. "deoderant" / "deodorant".
+    """
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 4 or any(char.isdigit() for char in a + b):
+        return False
+    return token_distance(a, b) <= (2 if max(len(a), len(b)) > 8 else 1)
+
+
+def same_words(a, b):
+    """
+    Whether two normalized names have the same words up to order and spelling:
+    every word of each pairs off with a near-identical word of the other. Names
+    that share a long prefix but differ by a whole word, like "schmidt charcoal
+    magnesium deodorant" / "schmidt charcoal deodorant", do not.
+    """
+    # A possessive "'s" normalizes to a word of its own
+    words_a = [word for word in a.split() if word != 's']
+    words_b = [word for word in b.split() if word != 's']
+    if len(words_a) != len(words_b):
+        return False
+    unmatched, leftover = list(words_b), []
+    for word in words_a:
+        if word in unmatched:
+            unmatched.remove(word)
+        else:
+            leftover.append(word)
+    for word in leftover:
+        match = next((other for other in unmatched if near_identical_words(word, other)), None)
+        if match is None:
+            return False
+        unmatched.remove(match)
+    return True
+
+
+def shingles(normalized, size=3):
+    padded = f" {normalized} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class EntityCanonicalizer:
+    """
+    Map entity names to canonical entities at ingest time.
+
+    Names are first normalized (case, punctuation, leading articles, plurals);
+    a normalized form seen before resolves through the alias table. Otherwise
+    the name's character shingles are MinHashed and LSH banding finds the
+    canonical names likely to be similar, so each lookup only compares against
+    a handful of candidates instead of every known name. The best candidate
+    with shingle Jaccard similarity of at least threshold becomes the
+    canonical; if there is none the name starts a new canonical entity.
+    Candidates of opposite polarity (see opposite_polarity()) or with different
+    words (see same_words()) are never merged, however similar their shingles
+    are: shingles alone merge distinct products that share a brand prefix.
+
+    Canonical entities and aliases are kept in the entity_canonical and
+    entity_aliases tables of db_path, so mappings are stable across runs. They
+    are written through the shared ConnectionManager for db_path.
+    """
+    def __init__(self, db_path, threshold=0.6, num_perm=64, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.connections = get_connection_manager(db_path)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._lock = threading.Lock()
+        self.create_tables()
+        self._load()
+
+    def create_tables(self):
+        with self.connections.writer() as conn:
+            conn.executescript('''
+            CREATE TABLE IF NOT EXISTS entity_canonical (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                normalized TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entity_aliases (
+                alias TEXT PRIMARY KEY,
+                canonical_id INTEGER NOT NULL REFERENCES entity_canonical(id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entity_aliases_canonical ON entity_aliases (canonical_id);
+            ''')
+
+    def _load(self):
+        self.aliases = {}
+        self.canonical_names = {}
+        self.canonical_normalized = {}
+        self.buckets = {}
+        with self.connections.reader() as conn:
+            for id_, name, normalized, signature in conn.execute('SELECT id, name, normalized, signature FROM entity_canonical'):
+                self._index(id_, name, normalized, np.frombuffer(signature, dtype=np.uint32))
+            self.aliases = dict(conn.execute('SELECT alias, canonical_id FROM entity_aliases'))
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        # (a * x + b) mod p stays below 2**64 for 31-bit a, b and 32-bit x
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def _index(self, id_, name, normalized, signature):
+        self.canonical_names[id_] = name
+        self.canonical_normalized[id_] = normalized
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(id_)
+
+    def canonical_id(self, name, conn):
+        """
+        Canonical entity id for name, creating the alias (and if needed a new
+        canonical entity) on first sight, on conn (the write connection).
+        """
+        alias = normalize_name(name)
+        canonical_id = self.aliases.get(alias)
+        if canonical_id is not None:
+            return canonical_id
+
+        shingle_set = shingles(alias)
+        signature = self.signature(shingle_set)
+        candidates = {id_ for key in self._band_keys(signature) for id_ in self.buckets.get(key, ())}
+        best_id, best_score = None, self.threshold
+        for id_ in candidates:
+            normalized = self.canonical_normalized[id_]
+            if opposite_polarity(alias, normalized) or not same_words(alias, normalized):
+                continue
+            score = jaccard(shingle_set, shingles(normalized))
+            if score >= best_score and (best_id is None or score > best_score or id_ < best_id):
+                best_id, best_score = id_, score
+
+        if best_id is None:
+            cursor = conn.execute('INSERT INTO entity_canonical (name, normalized, signature) VALUES (?, ?, ?)',
+                                       (str(name), alias, signature.tobytes()))
+            best_id = cursor.lastrowid
+            self._index(best_id, str(name), alias, signature)
+        conn.execute('INSERT OR REPLACE INTO entity_aliases (alias, canonical_id) VALUES (?, ?)', (alias, best_id))
+        self.aliases[alias] = best_id
+        return best_id
+
+    def canonicalize_names(self, names):
+        """
+        {name: canonical name} for an iterable of names, persisted in one
+        transaction (the caller's, when it already holds the writer).
+        """
+        with self._lock:
+            try:
+                with self.connections.writer() as conn:
+                    mapping = {name: self.canonical_names[self.canonical_id(name, conn)]
+                               for name in dict.fromkeys(names) if name is not None}
+            except Exception:
+                # Forget the ids handed out inside the rolled back transaction
+                self._load()
+                raise
+        return mapping
+
+    def canonicalize_dataframe(self, entities_df):
+        """
+        Copy of a prepare_dataframe() frame with entity1 and entity2 replaced by
+        their canonical names.
+        """
+        if entities_df.empty:
+            return entities_df
+        names = entities_df['entity1'].dropna().tolist() + entities_df['entity2'].dropna().tolist()
+        mapping = self.canonicalize_names(names)
+        entities_df = entities_df.copy()
+        for column in ('entity1', 'entity2'):
+            entities_df[column] = entities_df[column].map(lambda name: mapping.get(name, name))
+        return entities_df
+
+    def stats(self):
+        return {'canonical_entities': len(self.canonical_names), 'aliases': len(self.aliases), 'buckets': len(self.buckets)}
+
+    def close_connection(self):
+        self.connections.release()
+
+
+def recanonicalize(db_path, rebuild=False, **options):
+    """
+    Canonicalize every name in the entities table of an existing database and
+    repoint triples at the canonical entities. Names are processed most-used
+    first, so the common surface form becomes the canonical one. With rebuild
+    the alias tables are cleared first. Entity rows that lose all their
+    triples are kept, since entity ids are not AUTOINCREMENT and deleting rows
+    would let new names reuse ids that running DatabaseManagers have cached.
+    A rewrite is recorded with mark_triples_rewritten(), so graph versions and
+    analytics notice it. Runs in one transaction. Returns a dict of counts.
+    """
+    start = time.perf_counter()
+    connections = get_connection_manager(db_path)
+    try:
+        if rebuild:
+            with connections.writer() as conn:
+                conn.executescript('DROP TABLE IF EXISTS entity_aliases; DROP TABLE IF EXISTS entity_canonical;')
+        canonicalizer = EntityCanonicalizer(db_path, **options)
+        try:
+            with connections.writer() as conn:
+                entities = conn.execute('''
+                SELECT e.id, e.name, COALESCE(u.uses, 0) AS uses
+                FROM entities e
+                LEFT JOIN (
+                    SELECT entity_id, COUNT(*) AS uses
+                    FROM (SELECT entity1_id AS entity_id FROM triples UNION ALL SELECT entity2_id FROM triples)
+                    GROUP BY entity_id
+                ) u ON u.entity_id = e.id
+                ORDER BY uses DESC, e.id
+                ''').fetchall()
+                mapping = canonicalizer.canonicalize_names(name for _, name, _ in entities)
+
+                ids = {name: id_ for id_, name, _ in entities}
+                conn.executemany('INSERT OR IGNORE INTO entities (name) VALUES (?)',
+                                 [(canonical,) for canonical in set(mapping.values()) if canonical not in ids])
+                ids.update(conn.execute('SELECT name, id FROM entities'))
+                moves = [(ids[mapping[name]], id_) for id_, name, _ in entities if ids[mapping[name]] != id_]
+
+                conn.executemany('UPDATE triples SET entity1_id = ? WHERE entity1_id = ?', moves)
+                conn.executemany('UPDATE triples SET entity2_id = ? WHERE entity2_id = ?', moves)
+                if moves:
+                    mark_triples_rewritten(conn, 'recanonicalize')
+                unused = conn.execute('''
+                SELECT COUNT(*) FROM entities
+                WHERE id NOT IN (SELECT entity1_id FROM triples WHERE entity1_id IS NOT NULL)
+                  AND id NOT IN (SELECT entity2_id FROM triples WHERE entity2_id IS NOT NULL)
+                ''').fetchone()[0]
+        finally:
+            canonicalizer.close_connection()
+    finally:
+        connections.release()
+    return {'names': len(entities), 'canonical_entities': len(set(mapping.values())), 'remapped': len(moves),
+            'unused': unused, 'seconds': time.perf_counter() - start}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Canonicalize the entity names already stored in the review database.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--rebuild', action='store_true', help="Forget existing aliases and canonicalize from scratch.")
+    parser.add_argument('--threshold', type=float, default=0.6, help="Minimum shingle Jaccard similarity to merge names.")
+    args = parser.parse_args()
+
+    stats = recanonicalize(args.db_path, rebuild=args.rebuild, threshold=args.threshold)
+    print(f"Recanonicalized entities: {stats}")
+    if stats['remapped']:
+        print("Triples were repointed; the Neo4j and memory graphs rebuild them on their next sync "
+              "(the app's periodic graph sync, or neo4j_manager.py).")
@@ -0,0 +1,153 @@
+import abc
+import hashlib
+import random
+import re
+import time
+import pandas as pd
+from relation_classifier import classify_relation, classify_relations
+
+class ExtractionBackend(abc.ABC):
+    """
+    Interface shared by every entity extraction backend.
+
+    Subclasses implement extract_entities_with_usage(text, check_cache=True),
+    returning the {"entities": [{"entity1", "entity2", "type", "relation"}, ...]}
+    dict and a token usage dict (or None). Backends with a result cache also
+    override cached_entities(text), so callers can look the cache up once and
+    skip rate limiting for hits. Batch extraction and the DataFrame
+    preparation used by the rest of the pipeline are shared.
+    """
+    model = None
+    max_tokens = 0
+
+    def extract_entities(self, text):
+        entities_relations, _ = self.extract_entities_with_usage(text)
+        return entities_relations
+
+    @abc.abstractmethod
+    def extract_entities_with_usage(self, text, check_cache=True):
+        pass
+
+    def cached_entities(self, text):
+        return None
+
+    def extract_entities_batch(self, texts, batch_size=10):
+        results, _ = self.extract_entities_batch_with_usage(texts, batch_size)
+        return results
+
+    def extract_entities_batch_with_usage(self, texts, batch_size=10):
+        results = []
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        for text in texts:
+            try:
+                entities_relations, text_usage = self.extract_entities_with_usage(text)
+            except ValueError as e:
+                entities_relations, text_usage = {"error": str(e)}, None
+            results.append(entities_relations)
+            if text_usage:
+                for key in usage:
+                    usage[key] += text_usage[key]
+        return results, usage
+
+    def prepare_dataframe(self, entities_dict, user_id, rating, brand, category, sub_category):
+        entities_df = pd.DataFrame(entities_dict['entities'])
+        entities_df['user_id'] = user_id
+        entities_df['rating'] = rating
+        entities_df['brand'] = brand
+        entities_df['category'] = category
+        entities_df['sub_category'] = sub_category
+        entities_df['rating'] = entities_df['rating'].astype(int)
+        entities_df['sentiment'] = entities_df['rating'].apply(self.classify_sentiment)
+        entities_df['relation'] = classify_relations(entities_df['entity2'])
+        return entities_df
+
+    def classify_sentiment(self, rating):
+        if type(rating) != int: 
+            return "No Rating"
+        if rating >= 4:
+            return 'Positive'
+        elif rating == 3:
+            return 'Neutral'
+        else:
+            return 'Negative'
+
+    def classify_relation(self, row):
+        return classify_relation(row['entity2'])
+
+
+PRODUCT_TERMS = (
+    'deodorant', 'shampoo', 'conditioner', 'soap', 'lotion', 'cream', 'toothpaste', 'razor',
+    'product', 'brand', 'stick', 'spray', 'gel', 'oil',
+)
+FEATURE_TERMS = (
+    'scent', 'smell', 'fragrance', 'price', 'cost', 'ingredient', 'charcoal', 'magnesium',
+    'irritation', 'rash', 'protection', 'application', 'texture', 'packaging', 'quality',
+    'odor', 'skin', 'residue', 'stain', 'size', 'value', 'formula', 'feel', 'effect',
+)
+SENTIMENT_TERMS = (
+    'love', 'like', 'recommend', 'hate', 'dislike', 'avoid', 'great', 'best', 'terrible',
+    'works', 'effective', 'lasts', 'durable', 'expensive', 'cheap', 'amazing',
+)
+_WORD = re.compile(r'[a-z]{4,}')
+
+
+class LocalExtractionBackend(ExtractionBackend):
+    """
+    Deterministic offline stand-in for GPTProcessor.
+
+    Produces realistic-looking triples from the words in the review (the same
+    text always yields the same entities) and sleeps for latency seconds, plus
+    up to jitter seconds of deterministic per-text noise, to mimic an API call.
+    Intended for load tests and benchmarks of the rest of the pipeline.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, max_entities=4, model="local-fake"):
+        self.latency = latency
+        self.jitter = jitter
+        self.max_entities = max_entities
+        self.model = model
+        self.max_tokens = 0
+
+    def extract_entities_with_usage(self, text, check_cache=True):
+        rng = random.Random(hashlib.sha256(str(text).encode('utf-8')).digest())
+        if self.latency or self.jitter:
+            time.sleep(self.latency + rng.random() * self.jitter)
+
+        words = _WORD.findall(str(text).lower())
+        if not words:
+            raise ValueError("No entities recognized in the provided text.")
+
+        products = [word for word in words if word in PRODUCT_TERMS]
+        product = products[0] if products else 'product'
+        features = [word for word in words if word in FEATURE_TERMS]
+        sentiments = [word for word in words if word in SENTIMENT_TERMS]
+        others = [word for word in words if word != product and word not in features and word not in sentiments]
+
+        entities = []
+        for feature in dict.fromkeys(features):
+            entities.append({'entity1': product, 'entity2': feature, 'type': 'Product-Feature', 'relation': 'has'})
+        for sentiment in dict.fromkeys(sentiments):
+            entities.append({'entity1': product, 'entity2': sentiment, 'type': 'Product-Sentiment', 'relation': 'expresses'})
+        if not entities:
+            entities.append({'entity1': product, 'entity2': rng.choice(others or words), 'type': 'Product-Feature', 'relation': 'has'})
+        entities = entities[:self.max_entities]
+
+        prompt_tokens = len(words) + 150
+        completion_tokens = 20 * len(entities)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+        return {'entities': entities}, usage
+
+
+def create_extraction_backend(name, **options):
+    """
+    Build the backend selected by name: 'openai' (GPTProcessor) or 'local'
+    (LocalExtractionBackend). options are passed to the backend's constructor.
+    """
+    if name == 'openai':
+        from gpt_processor import GPTProcessor
+        return GPTProcessor(**options)
+    if name == 'local':
+        return LocalExtractionBackend(**options)
+    raise ValueError(f"Unknown extraction backend: {name!r}")
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+from db_connection import get_connection_manager
+
+class ExtractionCache:
+    """
+    Disk-backed cache of parsed GPT entity extractions.
+
+    Entries are keyed on a SHA-256 of everything that shapes the response (model,
+    prompt, function schema, sampling settings and the cleaned text). Entries
+    older than max_age_seconds are dropped, and once the cache holds more than
+    max_entries the least recently used entries are evicted. Connections come
+    from the shared ConnectionManager for db_path, so lookups run on pooled
+    readers and only writes take the write lock. A hit only writes its new
+    last_used_at when the stored one is more than touch_interval seconds old,
+    so repeated hits on hot entries stay read-only.
+    """
+    def __init__(self, db_path, max_entries=100000, max_age_seconds=30 * 24 * 3600, evict_every=1000,
+                 touch_interval=3600):
+        self.connections = get_connection_manager(db_path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.touch_interval = touch_interval
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        self.create_table()
+
+    def create_table(self):
+        with self.connections.writer() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                entities TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used ON extraction_cache (last_used_at)')
+
+    @staticmethod
+    def make_key(model, system_message, user_template, functions, text, **settings):
+        payload = json.dumps({
+            'model': model,
+            'system': system_message,
+            'user': user_template,
+            'functions': functions,
+            'settings': settings,
+            'text': text,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.connections.reader() as conn:
+            row = conn.execute('SELECT entities, created_at, last_used_at FROM extraction_cache WHERE key = ?',
+                               (key,)).fetchone()
+        if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+            with self._lock:
+                self.misses += 1
+            return None
+        if now - row[2] >= self.touch_interval:
+            with self.connections.writer() as conn:
+                conn.execute('UPDATE extraction_cache SET last_used_at = ? WHERE key = ?', (now, key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, model, entities):
+        now = time.time()
+        with self.connections.writer() as conn:
+            conn.execute('''
+            INSERT OR REPLACE INTO extraction_cache (key, model, entities, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, json.dumps(entities), now, now))
+            with self._lock:
+                self._puts_since_evict += 1
+                evict = self._puts_since_evict >= self.evict_every
+            if evict:
+                self._evict(conn)
+
+    def evict(self):
+        with self.connections.writer() as conn:
+            return self._evict(conn)
+
+    def _evict(self, conn):
+        removed = 0
+        if self.max_age_seconds:
+            removed += conn.execute('DELETE FROM extraction_cache WHERE created_at < ?',
+                                    (time.time() - self.max_age_seconds,)).rowcount
+        if self.max_entries:
+            count = conn.execute('SELECT COUNT(*) FROM extraction_cache').fetchone()[0]
+            if count > self.max_entries:
+                removed += conn.execute('''
+                DELETE FROM extraction_cache WHERE key IN (
+                    SELECT key FROM extraction_cache ORDER BY last_used_at LIMIT ?
+                )
+                ''', (count - self.max_entries,)).rowcount
+        with self._lock:
+            self._puts_since_evict = 0
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        with self.connections.reader() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM extraction_cache').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+            }
+
+    def close_connection(self):
+        self.connections.release()
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,240 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import openai
+
+# Rough size of the system message plus the get_relation schema, in tokens
+PROMPT_OVERHEAD_TOKENS = 400
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills continuously at rate_per_minute.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Block until amount tokens are available and take them. Returns the time waited.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """
+        Give back (positive) or take away (negative) tokens without blocking.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets. Either may be None to disable it.
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens):
+        waited = 0.0
+        if self.requests:
+            waited += self.requests.acquire(1)
+        if self.tokens:
+            waited += self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests: halve on throttling, grow by one after a
+    full window of successes.
+    """
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+
+
+class ConcurrentExtractor:
+    """
+    Run GPTProcessor.extract_entities for many reviews with several requests in flight.
+
+    Cache hits are answered before anything else. Other reviews first take a
+    concurrency slot and then their share of the RateLimiter budget, so only
+    requests that are about to be sent use up budget. Requests are retried
+    with exponential backoff (and jitter) on 429, 5xx, timeouts and connection
+    errors, and the number of concurrent requests shrinks whenever the API or
+    the limiter pushes back. Build the GPTProcessor with max_retries=0 so the
+    OpenAI client does not retry underneath this backoff.
+    """
+    def __init__(self, gpt_processor, max_workers=8, requests_per_minute=500, tokens_per_minute=80000,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0, min_workers=1):
+        self.gpt_processor = gpt_processor
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_workers, min_workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {'requests': 0, 'cache_hits': 0, 'retries': 0, 'throttled': 0, 'failed': 0, 'tokens': 0}
+        self._stats_lock = threading.Lock()
+
+    def extract_many(self, reviews):
+        """
+        reviews is an iterable of (key, cleaned_text) pairs. Yields dicts with
+        key, entities, usage and error, in completion order. At most twice
+        max_workers reviews are pulled from the iterable ahead of completion.
+        """
+        reviews = iter(reviews)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='extract') as pool:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_workers * 2:
+                    try:
+                        key, text = next(reviews)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(self._extract_one, key, text))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def extract_all(self, texts):
+        """
+        Extract entities for a list of texts, returning results in input order.
+        """
+        results = [None] * len(texts)
+        for result in self.extract_many(enumerate(texts)):
+            results[result['key']] = result
+        return results
+
+    def _estimate_tokens(self, text):
+        return PROMPT_OVERHEAD_TOKENS + len(text) // 4 + self.gpt_processor.max_tokens
+
+    def _extract_one(self, key, text):
+        cached = self.gpt_processor.cached_entities(text)
+        if cached is not None:
+            self._count('cache_hits')
+            return {'key': key, 'entities': cached, 'usage': None, 'error': None}
+        estimated = self._estimate_tokens(text)
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            if self.rate_limiter.acquire(estimated) > 0:
+                self.concurrency.on_throttle()
+            try:
+                self._count('requests')
+                entities, usage = self.gpt_processor.extract_entities_with_usage(text, check_cache=False)
+            except Exception as e:
+                self.concurrency.release()
+                self.rate_limiter.reconcile(estimated, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._count('failed')
+                    return {'key': key, 'entities': None, 'usage': None, 'error': e}
+                attempt += 1
+                self._count('retries')
+                time.sleep(delay)
+                continue
+            self.concurrency.release()
+            self.concurrency.on_success()
+            actual = usage['total_tokens'] if usage else None
+            self.rate_limiter.reconcile(estimated, actual)
+            self._count('tokens', actual or 0)
+            return {'key': key, 'entities': entities, 'usage': usage, 'error': None}
+
+    def _retry_delay(self, error, attempt):
+        """
+        Seconds to wait before retrying error, or None if it should not be retried.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, openai.RateLimitError):
+            self._count('throttled')
+            self.concurrency.on_throttle()
+        elif isinstance(error, openai.APIStatusError):
+            if error.status_code < 500:
+                return None
+            self.concurrency.on_throttle()
+        elif not isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return None
+
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * (0.5 + random.random() / 2)
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def _retry_after(error):
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+if __name__ == "__main__":
+    pass
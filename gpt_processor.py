@@ -1,54 +1,119 @@
+import ast
+import json
 import openai
-import pandas as pd
+from extraction_backend import ExtractionBackend
 
-class GPTProcessor:
-    def __init__(self, api_key):
-        openai.api_key = api_key
-        self.lm_client = openai.OpenAI(api_key=openai.api_key)
-
-
-    def extract_entities(self, text):
-        system_message = "You are provided with Amazon product reviews from user. Use the text to extract the necessary information from the query effectively."
-        user_message = f"Extract entities (Product, Feature, Sentiment) from the following and return them in the specified JSON format: {text}"
-
-        custom_function_ent = [
-            {
-                "name": "get_relation",
-                "description": "Function to return entities and their relations in the required format.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "entities": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "entity1": {"type": "string"},
-                                    "entity2": {"type": "string"},
-                                    "type": {"type": "string"},
-                                    "relation": {"type": "string"}
-                                },
-                                "required": ["entity1", "entity2", "type", "relation"]
-                            }
-                        }
-                    },
-                    "required": ["entities"]
+SYSTEM_MESSAGE = "You are provided with Amazon product reviews from user. Use the text to extract the necessary information from the query effectively."
+USER_MESSAGE_TEMPLATE = "Extract entities (Product, Feature, Sentiment) from the following and return them in the specified JSON format: {text}"
+TEMPERATURE = 0.1
+
+CUSTOM_FUNCTION_ENT = [
+    {
+        "name": "get_relation",
+        "description": "Function to return entities and their relations in the required format.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "entities": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "entity1": {"type": "string"},
+                            "entity2": {"type": "string"},
+                            "type": {"type": "string"},
+                            "relation": {"type": "string"}
+                        },
+                        "required": ["entity1", "entity2", "type", "relation"]
+                    }
                 }
-            }
-        ]
+            },
+            "required": ["entities"]
+        }
+    }
+]
 
-        messages = [
-            {'role': 'system', 'content': system_message},
-            {'role': 'user', 'content': user_message}
-        ]
-        response = self.lm_client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.1,
-            functions=custom_function_ent,
-            function_call='auto'
-        )
+BATCH_USER_MESSAGE_TEMPLATE = (
+    "Extract entities (Product, Feature, Sentiment) from each of the following reviews. "
+    "Each review starts with its review_id in square brackets. Return the entities of every review "
+    "grouped under its review_id in the specified JSON format:\n{reviews}"
+)
+
+CUSTOM_FUNCTION_BATCH = [
+    {
+        "name": "get_relations_batch",
+        "description": "Function to return, for each review, its entities and their relations in the required format.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "reviews": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "review_id": {"type": "string"},
+                            "entities": CUSTOM_FUNCTION_ENT[0]["parameters"]["properties"]["entities"]
+                        },
+                        "required": ["review_id", "entities"]
+                    }
+                }
+            },
+            "required": ["reviews"]
+        }
+    }
+]
+
+ENTITY_FIELDS = ("entity1", "entity2", "type", "relation")
+
+# Largest max_tokens each model accepts for a completion, by model name prefix. gpt-4's 8k
+# context is shared with the prompt, so half of it is left for the batched reviews.
+COMPLETION_TOKEN_LIMITS = {
+    "gpt-4o-mini": 16384,
+    "gpt-4o": 16384,
+    "gpt-4-turbo": 4096,
+    "gpt-4": 4096,
+    "gpt-3.5-turbo": 4096,
+}
+DEFAULT_COMPLETION_TOKEN_LIMIT = 4096
+
+
+def completion_token_limit(model):
+    for prefix in sorted(COMPLETION_TOKEN_LIMITS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return COMPLETION_TOKEN_LIMITS[prefix]
+    return DEFAULT_COMPLETION_TOKEN_LIMIT
+
+class GPTProcessor(ExtractionBackend):
+    def __init__(self, api_key, model="gpt-4", base_url=None, max_retries=2, max_tokens=1500, cache=None,
+                 batch_tokens_per_review=400):
+        openai.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        # Completion tokens budgeted per review in a batched call; with the model's
+        # completion limit this bounds how many reviews share one request
+        self.batch_tokens_per_review = batch_tokens_per_review
+        self.completion_token_limit = completion_token_limit(model)
+        # Optional ExtractionCache; hits never reach the API
+        self.cache = cache
+        # base_url lets the client point at a proxy or a local fake server
+        self.lm_client = openai.OpenAI(api_key=openai.api_key, base_url=base_url, max_retries=max_retries)
+
+
+    def cached_entities(self, text):
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(text, USER_MESSAGE_TEMPLATE, CUSTOM_FUNCTION_ENT))
+
+    def extract_entities_with_usage(self, text, check_cache=True):
+        # check_cache=False is for callers that already missed in cached_entities()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(text, USER_MESSAGE_TEMPLATE, CUSTOM_FUNCTION_ENT)
+            cached = self.cache.get(cache_key) if check_cache else None
+            if cached is not None:
+                return cached, {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+        response = self._create_completion(USER_MESSAGE_TEMPLATE.format(text=text), CUSTOM_FUNCTION_ENT)
 
         function_call = response.choices[0].message.function_call
         if not function_call:
@@ -57,79 +122,164 @@ class GPTProcessor:
         content = function_call.arguments
         print(content)
         try:
-            entities_relations = eval(content.replace("'", "\""))
-            if not entities_relations.get('entities'):
-                raise ValueError("No entities recognized in the provided text.")
-        except SyntaxError:
+            entities_relations = self._parse_arguments(content)
+        except (ValueError, SyntaxError):
+            entities_relations = None
+        if not isinstance(entities_relations, dict):
             entities_relations = {"error": "Unable to parse the response."}
-        
-        return entities_relations
-
-    def prepare_dataframe(self, entities_dict, user_id, rating, brand, category, sub_category):
-        entities_df = pd.DataFrame(entities_dict['entities'])
-        entities_df['user_id'] = user_id
-        entities_df['rating'] = rating
-        entities_df['brand'] = brand
-        entities_df['category'] = category
-        entities_df['sub_category'] = sub_category
-        entities_df['rating'] = entities_df['rating'].astype(int)
-        entities_df['sentiment'] = entities_df['rating'].apply(self.classify_sentiment)
-        entities_df['relation'] = entities_df.apply(self.classify_relation, axis=1)
-        return entities_df
-
-    def classify_sentiment(self, rating):
-        if type(rating) != int: 
-            return "No Rating"
-        if rating >= 4:
-            return 'Positive'
-        elif rating == 3:
-            return 'Neutral'
-        else:
-            return 'Negative'
-
-    def classify_relation(self, row):
-        entity2_lower = row['entity2'].lower()
-
-        if 'ingredient' in entity2_lower or 'charcoal' in entity2_lower or 'magnesium' in entity2_lower:
-            return 'Has Ingredient'
-        if 'irritation' in entity2_lower or 'rash' in entity2_lower or 'sensitivity' in entity2_lower:
-            return 'Causes'
-        if 'scent' in entity2_lower or 'fragrance' in entity2_lower or 'smell' in entity2_lower:
-            return 'Has Scent'
-        if 'absorb' in entity2_lower or 'protection' in entity2_lower or 'long-lasting' in entity2_lower:
-            return 'Provides Benefit'
-        if 'price' in entity2_lower or 'expensive' in entity2_lower or 'cost' in entity2_lower:
-            return 'Worth'
-        if 'application' in entity2_lower or 'apply' in entity2_lower:
-            return 'Easy To Apply'
-
-        if 'like' in entity2_lower or 'love' in entity2_lower or 'recommend' in entity2_lower:
-            return 'Liked By'
-        if 'dislike' in entity2_lower or 'hate' in entity2_lower or 'not recommend' in entity2_lower:
-            return 'Disliked By'
-        if 'recommend' in entity2_lower:
-            return 'Recommended By'
-        if 'not recommend' in entity2_lower or 'avoid' in entity2_lower:
-            return 'Not Recommended By'
-
-        if 'sensitive skin' in entity2_lower or 'dry skin' in entity2_lower or 'oily skin' in entity2_lower:
-            return 'Suitable For'
-        if 'daily use' in entity2_lower or 'travel' in entity2_lower:
-            return 'Used For'
-
-        if 'effective' in entity2_lower or 'works' in entity2_lower:
-            return 'Effective For'
-        if 'lasts' in entity2_lower or 'durable' in entity2_lower:
-            return 'Long-Lasting'
-        if 'quick results' in entity2_lower or 'immediate' in entity2_lower:
-            return 'Quick Results'
-
-        if 'better than' in entity2_lower or 'superior to' in entity2_lower:
-            return 'Better Than'
-        if 'worse than' in entity2_lower or 'inferior to' in entity2_lower:
-            return 'Worse Than'
-
-        return 'Related To'
+        elif not entities_relations.get('entities'):
+            raise ValueError("No entities recognized in the provided text.")
+
+        if cache_key is not None and entities_relations.get('entities'):
+            self.cache.put(cache_key, self.model, entities_relations)
+
+        return entities_relations, self._usage(response)
+
+    def extract_entities_batch_with_usage(self, texts, batch_size=10):
+        """
+        Extract entities for many cleaned reviews, packing up to batch_size of them
+        into each request. Returns one result per text, in order, shaped like
+        extract_entities() output ({"entities": [...]} or {"error": ...}), plus the
+        summed token usage. Batches are cut to what fits the model's completion
+        token limit at batch_tokens_per_review each. Reviews whose slice of a
+        batch response is missing or malformed are retried with a single-review
+        call.
+        """
+        batch_size = max(1, min(batch_size, self.completion_token_limit // self.batch_tokens_per_review))
+        results = [None] * len(texts)
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+        # Identical reviews only need to be extracted once
+        positions = {}
+        for i, text in enumerate(texts):
+            positions.setdefault(text, []).append(i)
+
+        pending = []
+        for text in positions:
+            cached = self.cached_entities(text)
+            if cached is not None:
+                for i in positions[text]:
+                    results[i] = cached
+            else:
+                pending.append(text)
+
+        fallback = []
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                extracted, batch_usage = self._extract_batch(batch)
+                self._add_usage(usage, batch_usage)
+            except (openai.APIError, ValueError) as e:
+                print(f"Batch extraction failed for {len(batch)} reviews, falling back to single calls: {e}")
+                extracted = {}
+            for text in batch:
+                entities_relations = extracted.get(text)
+                if entities_relations is None:
+                    fallback.append(text)
+                    continue
+                for i in positions[text]:
+                    results[i] = entities_relations
+
+        for text in fallback:
+            try:
+                # Already missed in cached_entities
+                entities_relations, single_usage = self.extract_entities_with_usage(text, check_cache=False)
+                self._add_usage(usage, single_usage)
+            except ValueError as e:
+                entities_relations = {"error": str(e)}
+            except openai.APIError as e:
+                # One rate-limited or failed call must not discard the reviews already extracted
+                entities_relations = {"error": f"{type(e).__name__}: {e}"}
+            for i in positions[text]:
+                results[i] = entities_relations
+
+        return results, usage
+
+    def _extract_batch(self, batch):
+        review_ids = {str(i + 1): text for i, text in enumerate(batch)}
+        reviews = "\n".join(f"[{review_id}] {text}" for review_id, text in review_ids.items())
+        response = self._create_completion(
+            BATCH_USER_MESSAGE_TEMPLATE.format(reviews=reviews), CUSTOM_FUNCTION_BATCH,
+            max_tokens=min(self.batch_tokens_per_review * len(batch), self.completion_token_limit)
+        )
+
+        function_call = response.choices[0].message.function_call
+        if not function_call:
+            raise ValueError("The function_call was not executed. Please check the model response.")
+        try:
+            content = self._parse_arguments(function_call.arguments)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"Unable to parse the batch response: {e}")
+        if not isinstance(content, dict):
+            raise ValueError("Unable to parse the batch response: not an object")
+
+        extracted = {}
+        for review in content.get('reviews') or []:
+            if not isinstance(review, dict):
+                continue
+            text = review_ids.get(str(review.get('review_id', '')).strip('[] '))
+            entities = review.get('entities')
+            if text is None or not self._valid_entities(entities):
+                continue
+            extracted[text] = {'entities': entities}
+            self._batch_cache_put(text, extracted[text])
+        return extracted, self._usage(response)
+
+    @staticmethod
+    def _parse_arguments(content):
+        # Function call arguments are JSON, but the model sometimes answers with a
+        # single-quoted Python literal; literal_eval reads those without running code
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return ast.literal_eval(content)
+
+    @staticmethod
+    def _valid_entities(entities):
+        if not isinstance(entities, list) or not entities:
+            return False
+        return all(isinstance(entity, dict) and all(isinstance(entity.get(field), str) for field in ENTITY_FIELDS)
+                   for entity in entities)
+
+    def _cache_key(self, text, user_template, functions):
+        return self.cache.make_key(self.model, SYSTEM_MESSAGE, user_template, functions, text,
+                                   max_tokens=self.max_tokens, temperature=TEMPERATURE)
+
+    def _batch_cache_put(self, text, entities_relations):
+        # A review's slice of a batch response is as good as a single-review extraction, so it
+        # goes under the single-review key and cached_entities() finds either kind
+        if self.cache is not None:
+            self.cache.put(self._cache_key(text, USER_MESSAGE_TEMPLATE, CUSTOM_FUNCTION_ENT), self.model, entities_relations)
+
+    def _create_completion(self, user_message, functions, max_tokens=None):
+        messages = [
+            {'role': 'system', 'content': SYSTEM_MESSAGE},
+            {'role': 'user', 'content': user_message}
+        ]
+        return self.lm_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=TEMPERATURE,
+            functions=functions,
+            function_call='auto'
+        )
+
+    @staticmethod
+    def _usage(response):
+        if getattr(response, 'usage', None) is None:
+            return None
+        return {
+            'prompt_tokens': response.usage.prompt_tokens,
+            'completion_tokens': response.usage.completion_tokens,
+            'total_tokens': response.usage.total_tokens,
+        }
+
+    @staticmethod
+    def _add_usage(total, usage):
+        if usage:
+            for key in total:
+                total[key] += usage[key]
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,449 @@
+import argparse
+import threading
+import time
+import numpy as np
+import scipy.sparse as sp
+from database import triples_revision
+from db_connection import get_connection_manager
+
+ANALYTICS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entity_metrics (
+    entity_id INTEGER PRIMARY KEY REFERENCES entities(id),
+    in_degree INTEGER NOT NULL,
+    out_degree INTEGER NOT NULL,
+    degree INTEGER NOT NULL,
+    weighted_degree REAL NOT NULL,
+    pagerank REAL NOT NULL,
+    community INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entity_metrics_pagerank ON entity_metrics (pagerank DESC);
+CREATE INDEX IF NOT EXISTS idx_entity_metrics_community ON entity_metrics (community, pagerank DESC);
+
+CREATE TABLE IF NOT EXISTS entity_scopes (
+    entity_id INTEGER NOT NULL,
+    brand_id INTEGER,
+    sub_category_id INTEGER,
+    type_id INTEGER,
+    sentiment TEXT,
+    mentions INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entity_scopes_brand ON entity_scopes (brand_id, sentiment, type_id, entity_id);
+CREATE INDEX IF NOT EXISTS idx_entity_scopes_sub_category ON entity_scopes (sub_category_id, sentiment, type_id, entity_id);
+
+CREATE TABLE IF NOT EXISTS graph_analytics_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished_at REAL NOT NULL,
+    seconds REAL NOT NULL,
+    last_triple_id INTEGER NOT NULL,
+    nodes INTEGER NOT NULL,
+    edges INTEGER NOT NULL,
+    pagerank_iterations INTEGER NOT NULL,
+    community_iterations INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analytics_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER
+);
+'''
+
+
+def pagerank(adjacency, damping=0.85, tol=1e-10, max_iter=100, start=None):
+    """
+    Weighted PageRank by power iteration over a CSR adjacency matrix (row =
+    source). Dangling nodes spread their rank uniformly. start warm-starts the
+    iteration, which is what makes refreshes after a few new reviews cheap.
+    Returns (ranks, iterations).
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0), 0
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition_t = (sp.diags(inverse) @ adjacency).T.tocsr()
+
+    ranks = np.full(n, 1.0 / n) if start is None else start / start.sum()
+    for iteration in range(1, max_iter + 1):
+        updated = damping * (transition_t @ ranks) + (damping * ranks[dangling].sum() + 1.0 - damping) / n
+        converged = np.abs(updated - ranks).sum() < n * tol
+        ranks = updated
+        if converged:
+            break
+    return ranks, iteration
+
+
+def label_propagation(adjacency, max_iter=20, start=None):
+    """
+    Synchronous weighted label propagation on the symmetrized adjacency: every
+    node takes the label with the most edge weight among its neighbours (its own
+    label counts with a small weight, which damps oscillation). Each round is
+    one sparse product and a row argmax. Returns (labels, iterations) with
+    labels renumbered 0..k-1.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    symmetric = (adjacency + adjacency.T).tocsr()
+    symmetric = symmetric + sp.identity(n, format='csr') * 1e-3
+    labels = np.arange(n) if start is None else start.copy()
+    for iteration in range(1, max_iter + 1):
+        membership = sp.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, n))
+        scores = symmetric @ membership
+        updated = np.asarray(scores.argmax(axis=1)).ravel()
+        changed = np.count_nonzero(updated != labels)
+        labels = updated
+        if not changed:
+            break
+    return np.unique(labels, return_inverse=True)[1], iteration
+
+
+class GraphAnalytics:
+    """
+    Materialized entity metrics over the triples in the review database.
+
+    refresh() rebuilds the entity graph (one node per entity, edge weights =
+    number of triples between a pair) as a sparse matrix and stores degree,
+    weighted PageRank and label-propagation communities in entity_metrics,
+    plus per brand / sub-category / type / sentiment mention counts in
+    entity_scopes. It does nothing when no triples were added or rewritten
+    since the last run, and warm-starts PageRank and communities from the
+    stored values when there were. Scope counts are only added for triples
+    since the last run; a rewrite (or force) recounts them in full.
+
+    Everything is read and computed on pooled read connections. Results are
+    written in transactions of write_chunk_size rows, so ingestion never waits
+    on the shared writer for more than one chunk; readers may see a mix of the
+    previous and the new metrics while a refresh is storing them.
+    """
+    def __init__(self, db_path, damping=0.85, write_chunk_size=5000, scope_chunk_triples=50000):
+        self.connections = get_connection_manager(db_path)
+        self.damping = damping
+        self.write_chunk_size = write_chunk_size
+        self.scope_chunk_triples = scope_chunk_triples
+        self._lock = threading.Lock()
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connections.writer() as conn:
+            conn.executescript(ANALYTICS_SCHEMA)
+
+    def last_run(self, conn=None):
+        if conn is None:
+            with self.connections.reader() as conn:
+                return self.last_run(conn)
+        row = conn.execute('''
+        SELECT finished_at, seconds, last_triple_id, nodes, edges, pagerank_iterations, community_iterations
+        FROM graph_analytics_runs ORDER BY id DESC LIMIT 1
+        ''').fetchone()
+        if row is None:
+            return None
+        keys = ['finished_at', 'seconds', 'last_triple_id', 'nodes', 'edges', 'pagerank_iterations', 'community_iterations']
+        return dict(zip(keys, row))
+
+    def refresh(self, force=False):
+        """
+        Recompute the metrics if triples changed since the last run (or force).
+        Returns the run summary, or None when nothing changed.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            with self.connections.reader() as conn:
+                last_triple_id, triple_count = conn.execute('SELECT COALESCE(MAX(id), 0), COUNT(*) FROM triples').fetchone()
+                previous = self.last_run(conn)
+                _, rewritten_at = triples_revision(conn)
+                # A rewrite committed while the last run was reading may not be in its results
+                rewritten = previous is not None and rewritten_at >= previous['finished_at'] - previous['seconds']
+                if not force and previous is not None and previous['last_triple_id'] == last_triple_id and not rewritten:
+                    return None
+                edges = np.array(conn.execute('''
+                SELECT entity1_id, entity2_id FROM triples
+                WHERE entity1_id IS NOT NULL AND entity2_id IS NOT NULL AND id <= ?
+                ''', (last_triple_id,)).fetchall(), dtype=np.int64).reshape(-1, 2)
+                stored = conn.execute('SELECT entity_id, pagerank, community FROM entity_metrics').fetchall()
+                scopes_from = None if force or rewritten else self._scopes_watermark(conn, previous)
+
+            entity_ids, dense = np.unique(edges, return_inverse=True)
+            dense = dense.reshape(-1, 2)
+            n = len(entity_ids)
+            # Duplicate (source, target) pairs are summed into the edge weight
+            adjacency = sp.csr_matrix((np.ones(len(dense)), (dense[:, 0], dense[:, 1])), shape=(n, n))
+            binary = adjacency.copy()
+            binary.data[:] = 1
+
+            out_degree = np.diff(binary.indptr)
+            in_degree = np.diff(binary.tocsc().indptr)
+            weighted_degree = np.asarray(adjacency.sum(axis=1)).ravel() + np.asarray(adjacency.sum(axis=0)).ravel()
+
+            ranks_start, labels_start = self._warm_start(entity_ids, stored)
+            ranks, pagerank_iterations = pagerank(adjacency, self.damping, start=ranks_start)
+            labels, community_iterations = label_propagation(adjacency, start=labels_start)
+            # Communities are named after their smallest entity id, so ids stay stable between runs
+            community_ids = np.full(labels.max() + 1 if n else 0, np.iinfo(np.int64).max)
+            np.minimum.at(community_ids, labels, entity_ids)
+
+            self._store_metrics(zip(entity_ids.tolist(), in_degree.tolist(), out_degree.tolist(),
+                                    (in_degree + out_degree).tolist(), weighted_degree.tolist(), ranks.tolist(),
+                                    community_ids[labels].tolist()),
+                                set(row[0] for row in stored) - set(entity_ids.tolist()))
+            if scopes_from is None:
+                self._rebuild_scopes(last_triple_id)
+            else:
+                self._add_scopes(scopes_from, last_triple_id, previous)
+
+            with self.connections.writer() as conn:
+                seconds = time.perf_counter() - start
+                conn.execute('''
+                INSERT INTO graph_analytics_runs (finished_at, seconds, last_triple_id, nodes, edges, pagerank_iterations, community_iterations)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (time.time(), seconds, last_triple_id, n, adjacency.nnz, pagerank_iterations, community_iterations))
+                summary = self.last_run(conn)
+        print(f"Graph analytics: {n} entities, {triple_count} triples in {summary['seconds']:.2f}s "
+              f"(PageRank {pagerank_iterations} iterations, communities {community_iterations}, "
+              f"{'all' if scopes_from is None else last_triple_id - scopes_from} triples rescoped)")
+        return summary
+
+    def _chunks(self, rows):
+        rows = list(rows)
+        for i in range(0, len(rows), self.write_chunk_size):
+            yield rows[i:i + self.write_chunk_size]
+
+    def _store_metrics(self, rows, removed_ids):
+        # Upserts in short transactions, so ingestion only ever waits for one chunk
+        for chunk in self._chunks(rows):
+            with self.connections.writer() as conn:
+                conn.executemany('''
+                INSERT INTO entity_metrics (entity_id, in_degree, out_degree, degree, weighted_degree, pagerank, community)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(entity_id) DO UPDATE SET
+                    in_degree = excluded.in_degree, out_degree = excluded.out_degree, degree = excluded.degree,
+                    weighted_degree = excluded.weighted_degree, pagerank = excluded.pagerank, community = excluded.community
+                ''', chunk)
+        for chunk in self._chunks((entity_id,) for entity_id in removed_ids):
+            with self.connections.writer() as conn:
+                conn.executemany('DELETE FROM entity_metrics WHERE entity_id = ?', chunk)
+
+    def _scopes_watermark(self, conn, previous):
+        """
+        Id of the last triple counted in entity_scopes, or None when the table
+        has to be rebuilt.
+        """
+        row = conn.execute("SELECT value FROM analytics_state WHERE name = 'scopes_last_triple_id'").fetchone()
+        if row is not None:
+            return row[0]
+        # Written before analytics_state existed, by a run that rebuilt the scopes in full
+        return previous['last_triple_id'] if previous is not None else None
+
+    @staticmethod
+    def _set_scopes_watermark(conn, last_triple_id):
+        conn.execute('''
+        INSERT INTO analytics_state (name, value) VALUES ('scopes_last_triple_id', ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        ''', (last_triple_id,))
+
+    @staticmethod
+    def _scope_counts(conn, after_id, last_triple_id):
+        return conn.execute('''
+        SELECT m.entity_id, r.brand_id, r.sub_category_id, m.type_id, r.sentiment, COUNT(*)
+        FROM (
+            SELECT entity1_id AS entity_id, review_id, type_id FROM triples
+            WHERE entity1_id IS NOT NULL AND id > ? AND id <= ?
+            UNION ALL
+            SELECT entity2_id, review_id, type_id FROM triples
+            WHERE entity2_id IS NOT NULL AND id > ? AND id <= ?
+        ) m
+        JOIN reviews r ON r.id = m.review_id
+        GROUP BY m.entity_id, r.brand_id, r.sub_category_id, m.type_id, r.sentiment
+        ''', (after_id, last_triple_id, after_id, last_triple_id)).fetchall()
+
+    def _add_scopes(self, after_id, last_triple_id, previous):
+        """
+        Add the mentions of triples in (after_id, last_triple_id] to
+        entity_scopes, a range of triples per transaction. Each transaction also
+        moves the watermark, so a range is never counted twice.
+        """
+        for low in range(after_id, last_triple_id, self.scope_chunk_triples):
+            high = min(low + self.scope_chunk_triples, last_triple_id)
+            with self.connections.reader() as conn:
+                counts = self._scope_counts(conn, low, high)
+            with self.connections.writer() as conn:
+                # Another process's refresh got here first
+                if self._scopes_watermark(conn, previous) != low:
+                    return
+                for entity_id, brand_id, sub_category_id, type_id, sentiment, mentions in counts:
+                    updated = conn.execute('''
+                    UPDATE entity_scopes SET mentions = mentions + ?
+                    WHERE brand_id IS ? AND sentiment IS ? AND type_id IS ? AND entity_id = ? AND sub_category_id IS ?
+                    ''', (mentions, brand_id, sentiment, type_id, entity_id, sub_category_id)).rowcount
+                    if not updated:
+                        conn.execute('''
+                        INSERT INTO entity_scopes (entity_id, brand_id, sub_category_id, type_id, sentiment, mentions)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (entity_id, brand_id, sub_category_id, type_id, sentiment, mentions))
+                self._set_scopes_watermark(conn, high)
+
+    def _rebuild_scopes(self, last_triple_id):
+        """
+        Recount entity_scopes from every triple up to last_triple_id on a read
+        connection, then write only the rows that changed, in short transactions.
+        """
+        with self.connections.writer() as conn:
+            # Until the rebuild finishes, the table is neither the old nor the new counts
+            self._set_scopes_watermark(conn, None)
+        with self.connections.reader() as conn:
+            counts = {tuple(row[:5]): row[5] for row in self._scope_counts(conn, 0, last_triple_id)}
+            existing = {tuple(row[1:6]): (row[0], row[6]) for row in conn.execute('''
+            SELECT rowid, entity_id, brand_id, sub_category_id, type_id, sentiment, mentions FROM entity_scopes
+            ''')}
+        changed = [(mentions, existing[key][0]) for key, mentions in counts.items()
+                   if key in existing and existing[key][1] != mentions]
+        added = [key + (mentions,) for key, mentions in counts.items() if key not in existing]
+        removed = [(rowid,) for key, (rowid, _) in existing.items() if key not in counts]
+        for chunk in self._chunks(changed):
+            with self.connections.writer() as conn:
+                conn.executemany('UPDATE entity_scopes SET mentions = ? WHERE rowid = ?', chunk)
+        for chunk in self._chunks(added):
+            with self.connections.writer() as conn:
+                conn.executemany('''
+                INSERT INTO entity_scopes (entity_id, brand_id, sub_category_id, type_id, sentiment, mentions)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', chunk)
+        for chunk in self._chunks(removed):
+            with self.connections.writer() as conn:
+                conn.executemany('DELETE FROM entity_scopes WHERE rowid = ?', chunk)
+        with self.connections.writer() as conn:
+            self._set_scopes_watermark(conn, last_triple_id)
+
+    @staticmethod
+    def _warm_start(entity_ids, stored):
+        if not stored:
+            return None, None
+        stored_ids, stored_ranks, stored_communities = (np.array(column) for column in zip(*stored))
+        positions = np.searchsorted(entity_ids, stored_ids)
+        positions = np.minimum(positions, len(entity_ids) - 1)
+        found = entity_ids[positions] == stored_ids
+
+        ranks = np.full(len(entity_ids), 1.0 / len(entity_ids))
+        ranks[positions[found]] = stored_ranks[found]
+        # Known entities keep their community's label; new entities start alone
+        labels = np.arange(len(entity_ids))
+        community_position = np.searchsorted(entity_ids, stored_communities[found])
+        community_position = np.minimum(community_position, len(entity_ids) - 1)
+        valid = entity_ids[community_position] == stored_communities[found]
+        labels[positions[found][valid]] = community_position[valid]
+        return ranks, labels
+
+    def top_entities(self, brand=None, sub_category=None, sentiment=None, entity_type=None, order_by='pagerank', limit=20):
+        """
+        Entities mentioned in the given scope, ranked by a global metric
+        (pagerank, degree or weighted_degree), with their mention counts in
+        that scope.
+        """
+        if order_by not in ('pagerank', 'degree', 'weighted_degree', 'mentions'):
+            raise ValueError(f"Unknown ordering: {order_by!r}")
+        conditions, params = [], []
+        for column, table, value in (('brand_id', 'brands', brand), ('sub_category_id', 'sub_categories', sub_category),
+                                     ('type_id', 'entity_types', entity_type)):
+            if value is not None:
+                conditions.append(f"s.{column} = (SELECT id FROM {table} WHERE name = ?)")
+                params.append(value)
+        if sentiment is not None:
+            conditions.append('s.sentiment = ?')
+            params.append(sentiment)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        rows = self._read(f'''
+        SELECT e.name, m.pagerank, m.degree, m.weighted_degree, m.community, SUM(s.mentions) AS mentions
+        FROM entity_scopes s
+        JOIN entity_metrics m ON m.entity_id = s.entity_id
+        JOIN entities e ON e.id = s.entity_id
+        {where}
+        GROUP BY s.entity_id
+        ORDER BY {order_by} DESC
+        LIMIT ?
+        ''', params + [limit])
+        keys = ['entity', 'pagerank', 'degree', 'weighted_degree', 'community', 'mentions']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def entity(self, name):
+        rows = self._read('''
+        SELECT e.name, m.in_degree, m.out_degree, m.degree, m.weighted_degree, m.pagerank, m.community
+        FROM entities e JOIN entity_metrics m ON m.entity_id = e.id
+        WHERE e.name = ?
+        ''', (name,))
+        if not rows:
+            return None
+        keys = ['entity', 'in_degree', 'out_degree', 'degree', 'weighted_degree', 'pagerank', 'community']
+        return dict(zip(keys, rows[0]))
+
+    def communities(self, limit=20, members=5):
+        """
+        The largest communities with their size and highest-PageRank members.
+        """
+        result = []
+        for community, size in self._read('''
+        SELECT community, COUNT(*) AS size FROM entity_metrics
+        GROUP BY community ORDER BY size DESC, community LIMIT ?
+        ''', (limit,)):
+            top = self._read('''
+            SELECT e.name FROM entity_metrics m JOIN entities e ON e.id = m.entity_id
+            WHERE m.community = ? ORDER BY m.pagerank DESC LIMIT ?
+            ''', (community, members))
+            result.append({'community': community, 'size': size, 'top_entities': [name for (name,) in top]})
+        return result
+
+    def _read(self, query, params=()):
+        with self.connections.reader() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def close_connection(self):
+        self.connections.release()
+
+
+class AnalyticsScheduler:
+    """
+    Background thread that calls GraphAnalytics.refresh() every interval_seconds.
+    refresh() is a no-op when no triples were added, so a short interval is cheap.
+    """
+    def __init__(self, analytics, interval_seconds=300):
+        self.analytics = analytics
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="graph-analytics", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.analytics.refresh()
+            except Exception as e:
+                print(f"Graph analytics refresh failed: {type(e).__name__}: {e}")
+            self._stop.wait(self.interval_seconds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute degree, PageRank and community tables for the review graph.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--force', action='store_true', help="Recompute even if no triples were added.")
+    parser.add_argument('--top', type=int, default=10, help="Print the top entities by PageRank.")
+    args = parser.parse_args()
+
+    analytics = GraphAnalytics(args.db_path)
+    try:
+        summary = analytics.refresh(force=args.force)
+        print(summary or f"Up to date: {analytics.last_run()}")
+        for row in analytics.top_entities(limit=args.top):
+            print(f"{row['pagerank']:.4f}  {row['entity']}")
+    finally:
+        analytics.close_connection()
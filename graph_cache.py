@@ -0,0 +1,112 @@
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+def estimate_size(value):
+    """
+    Rough in-memory size in bytes of a query result made of dicts, lists and
+    scalars. Only used to keep the cache under its byte budget.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class GraphCache:
+    """
+    In-process LRU cache of graph read results.
+
+    Entries are keyed by query name plus parameters and tagged with the graph
+    version they were read at. bump_version() is called after every write to
+    the graph, which drops everything cached so far; reads then go back to the
+    graph once and are served from memory until the next write. The cache is
+    bounded by max_entries and by an estimated max_bytes, evicting the least
+    recently used entries first. Cached results are shared, so callers must
+    treat them as read-only.
+
+    Writes made by another process (e.g. bulk_ingest.py) are not seen; entries
+    also expire after max_age_seconds when that is set.
+    """
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, max_age_seconds=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name, params):
+        return name + ':' + json.dumps(params, sort_keys=True, default=str)
+
+    def get_or_load(self, name, params, loader):
+        """
+        Return the cached result of name(params) for the current graph version,
+        calling loader() and caching its result on a miss.
+        """
+        key = self.make_key(name, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.max_age_seconds is None or now - entry[2] <= self.max_age_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+            self.misses += 1
+            version = self.version
+
+        value = loader()
+        size = estimate_size(value)
+
+        with self._lock:
+            # A write landed while loading; the result may already be stale
+            if version != self.version or size > self.max_bytes:
+                return value
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, now)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def bump_version(self):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+if __name__ == "__main__":
+    pass
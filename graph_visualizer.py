@@ -1,40 +1,285 @@
 import networkx as nx
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import sqlite3
+import argparse
+import json
+import os
+import random
+from collections import Counter
+from database import DatabaseManager, triples_revision
+from db_connection import get_connection_manager
 
 class GraphVisualizer:
-    def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path,check_same_thread=False)
-        self.cursor = self.conn.cursor()
+    """
+    Draw the review graph with networkx and matplotlib.
+
+    Layouts are cached per view (the top_k / category / sub_category selection)
+    together with the graph version they were computed for, in memory and
+    optionally in a JSON file at layout_cache_path. When the graph grows, nodes
+    that already have a position keep it and only the new nodes are placed, by
+    a short spring layout over the new nodes and their neighbours with the
+    neighbours pinned. render() and render_communities() select the
+    top-k-by-degree or single-community nodes in SQL and load only those, so
+    the cost of an image is bounded by top_k rather than the graph size.
+
+    The queries read the normalized schema, so opening a visualizer creates it
+    (or migrates a legacy processed_reviews table) first, like DatabaseManager.
+    """
+    def __init__(self, db_path, layout_cache_path=None, seed=42):
+        self.connections = get_connection_manager(db_path)
+        DatabaseManager(db_path).close_connection()
+        self.layout_cache_path = layout_cache_path
+        self.seed = seed
+        self.layouts = self._load_layouts()
+        self.rendered = {}
+
+    def graph_version(self):
+        # Inserts change (row count, last id); in-place rewrites of triples are counted separately
+        with self.connections.reader() as conn:
+            count, last_id = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM processed_reviews').fetchone()
+            rewrite_id, _ = triples_revision(conn)
+        return f"{count}:{last_id}:{rewrite_id}"
 
     def create_graph_from_db(self):
-        self.cursor.execute('''
-        SELECT entity1, entity2, relation, sentiment
-        FROM processed_reviews
-        ''')
-        rows = self.cursor.fetchall()
+        """
+        The whole database graph. A node's sentiment, category and sub_category
+        are the values it is mentioned with most often (ties go to the smallest
+        value), and an edge's relation is that of its latest triple, so the
+        result does not depend on row order.
+        """
+        with self.connections.reader() as conn:
+            rows = conn.execute('''
+            SELECT entity1, entity2, relation, sentiment, category, sub_category
+            FROM processed_reviews
+            ORDER BY id
+            ''').fetchall()
 
         G = nx.DiGraph()
-
-        for row in rows:
-            entity1, entity2, relation, sentiment = row
-            G.add_node(entity1, sentiment=sentiment)
-            G.add_node(entity2, sentiment=sentiment)
+        attributes = {}
+        for entity1, entity2, relation, sentiment, category, sub_category in rows:
+            for node in (entity1, entity2):
+                counts = attributes.setdefault(node, (Counter(), Counter(), Counter()))
+                for counter, value in zip(counts, (sentiment, category, sub_category)):
+                    counter[value] += 1
             G.add_edge(entity1, entity2, relation=relation)
 
+        for node, counts in attributes.items():
+            G.add_node(node, **{name: self._most_common(counter)
+                                for name, counter in zip(('sentiment', 'category', 'sub_category'), counts)})
         return G
 
-    def visualize_graph(self, G):
-        pos = nx.spring_layout(G)
+    @staticmethod
+    def _most_common(counter):
+        return min(counter.items(), key=lambda item: (-item[1], str(item[0])))[0]
+
+    def load_view(self, top_k=None, category=None, sub_category=None):
+        """
+        The subgraph for one view, selected in SQL: the top_k entities by degree
+        among the triples of reviews in category / sub_category, and the edges
+        of those triples between them. Only the selected nodes and their edges
+        are loaded, so the cost of drawing a view is bounded by top_k.
+        """
+        conditions = ['t.entity1_id IS NOT NULL', 't.entity2_id IS NOT NULL']
+        params = []
+        if category is not None:
+            conditions.append('r.category_id = (SELECT id FROM categories WHERE name = ?)')
+            params.append(category)
+        if sub_category is not None:
+            conditions.append('r.sub_category_id = (SELECT id FROM sub_categories WHERE name = ?)')
+            params.append(sub_category)
+        # Degree counts distinct (source, target) pairs, like networkx's DiGraph.degree
+        selection = f'''
+        WITH scoped AS (
+            SELECT t.id, t.entity1_id AS source, t.entity2_id AS target, t.relation_id
+            FROM triples t
+            JOIN reviews r ON r.id = t.review_id
+            WHERE {' AND '.join(conditions)}
+        ),
+        pairs AS (SELECT DISTINCT source, target FROM scoped),
+        degrees AS (
+            SELECT node, COUNT(*) AS degree
+            FROM (SELECT source AS node FROM pairs UNION ALL SELECT target FROM pairs)
+            GROUP BY node
+        ),
+        selected AS (
+            SELECT e.id, e.name
+            FROM degrees d
+            JOIN entities e ON e.id = d.node
+            ORDER BY d.degree DESC, e.name
+            LIMIT ?
+        )
+        '''
+        params.append(-1 if top_k is None else top_k)
+
+        G = nx.DiGraph()
+        with self.connections.reader() as conn:
+            G.add_nodes_from(name for name, in conn.execute(selection + 'SELECT name FROM selected', params))
+            edges = conn.execute(selection + '''
+            SELECT s1.name, s2.name, rel.name
+            FROM scoped sc
+            JOIN selected s1 ON s1.id = sc.source
+            JOIN selected s2 ON s2.id = sc.target
+            LEFT JOIN relations rel ON rel.id = sc.relation_id
+            ORDER BY sc.id
+            ''', params)
+            for entity1, entity2, relation in edges:
+                G.add_edge(entity1, entity2, relation=relation)
+        return G
+
+    @staticmethod
+    def select_subgraph(G, top_k=None, category=None, sub_category=None):
+        """
+        The part of G to draw: nodes in the given category / sub_category, then
+        the top_k of those by degree.
+        """
+        nodes = [node for node, data in G.nodes(data=True)
+                 if (category is None or data.get('category') == category)
+                 and (sub_category is None or data.get('sub_category') == sub_category)]
+        if top_k is not None and len(nodes) > top_k:
+            degree = G.degree(nodes)
+            nodes = sorted(nodes, key=lambda node: (-degree[node], str(node)))[:top_k]
+        return G.subgraph(nodes)
+
+    @staticmethod
+    def view_key(top_k=None, category=None, sub_category=None):
+        return json.dumps({'top_k': top_k, 'category': category, 'sub_category': sub_category}, sort_keys=True)
+
+    def layout(self, G, key, version=None, iterations=50):
+        """
+        Positions for every node of G, reusing the cached layout for key. Only
+        nodes without a cached position are placed.
+        """
+        cached = self.layouts.get(key)
+        if cached is not None and version is not None and cached['version'] == version and all(node in cached['pos'] for node in G):
+            return cached['pos']
+
+        previous = cached['pos'] if cached is not None else {}
+        pos = {node: previous[node] for node in G if node in previous}
+        new_nodes = [node for node in G if node not in pos]
+        if not pos:
+            pos = nx.spring_layout(G, iterations=iterations, seed=self.seed) if len(G) else {}
+        elif new_nodes:
+            pos.update(self._place_new_nodes(G, pos, new_nodes, iterations))
+
+        pos = {node: [float(x), float(y)] for node, (x, y) in pos.items()}
+        self.layouts[key] = {'version': version, 'pos': pos}
+        self._save_layouts()
+        return pos
+
+    def _place_new_nodes(self, G, pos, new_nodes, iterations):
+        # Start each new node next to its placed neighbours (or at random inside
+        # the current bounding box), then relax only the new nodes
+        rng = random.Random(self.seed)
+        xs = [xy[0] for xy in pos.values()]
+        ys = [xy[1] for xy in pos.values()]
+        undirected = G.to_undirected(as_view=True)
+        initial = {}
+        pinned = set()
+        for node in new_nodes:
+            placed = [neighbor for neighbor in undirected.neighbors(node) if neighbor in pos]
+            pinned.update(placed)
+            if placed:
+                x = sum(pos[neighbor][0] for neighbor in placed) / len(placed)
+                y = sum(pos[neighbor][1] for neighbor in placed) / len(placed)
+                initial[node] = [x + rng.uniform(-0.05, 0.05), y + rng.uniform(-0.05, 0.05)]
+            else:
+                initial[node] = [rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))]
+        for node in pinned:
+            initial[node] = pos[node]
+
+        local = undirected.subgraph(list(initial))
+        placed = nx.spring_layout(local, pos=initial, fixed=list(pinned) or None, iterations=iterations, seed=self.seed)
+        return {node: placed[node] for node in new_nodes}
+
+    def visualize_graph(self, G, path='./static/graph.png', top_k=None, category=None, sub_category=None, version=None):
+        """
+        Draw G (or its top_k / community subgraph) to path. The layout comes from
+        the cache for that view, and nothing is redrawn when path already holds
+        the same view at the same graph version.
+        """
+        key = self.view_key(top_k, category, sub_category)
+        if version is not None and self.rendered.get(path) == (key, version) and os.path.exists(path):
+            return path
+        return self._draw(self.select_subgraph(G, top_k, category, sub_category), path, key, version)
+
+    def _draw(self, G, path, key, version):
+        pos = self.layout(G, key, version)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
         plt.figure(figsize=(12, 8))
         nx.draw(G, pos, with_labels=True, node_color='lightblue', edge_color='gray', node_size=3000, font_size=10, font_weight='bold', arrows=True)
         edge_labels = nx.get_edge_attributes(G, 'relation')
         nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_color='red')
-        plt.savefig('./static/graph.png')
+        plt.savefig(path)
         plt.close()
+        self.rendered[path] = (key, version)
+        return path
+
+    def render(self, path='./static/graph.png', top_k=200, category=None, sub_category=None):
+        """
+        Draw one view of the current database graph, loading only its nodes
+        (see load_view()). Skips all work when the graph version has not
+        changed since path was last drawn.
+        """
+        version = self.graph_version()
+        key = self.view_key(top_k, category, sub_category)
+        if self.rendered.get(path) == (key, version) and os.path.exists(path):
+            return path
+        return self._draw(self.load_view(top_k, category, sub_category), path, key, version)
+
+    def render_communities(self, output_dir='./static/communities', top_k=200):
+        """
+        One image per sub-category, each limited to its top_k nodes by degree
+        among that sub-category's reviews. Returns {sub_category: path}.
+        """
+        with self.connections.reader() as conn:
+            sub_categories = [name for name, in conn.execute('''
+            SELECT sc.name FROM sub_categories sc
+            WHERE EXISTS (SELECT 1 FROM reviews r WHERE r.sub_category_id = sc.id)
+            ORDER BY sc.name
+            ''')]
+        paths = {}
+        for sub_category in sub_categories:
+            filename = ''.join(c if c.isalnum() else '_' for c in sub_category) + '.png'
+            paths[sub_category] = self.render(os.path.join(output_dir, filename), top_k, sub_category=sub_category)
+        return paths
+
+    def _load_layouts(self):
+        if not self.layout_cache_path or not os.path.exists(self.layout_cache_path):
+            return {}
+        with open(self.layout_cache_path) as f:
+            return json.load(f)
+
+    def _save_layouts(self):
+        if not self.layout_cache_path:
+            return
+        os.makedirs(os.path.dirname(self.layout_cache_path) or '.', exist_ok=True)
+        tmp_path = self.layout_cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.layouts, f)
+        os.replace(tmp_path, self.layout_cache_path)
 
     def close_connection(self):
-        self.conn.close()
+        self.connections.release()
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Render the review graph to PNG.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--output', default='./static/graph.png')
+    parser.add_argument('--top-k', type=int, default=200, help="Draw only the top-k nodes by degree (0 for all).")
+    parser.add_argument('--category')
+    parser.add_argument('--sub-category')
+    parser.add_argument('--per-community', action='store_true', help="Write one image per sub-category instead.")
+    parser.add_argument('--layout-cache', default='./static/graph_layout.json')
+    args = parser.parse_args()
+
+    graph_visualizer = GraphVisualizer(args.db_path, layout_cache_path=args.layout_cache)
+    try:
+        top_k = args.top_k or None
+        if args.per_community:
+            for sub_category, path in graph_visualizer.render_communities(os.path.dirname(args.output) or '.', top_k).items():
+                print(f"{sub_category}: {path}")
+        else:
+            print(graph_visualizer.render(args.output, top_k, args.category, args.sub_category))
+    finally:
+        graph_visualizer.close_connection()
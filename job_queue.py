@@ -0,0 +1,279 @@
+import json
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from db_connection import get_connection_manager
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class JobQueue:
+    """
+    In-process job queue with a pool of worker threads.
+
+    handler(payload, report_progress, resume_stage) does the work for one job.
+    If db_path is given, jobs are also kept in an ingest_jobs table and any job
+    that was queued when the process stopped is picked up again on start. The
+    table is written through the shared ConnectionManager for db_path, so job
+    updates wait their turn behind other writers to the same file instead of
+    failing with "database is locked".
+
+    Several processes can share the table. A worker claims a job with a
+    conditional UPDATE, so each job runs once. Running jobs are touched every
+    heartbeat_seconds; one that has not been touched for stale_after seconds
+    belonged to a process that died, and is queued again. resume_stage is None
+    on a job's first run and otherwise the last stage the earlier run
+    reported, so the handler can skip work that run already committed.
+
+    Only queued and running jobs, with their payloads, are held in memory.
+    Finished jobs are served from the table, or without db_path from an LRU of
+    the last max_finished_jobs jobs.
+    """
+    def __init__(self, handler, num_workers=2, db_path=None, max_finished_jobs=10000, heartbeat_seconds=15,
+                 stale_after=120):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_finished_jobs = max_finished_jobs
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_after = stale_after
+        self.jobs = {}
+        self._finished = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._monitor_thread = None
+        self._stopping = threading.Event()
+        self.connections = None
+        if db_path:
+            self.connections = get_connection_manager(db_path)
+            self.create_table()
+            self._restore_jobs()
+
+    def create_table(self):
+        with self.connections.writer() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, updated_at)')
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            if self.connections:
+                self._monitor_thread = threading.Thread(target=self._monitor, name="ingest-job-monitor", daemon=True)
+                self._monitor_thread.start()
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+            if self._monitor_thread is not None:
+                self._monitor_thread.join()
+        self._workers = []
+        self._monitor_thread = None
+        if self.connections:
+            self.connections.release()
+            self.connections = None
+
+    def submit(self, payload):
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': QUEUED,
+            'stage': None,
+            'payload': payload,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+        if self.connections:
+            with self.connections.writer() as conn:
+                conn.execute('''
+                INSERT INTO ingest_jobs (id, status, stage, payload, result, error, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (job['id'], job['status'], None, json.dumps(payload), None, None, now, now))
+        with self._lock:
+            self.jobs[job['id']] = job
+        self._queue.put(job['id'])
+        return job['id']
+
+    def get(self, job_id):
+        """
+        Return a copy of the job's public fields, or None if the id is unknown.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return {key: value for key, value in job.items() if key != 'payload'}
+            job = self._finished.get(job_id)
+            if job is not None:
+                self._finished.move_to_end(job_id)
+                return dict(job)
+        if self.connections:
+            return self._load_job(job_id)
+        return None
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            row = (job['status'], job['stage'], json.dumps(job['result']), job['error'], job['updated_at'], job_id)
+        # Never wait for the writer while holding _lock: a handler may call this from inside its own writer() block
+        if self.connections:
+            with self.connections.writer() as conn:
+                conn.execute('''
+                UPDATE ingest_jobs SET status = ?, stage = ?, result = ?, error = ?, updated_at = ?
+                WHERE id = ?
+                ''', row)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            try:
+                self._run(job_id)
+                self._finish(job_id, saved=True)
+            except Exception:
+                # e.g. the job's status could not be saved; the worker moves on to the next job
+                traceback.print_exc()
+                self._finish(job_id, saved=False)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self.jobs[job_id]
+            payload, resume_stage = job['payload'], job['stage']
+        try:
+            if not self._claim(job_id):
+                # Another process took the job first
+                return
+            result = self.handler(payload, lambda stage: self._update(job_id, stage=stage), resume_stage)
+            self._update(job_id, status=SUCCEEDED, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}")
+
+    def _claim(self, job_id):
+        if not self.connections:
+            self._update(job_id, status=RUNNING)
+            return True
+        now = time.time()
+        with self.connections.writer() as conn:
+            claimed = conn.execute('''
+            UPDATE ingest_jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?
+            ''', (RUNNING, now, job_id, QUEUED)).rowcount
+        if claimed:
+            with self._lock:
+                self.jobs[job_id].update(status=RUNNING, updated_at=now)
+        return claimed == 1
+
+    def _finish(self, job_id, saved):
+        # A job whose final status reached the table is read back from there; any
+        # other finished job stays in the bounded LRU, without its payload
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+            if job is None or (saved and self.connections):
+                return
+            job.pop('payload', None)
+            self._finished[job_id] = job
+            while len(self._finished) > self.max_finished_jobs:
+                self._finished.popitem(last=False)
+
+    def _monitor(self):
+        while not self._stopping.wait(self.heartbeat_seconds):
+            try:
+                self._heartbeat()
+                self._restore_jobs(queued_before=time.time() - self.stale_after)
+            except Exception:
+                traceback.print_exc()
+
+    def _heartbeat(self):
+        now = time.time()
+        with self._lock:
+            running = [job_id for job_id, job in self.jobs.items() if job['status'] == RUNNING]
+        if running:
+            with self.connections.writer() as conn:
+                conn.executemany('UPDATE ingest_jobs SET updated_at = ? WHERE id = ? AND status = ?',
+                                 [(now, job_id, RUNNING) for job_id in running])
+
+    def _restore_jobs(self, queued_before=None):
+        """
+        Queue jobs left behind by processes that stopped: running jobs nobody has
+        touched for stale_after seconds, and queued jobs last updated before
+        queued_before (all queued jobs when it is None). The claim in _run keeps
+        a job that another process also queued from running twice.
+        """
+        stale = time.time() - self.stale_after
+        with self.connections.writer() as conn:
+            conn.execute('UPDATE ingest_jobs SET status = ? WHERE status = ? AND updated_at < ?', (QUEUED, RUNNING, stale))
+        with self.connections.reader() as conn:
+            rows = conn.execute('''
+            SELECT id, stage, payload, created_at, updated_at FROM ingest_jobs
+            WHERE status = ? AND updated_at < ?
+            ORDER BY created_at
+            ''', (QUEUED, float('inf') if queued_before is None else queued_before)).fetchall()
+        with self._lock:
+            rows = [row for row in rows if row[0] not in self.jobs]
+            for job_id, stage, payload, created_at, updated_at in rows:
+                self.jobs[job_id] = {
+                    'id': job_id,
+                    'status': QUEUED,
+                    'stage': stage,
+                    'payload': json.loads(payload),
+                    'result': None,
+                    'error': None,
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                }
+        for row in rows:
+            self._queue.put(row[0])
+        if rows:
+            print(f"Re-queued {len(rows)} unfinished ingestion jobs.")
+
+    def _load_job(self, job_id):
+        with self.connections.reader() as conn:
+            row = conn.execute('''
+            SELECT id, status, stage, result, error, created_at, updated_at
+            FROM ingest_jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, status, stage, result, error, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'status': status,
+            'stage': stage,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,399 @@
+import argparse
+import threading
+import time
+import numpy as np
+from database import triples_revision
+from db_connection import get_connection_manager
+from neo4j_manager import GRAPH_FILTERS, entity_key
+
+class Interner:
+    """
+    Map strings to dense integer codes and back.
+    """
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def get(self, value):
+        return self.codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class GrowableArray:
+    """
+    Append-only numpy array with amortized doubling. view() returns the filled
+    prefix; views taken before a resize stay valid, so readers can keep using a
+    snapshot while rows are appended.
+    """
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            capacity = max(needed, 2 * len(self.data))
+            data = np.empty(capacity, dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def set(self, index, values):
+        self.data[index] = values
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class MemoryGraph:
+    """
+    In-process graph engine over processed_reviews, a drop-in for Neo4jManager
+    in the web app.
+
+    Entities are interned to integer node ids using the same entity_key as the
+    Neo4j graph, with their attributes stored as interned codes. Edges are
+    parallel arrays (source, target, relation, type and sentiment codes, row_id)
+    in row_id order; like the Neo4j RELATED edges, each carries the type and
+    sentiment of its own review row. Out- and in-adjacency are CSR index
+    arrays over the edges; rows appended since the last CSR build are scanned
+    directly, and the CSR is rebuilt once that tail grows past
+    rebuild_fraction of the graph.
+    """
+    def __init__(self, db_path=None, batch_size=10000, rebuild_fraction=0.1, graph_cache=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.rebuild_fraction = rebuild_fraction
+        self.graph_cache = graph_cache
+        self.last_load_stats = None
+        self._lock = threading.RLock()
+        self._connections = {}
+        self._reset()
+        if db_path:
+            self.load_data_from_sqlite(db_path)
+
+    def _reset(self):
+        self.last_id = 0
+        self.revision = 0
+        self.strings = Interner()
+        self.node_index = Interner()
+        self.nodes_by_name = {}
+        self.node_name = GrowableArray(np.int32)
+        self.node_brand = GrowableArray(np.int32)
+        self.node_category = GrowableArray(np.int32)
+        self.node_sub_category = GrowableArray(np.int32)
+
+        self.edge_source = GrowableArray(np.int32)
+        self.edge_target = GrowableArray(np.int32)
+        self.edge_relation = GrowableArray(np.int32)
+        self.edge_type = GrowableArray(np.int32)
+        self.edge_sentiment = GrowableArray(np.int32)
+        self.edge_row_id = GrowableArray(np.int64)
+
+        self._csr = None
+
+    def close(self):
+        for connections in self._connections.values():
+            connections.release()
+        self._connections = {}
+
+    @property
+    def num_nodes(self):
+        return len(self.node_index)
+
+    @property
+    def num_edges(self):
+        return self.edge_row_id.size
+
+    def load_data_from_sqlite(self, db_path, full_resync=False, batch_size=None):
+        """
+        Add processed_reviews rows newer than the last one loaded, or reload
+        every row when triples were rewritten in place since the last load (see
+        database.triples_revision). Returns the number of rows added.
+        """
+        batch_size = batch_size or self.batch_size
+        start = time.perf_counter()
+        added = 0
+        with self._lock:
+            connections = self._connections.get(db_path)
+            if connections is None:
+                connections = self._connections[db_path] = get_connection_manager(db_path)
+            with connections.reader() as conn:
+                revision = triples_revision(conn)[0]
+                if full_resync or revision != self.revision:
+                    if revision != self.revision and self.last_id:
+                        print("Triples were rewritten since the last load; reloading the memory graph.")
+                    self._reset()
+                    self.revision = revision
+                    if self.graph_cache is not None:
+                        self.graph_cache.bump_version()
+                cursor = conn.execute('''
+                SELECT id, entity1, entity2, type, relation, sentiment, brand, category, sub_category
+                FROM processed_reviews
+                WHERE id > ?
+                ORDER BY id
+                ''', (self.last_id,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    self.add_rows(rows)
+                    added += len(rows)
+        seconds = time.perf_counter() - start
+        self.last_load_stats = {'rows': added, 'seconds': seconds, 'rows_per_sec': added / seconds if seconds > 0 else 0.0}
+        if added:
+            print(f"Memory graph load: {added} rows in {seconds:.2f}s ({self.num_nodes} nodes, {self.num_edges} edges)")
+        return added
+
+    def full_resync(self, db_path):
+        return self.load_data_from_sqlite(db_path, full_resync=True)
+
+    def add_rows(self, rows):
+        """
+        Append (id, entity1, entity2, type, relation, sentiment, brand, category,
+        sub_category) tuples, in increasing id order.
+        """
+        sources, targets, relations, types, sentiments, row_ids = [], [], [], [], [], []
+        with self._lock:
+            for row_id, entity1, entity2, type_, relation, sentiment, brand, category, sub_category in rows:
+                sub_category = sub_category if sub_category else "Unknown"
+                attributes = (brand, category, sub_category)
+                sources.append(self._node(entity1, attributes))
+                targets.append(self._node(entity2, attributes))
+                relations.append(self.strings.code(relation))
+                types.append(self.strings.code(type_))
+                sentiments.append(self.strings.code(sentiment))
+                row_ids.append(row_id)
+            if not row_ids:
+                return
+            self.edge_source.extend(sources)
+            self.edge_target.extend(targets)
+            self.edge_relation.extend(relations)
+            self.edge_type.extend(types)
+            self.edge_sentiment.extend(sentiments)
+            self.edge_row_id.extend(row_ids)
+            self.last_id = row_ids[-1]
+        if self.graph_cache is not None:
+            self.graph_cache.bump_version()
+
+    def _node(self, name, attributes):
+        brand, category, sub_category = attributes
+        key = entity_key(name, brand, category, sub_category)
+        is_new = key not in self.node_index.codes
+        node = self.node_index.code(key)
+        codes = [self.strings.code(value) for value in attributes]
+        if is_new:
+            self.nodes_by_name.setdefault(' '.join(str(name).lower().split()), []).append(node)
+            self.node_name.extend([self.strings.code(name)])
+            for column, code in zip(self._attribute_columns(), codes):
+                column.extend([code])
+        else:
+            # The key only fixes the normalized name; like the Neo4j SET, the latest spelling wins
+            self.node_name.set(node, self.strings.code(name))
+            for column, code in zip(self._attribute_columns(), codes):
+                column.set(node, code)
+        return node
+
+    def _attribute_columns(self):
+        return (self.node_brand, self.node_category, self.node_sub_category)
+
+    def _adjacency(self):
+        """
+        (edge count covered, out indptr, out edge ids, in indptr, in edge ids),
+        rebuilt when the uncovered tail gets too long.
+        """
+        with self._lock:
+            num_edges = self.num_edges
+            if self._csr is None or num_edges - self._csr[0] > max(1024, self.rebuild_fraction * num_edges):
+                num_nodes = self.num_nodes
+                source = self.edge_source.view()
+                target = self.edge_target.view()
+                out_order = np.argsort(source, kind='stable')
+                in_order = np.argsort(target, kind='stable')
+                out_indptr = np.concatenate(([0], np.cumsum(np.bincount(source, minlength=num_nodes))))
+                in_indptr = np.concatenate(([0], np.cumsum(np.bincount(target, minlength=num_nodes))))
+                self._csr = (num_edges, out_indptr, out_order, in_indptr, in_order)
+            return self._csr
+
+    def _incident_edges(self, nodes, direction='out'):
+        """
+        Ids of edges leaving (out), entering (in) or touching (both) any of nodes.
+        """
+        covered, out_indptr, out_order, in_indptr, in_order = self._adjacency()
+        nodes = np.asarray(nodes, dtype=np.int64)
+        parts = []
+        for side, indptr, order, endpoint in (('out', out_indptr, out_order, self.edge_source),
+                                              ('in', in_indptr, in_order, self.edge_target)):
+            if direction not in (side, 'both'):
+                continue
+            known = nodes[nodes < len(indptr) - 1]
+            parts.extend(order[indptr[node]:indptr[node + 1]] for node in known)
+            tail = endpoint.view()[covered:]
+            parts.append(covered + np.nonzero(np.isin(tail, nodes))[0])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def _filter_mask(self, edges, filters):
+        unknown = set(filters) - set(GRAPH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown graph filters: {sorted(unknown)}")
+        mask = np.ones(len(edges), dtype=bool)
+        source = self.edge_source.view()[edges]
+        for name, value in filters.items():
+            if value is None:
+                continue
+            code = self.strings.get(value)
+            if name in ('relation', 'sentiment'):
+                column = {'relation': self.edge_relation, 'sentiment': self.edge_sentiment}[name].view()[edges]
+            else:
+                column = {'category': self.node_category, 'sub_category': self.node_sub_category,
+                          'brand': self.node_brand}[name].view()[source]
+            mask &= column == code
+        return mask
+
+    def _records(self, edges):
+        values = self.strings.values
+        source = self.edge_source.view()[edges]
+        target = self.edge_target.view()[edges]
+        columns = zip(
+            self.edge_row_id.view()[edges].tolist(),
+            self.node_name.view()[source].tolist(),
+            self.node_name.view()[target].tolist(),
+            self.edge_relation.view()[edges].tolist(),
+            self.edge_sentiment.view()[edges].tolist(),
+            self.node_brand.view()[source].tolist(),
+            self.node_category.view()[source].tolist(),
+            self.node_sub_category.view()[source].tolist(),
+        )
+        for row_id, entity1, entity2, relation, sentiment, brand, category, sub_category in columns:
+            yield {
+                'RowId': row_id,
+                'Entity1': values[entity1],
+                'Entity2': values[entity2],
+                'Relation': values[relation],
+                'Sentiment': values[sentiment],
+                'Brand': values[brand],
+                'Category': values[category],
+                'SubCategory': values[sub_category],
+            }
+
+    def _cached_read(self, name, params, loader):
+        if self.graph_cache is None:
+            return loader()
+        return self.graph_cache.get_or_load(name, params, loader)
+
+    def _page_edges(self, after, limit, filters):
+        with self._lock:
+            row_ids = self.edge_row_id.view()
+            start = int(np.searchsorted(row_ids, after, side='right'))
+            candidates = np.arange(start, len(row_ids))
+            if any(value is not None for value in filters.values()):
+                candidates = candidates[self._filter_mask(candidates, filters)]
+            if limit is not None:
+                candidates = candidates[:limit]
+            return list(self._records(candidates))
+
+    def retrieve_graph_data(self):
+        def load():
+            return [{'Entity1': record['Entity1'], 'Entity2': record['Entity2'], 'Relation': record['Relation']}
+                    for record in self._page_edges(0, None, {})]
+        return self._cached_read('retrieve_graph_data', {}, load)
+
+    def query_graph(self, after=0, limit=100, **filters):
+        """
+        Same contract as Neo4jManager.query_graph.
+        """
+        params = dict(filters, after=after or 0, limit=limit + 1)
+        edges = self._cached_read('query_graph', params, lambda: self._page_edges(after or 0, limit + 1, filters))
+        next_cursor = None
+        if len(edges) > limit:
+            edges = edges[:limit]
+            next_cursor = edges[-1]['RowId']
+        return {'edges': edges, 'next_cursor': next_cursor}
+
+    def stream_graph(self, after=0, limit=None, **filters):
+        after = after or 0
+        while True:
+            page = self.query_graph(after=after, limit=self.batch_size if limit is None else min(limit, self.batch_size), **filters)
+            for record in page['edges']:
+                yield record
+            if limit is not None:
+                limit -= len(page['edges'])
+                if limit <= 0:
+                    return
+            if page['next_cursor'] is None:
+                return
+            after = page['next_cursor']
+
+    def find_nodes(self, name):
+        return list(self.nodes_by_name.get(' '.join(str(name).lower().split()), []))
+
+    def neighbors(self, name, direction='both', **filters):
+        """
+        Edges incident to every entity called name (any brand or category),
+        narrowed by GRAPH_FILTERS, as query_graph records in row_id order.
+        """
+        return self.k_hop(name, k=1, direction=direction, **filters)
+
+    def k_hop(self, name, k=2, direction='both', **filters):
+        """
+        Edges reachable within k hops of the entities called name, following
+        edges in direction ('out', 'in' or 'both'), as query_graph records in
+        row_id order. Filters apply to the edges that are traversed.
+        """
+        with self._lock:
+            frontier = self.find_nodes(name)
+            seen_nodes = set(frontier)
+            seen_edges = set()
+            for _ in range(k):
+                if not frontier:
+                    break
+                edges = self._incident_edges(frontier, direction)
+                edges = edges[self._filter_mask(edges, filters)]
+                seen_edges.update(edges.tolist())
+                endpoints = np.concatenate((self.edge_source.view()[edges], self.edge_target.view()[edges]))
+                frontier = [node for node in np.unique(endpoints).tolist() if node not in seen_nodes]
+                seen_nodes.update(frontier)
+            return list(self._records(np.array(sorted(seen_edges), dtype=np.int64)))
+
+    def to_networkx(self, edges=None):
+        """
+        networkx DiGraph of the given edge ids (default: all), with each edge's
+        relation and sentiment as attributes, for GraphVisualizer.visualize_graph().
+        """
+        import networkx as nx
+        G = nx.DiGraph()
+        with self._lock:
+            if edges is None:
+                edges = np.arange(self.num_edges)
+            for record in self._records(edges):
+                G.add_edge(record['Entity1'], record['Entity2'], relation=record['Relation'], sentiment=record['Sentiment'])
+        return G
+
+    def stats(self):
+        return {'nodes': self.num_nodes, 'edges': self.num_edges, 'last_id': self.last_id, 'revision': self.revision}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load processed reviews into the in-memory graph and query it.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--entity', help="Print the edges within --hops of this entity.")
+    parser.add_argument('--hops', type=int, default=1)
+    args = parser.parse_args()
+
+    graph = MemoryGraph(args.db_path)
+    print(graph.stats())
+    if args.entity:
+        for record in graph.k_hop(args.entity, k=args.hops):
+            print(f"{record['Entity1']} -[{record['Relation']}]-> {record['Entity2']}")
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+# Seconds; covers sub-millisecond preprocessing up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class PipelineMetrics:
+    """
+    The review pipeline's latency histograms and counters.
+
+    stage(name) times one pipeline stage (preprocess, llm_extract,
+    prepare_dataframe, canonicalize, sqlite_insert, graph_sync,
+    graph_retrieval) and counts it as an error if it raises. record_usage()
+    adds the prompt and completion tokens of an LLM response. Label children
+    are looked up once per stage, so the hot path is a dict get and the
+    child's observe().
+
+    The metrics are prometheus_client collectors in their own registry (not
+    the process-wide default one), so several instances can coexist.
+    """
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else CollectorRegistry()
+        self.stage_seconds = Histogram(
+            'review_pipeline_stage_duration_seconds', 'Time spent in each review pipeline stage.', ['stage'],
+            registry=self.registry, buckets=DEFAULT_BUCKETS)
+        self.stage_errors = Counter(
+            'review_pipeline_stage_errors', 'Review pipeline stage calls that raised an exception.', ['stage'],
+            registry=self.registry)
+        self.llm_tokens = Counter(
+            'llm_tokens', 'Tokens reported in LLM response usage.', ['model', 'kind'], registry=self.registry)
+        self.llm_requests = Counter(
+            'llm_requests', 'Entity extraction calls, by whether the response carried token usage.', ['model', 'usage'],
+            registry=self.registry)
+        self.entities = Counter(
+            'review_pipeline_entities', 'Entity rows prepared for storage.', registry=self.registry)
+        self.graph_rows = Counter(
+            'graph_sync_rows', 'Rows pushed to the graph by graph syncs.', registry=self.registry)
+        self.http_seconds = Histogram(
+            'http_request_duration_seconds', 'Flask request latency until the response is returned.',
+            ['endpoint', 'method', 'status'], registry=self.registry, buckets=DEFAULT_BUCKETS)
+        self._stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        children = self._stages.get(name)
+        if children is None:
+            children = self._stages[name] = (self.stage_seconds.labels(name), self.stage_errors.labels(name))
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            children[1].inc()
+            raise
+        finally:
+            children[0].observe(time.perf_counter() - start)
+
+    def record_usage(self, model, usage):
+        model = model or 'unknown'
+        self.llm_requests.labels(model, 'yes' if usage else 'no').inc()
+        if usage:
+            self.llm_tokens.labels(model, 'prompt').inc(usage.get('prompt_tokens') or 0)
+            self.llm_tokens.labels(model, 'completion').inc(usage.get('completion_tokens') or 0)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self.http_seconds.labels(endpoint or 'unmatched', method, status).observe(seconds)
+
+    def render(self):
+        return generate_latest(self.registry).decode('utf-8')
+
+if __name__ == "__main__":
+    pass
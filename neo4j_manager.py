@@ -1,49 +1,478 @@
 from neo4j import GraphDatabase
-import sqlite3
+from neo4j.exceptions import DriverError, Neo4jError, ServiceUnavailable, SessionExpired, TransientError
+import argparse
+import os
+import threading
+import time
+from database import triples_revision
+from db_connection import get_connection_manager
+
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+# Created IF NOT EXISTS, so running them on every start is cheap
+SCHEMA_STATEMENTS = [
+    'CREATE CONSTRAINT entity_key IF NOT EXISTS FOR (e:Entity) REQUIRE e.key IS UNIQUE',
+    'CREATE CONSTRAINT community_name IF NOT EXISTS FOR (c:Community) REQUIRE c.name IS UNIQUE',
+    'CREATE CONSTRAINT sub_community_name IF NOT EXISTS FOR (sc:SubCommunity) REQUIRE sc.name IS UNIQUE',
+    'CREATE INDEX related_row_id IF NOT EXISTS FOR ()-[r:RELATED]-() ON (r.row_id)',
+]
+
+# Filters accepted by query_graph/stream_graph and the graph property each one matches
+GRAPH_FILTERS = {
+    'category': 'e1.category',
+    'sub_category': 'e1.sub_category',
+    'brand': 'e1.brand',
+    'relation': 'r.relation',
+    'sentiment': 'r.sentiment',
+}
+
+def entity_key(name, brand, category, sub_category):
+    """
+    Identity of an Entity node: its case- and whitespace-normalized name scoped
+    to brand, category and sub-category. Type and sentiment belong to the review
+    row, so they are stored on its RELATED edge and the entity stays one node.
+    """
+    return '|'.join(' '.join(str(part).lower().split()) if part is not None else ''
+                    for part in (name, brand, category, sub_category))
+
 
 class Neo4jManager:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, batch_size=1000, max_retries=3, retry_backoff=1.0, graph_cache=None,
+                 create_schema=True):
+        self.uri = uri
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.last_load_stats = None
+        self._sync_lock = threading.Lock()
+        self._connections = {}
+        self._schema_created = False
+        # Optional GraphCache for reads; every committed write batch invalidates it
+        self.graph_cache = graph_cache
+        if create_schema:
+            try:
+                self.create_schema()
+            except (Neo4jError, DriverError) as e:
+                # Retried before the first read or write
+                print(f"Neo4j schema setup deferred: {e}")
 
     def close(self):
         self.driver.close()
+        for connections in self._connections.values():
+            connections.release()
+        self._connections = {}
 
-    def load_data_from_sqlite(self, db_path):
-        conn = sqlite3.connect(db_path,check_same_thread=False)
-        cursor = conn.cursor()
+    def _connection_manager(self, db_path):
+        # One reference per database for the manager's lifetime instead of a connection per sync
+        connections = self._connections.get(db_path)
+        if connections is None:
+            connections = self._connections[db_path] = get_connection_manager(db_path)
+        return connections
 
-        cursor.execute('''
-        SELECT user_id, entity1, entity2, type, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating
-        FROM processed_reviews
-        ''')
+    def load_data_from_sqlite(self, db_path, full_resync=False, batch_size=None):
+        """
+        Push processed_reviews rows to Neo4j in UNWIND batches.
 
-        rows = cursor.fetchall()
+        Only rows with an id above the stored watermark for this Neo4j target are
+        pushed, unless full_resync is set. When triples were rewritten in place
+        since the last sync (see database.triples_revision), the RELATED edges
+        are deleted and every row is pushed again. Returns the number of rows
+        pushed.
+        """
+        batch_size = batch_size or self.batch_size
+        self.create_schema()
+        with self._sync_lock:
+            connections = self._connection_manager(db_path)
+            with connections.writer() as conn:
+                self._create_sync_state_table(conn)
+                last_id, synced_revision = self._get_sync_state(conn.cursor())
+                revision = triples_revision(conn)[0]
+            rewritten = synced_revision is not None and synced_revision != revision
+            if full_resync or rewritten:
+                last_id = 0
+            if rewritten:
+                print("Triples were rewritten since the last Neo4j sync; rebuilding the RELATED edges.")
+                self._delete_related_edges(batch_size)
+                with connections.writer() as conn:
+                    self._set_watermark(conn, 0, revision)
+            synced_id = last_id
+            pushed = 0
+            start = time.perf_counter()
 
+            try:
+                # A pooled read connection, so ingestion keeps writing while rows are pushed
+                with connections.reader() as conn, self.driver.session() as session:
+                    cursor = conn.execute('''
+                    SELECT id, user_id, entity1, entity2, type, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating
+                    FROM processed_reviews
+                    WHERE id > ?
+                    ORDER BY id
+                    ''', (last_id,))
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        self._write_batch(session, [self._row_params(row) for row in rows])
+                        synced_id = rows[-1][0]
+                        pushed += len(rows)
+            finally:
+                # Keep whatever made it across so a retry resumes from there
+                if synced_id != last_id or full_resync or synced_revision is None:
+                    with connections.writer() as conn:
+                        self._set_watermark(conn, synced_id, revision)
+                self._record_load_stats(pushed, time.perf_counter() - start)
+
+            return pushed
+
+    def write_rows(self, rows, batch_size=None):
+        """
+        Bulk-write an iterable of row dicts (keys as produced by _row_params) to Neo4j.
+        Returns the number of rows written.
+        """
+        batch_size = batch_size or self.batch_size
+        self.create_schema()
+        written = 0
+        start = time.perf_counter()
+        batch = []
+        try:
+            with self.driver.session() as session:
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        self._write_batch(session, batch)
+                        written += len(batch)
+                        batch = []
+                if batch:
+                    self._write_batch(session, batch)
+                    written += len(batch)
+        finally:
+            self._record_load_stats(written, time.perf_counter() - start)
+        return written
+
+    def _delete_related_edges(self, batch_size):
+        """
+        Delete every RELATED edge, and the Entity nodes left without one, in
+        batches. Used before re-pushing rows whose entities changed.
+        """
         with self.driver.session() as session:
-            for row in rows:
-                user_id, entity1, entity2, type_, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating = row
-                session.write_transaction(self._create_graph, user_id, entity1, entity2, type_, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating)
+            for query in ('MATCH ()-[r:RELATED]->() WITH r LIMIT $limit DELETE r RETURN count(*)',
+                          'MATCH (e:Entity) WHERE NOT (e)-[:RELATED]-() WITH e LIMIT $limit DETACH DELETE e RETURN count(*)'):
+                while session.run(query, limit=batch_size).single()[0]:
+                    pass
+        if self.graph_cache is not None:
+            self.graph_cache.bump_version()
 
-        conn.close()
+    def _write_batch(self, session, batch):
+        attempt = 0
+        while True:
+            try:
+                session.execute_write(self._create_graph_batch, batch)
+                if self.graph_cache is not None:
+                    self.graph_cache.bump_version()
+                return
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"Transient Neo4j error on batch of {len(batch)} rows ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _record_load_stats(self, rows, seconds):
+        rows_per_sec = rows / seconds if seconds > 0 else 0.0
+        self.last_load_stats = {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows_per_sec}
+        if rows:
+            print(f"Neo4j load: {rows} rows in {seconds:.2f}s ({rows_per_sec:.0f} rows/sec)")
 
     @staticmethod
-    def _create_graph(tx, user_id, entity1, entity2, type_, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating):
+    def _row_params(row):
+        row_id, user_id, entity1, entity2, type_, relation, sentiment, brand, category, sub_category, cleaned_review_content, rating = row
         sub_category = sub_category if sub_category else "Unknown"
-        
+        return {
+            'id': row_id,
+            'user_id': user_id,
+            'entity1': entity1,
+            'entity2': entity2,
+            'entity1_key': entity_key(entity1, brand, category, sub_category),
+            'entity2_key': entity_key(entity2, brand, category, sub_category),
+            'type': type_,
+            'relation': relation,
+            'sentiment': sentiment,
+            'brand': brand,
+            'category': category,
+            'sub_category': sub_category,
+            'review': cleaned_review_content,
+            'rating': rating,
+        }
+
+    def full_resync(self, db_path):
+        """
+        Re-push every stored row, ignoring the watermark. MERGE keeps this idempotent.
+        """
+        return self.load_data_from_sqlite(db_path, full_resync=True)
+
+    def migrate_entity_keys(self, db_path, batch_size=None):
+        """
+        One-off migration of a graph written before entity keys existed.
+
+        Sets key on every Entity, merges nodes that share a key (and Community
+        and SubCommunity nodes that share a name) with APOC, removes the
+        duplicate structural edges that leaves behind, then rebuilds the RELATED
+        edges from SQLite so each review row is exactly one edge with a row_id.
+        Requires the APOC plugin. Returns a dict of counts.
+        """
+        batch_size = batch_size or self.batch_size
+        stats = {}
+        with self.driver.session() as session:
+            nodes = session.run('''
+            MATCH (e:Entity) WHERE e.key IS NULL
+            RETURN elementId(e) AS id, e.name AS name, e.brand AS brand, e.category AS category, e.sub_category AS sub_category
+            ''').data()
+            keyed = [{'id': node['id'], 'key': entity_key(node['name'], node['brand'], node['category'], node['sub_category'])}
+                     for node in nodes]
+            for i in range(0, len(keyed), batch_size):
+                session.run('''
+                UNWIND $rows AS row
+                MATCH (e:Entity) WHERE elementId(e) = row.id
+                SET e.key = row.key
+                ''', rows=keyed[i:i + batch_size]).consume()
+            stats['keyed'] = len(keyed)
+
+            for label, prop in (('Entity', 'key'), ('Community', 'name'), ('SubCommunity', 'name')):
+                values = session.run(f'''
+                MATCH (n:{label}) WITH n.{prop} AS value, count(*) AS copies
+                WHERE value IS NOT NULL AND copies > 1
+                RETURN value
+                ''').value()
+                for i in range(0, len(values), batch_size):
+                    session.run(f'''
+                    UNWIND $values AS value
+                    MATCH (n:{label} {{{prop}: value}})
+                    WITH value, collect(n) AS nodes
+                    CALL apoc.refactor.mergeNodes(nodes, {{properties: 'overwrite', mergeRels: false}}) YIELD node
+                    RETURN count(node)
+                    ''', values=values[i:i + batch_size]).consume()
+                stats[f'merged_{label}'] = len(values)
+
+            for rel_type in ('BELONGS_TO', 'PART_OF'):
+                stats[f'removed_{rel_type}'] = session.run(f'''
+                MATCH (a)-[r:{rel_type}]->(b)
+                WITH a, b, collect(r) AS rels WHERE size(rels) > 1
+                UNWIND tail(rels) AS r
+                DELETE r
+                RETURN count(*)
+                ''').single()[0]
+            # RELATED edges are rebuilt from SQLite below
+            stats['removed_RELATED'] = session.run('''
+            MATCH ()-[r:RELATED]->()
+            DELETE r
+            RETURN count(*)
+            ''').single()[0]
+
+        self._schema_created = False
+        self.create_schema()
+        if self.graph_cache is not None:
+            self.graph_cache.bump_version()
+        stats['resynced'] = self.load_data_from_sqlite(db_path, full_resync=True, batch_size=batch_size)
+        return stats
+
+    @staticmethod
+    def _create_sync_state_table(conn):
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS neo4j_sync_state (
+            target TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        # Sync state written before triples_revision existed
+        if 'revision' not in [row[1] for row in conn.execute('PRAGMA table_info(neo4j_sync_state)')]:
+            conn.execute('ALTER TABLE neo4j_sync_state ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+    def _get_sync_state(self, cursor):
+        """
+        (watermark, triples revision the graph was synced at), or (0, None) for
+        a target that was never synced.
+        """
+        cursor.execute('SELECT last_id, revision FROM neo4j_sync_state WHERE target = ?', (self.uri,))
+        row = cursor.fetchone()
+        return row if row else (0, None)
+
+    def _set_watermark(self, conn, last_id, revision):
+        conn.execute('''
+        INSERT INTO neo4j_sync_state (target, last_id, revision) VALUES (?, ?, ?)
+        ON CONFLICT(target) DO UPDATE SET last_id = excluded.last_id, revision = excluded.revision
+        ''', (self.uri, last_id, revision))
+
+    @staticmethod
+    def _create_graph_batch(tx, rows):
         tx.run('''
-        MERGE (c:Community {name: $category})
-        MERGE (sc:SubCommunity {name: $sub_category})-[:PART_OF]->(c)
-        MERGE (e1:Entity {name: $entity1, type: $type_, sentiment: $sentiment, brand: $brand, category: $category, sub_category: $sub_category})-[:BELONGS_TO]->(sc)
-        MERGE (e2:Entity {name: $entity2, type: $type_, sentiment: $sentiment, brand: $brand, category: $category, sub_category: $sub_category})-[:BELONGS_TO]->(sc)
-        MERGE (e1)-[:RELATED {relation: $relation, user_id: $user_id, review: $cleaned_review_content, rating: $rating}]->(e2)
-        ''', entity1=entity1, entity2=entity2, type_=type_, relation=relation, sentiment=sentiment, brand=brand, category=category, sub_category=sub_category, user_id=user_id, cleaned_review_content=cleaned_review_content, rating=rating)
+        UNWIND $rows AS row
+        MERGE (c:Community {name: row.category})
+        MERGE (sc:SubCommunity {name: row.sub_category})
+        MERGE (sc)-[:PART_OF]->(c)
+        MERGE (e1:Entity {key: row.entity1_key})
+        SET e1.name = row.entity1, e1.brand = row.brand, e1.category = row.category, e1.sub_category = row.sub_category
+        MERGE (e1)-[:BELONGS_TO]->(sc)
+        MERGE (e2:Entity {key: row.entity2_key})
+        SET e2.name = row.entity2, e2.brand = row.brand, e2.category = row.category, e2.sub_category = row.sub_category
+        MERGE (e2)-[:BELONGS_TO]->(sc)
+        MERGE (e1)-[r:RELATED {row_id: row.id}]->(e2)
+        SET r.relation = row.relation, r.type = row.type, r.sentiment = row.sentiment, r.user_id = row.user_id, r.review = row.review, r.rating = row.rating
+        ''', rows=rows)
+
+    def create_schema(self):
+        """
+        Create the uniqueness constraints that back the Entity, Community and
+        SubCommunity MERGEs, and the RELATED.row_id index that graph pages are
+        ordered and resumed by. Creating the Entity constraint fails on a graph
+        written before entity keys existed; run migrate_entity_keys() first.
+        """
+        if self._schema_created:
+            return
+        with self.driver.session() as session:
+            for statement in SCHEMA_STATEMENTS:
+                try:
+                    session.run(statement).consume()
+                except Neo4jError:
+                    if statement.startswith('CREATE CONSTRAINT'):
+                        print("Could not create a uniqueness constraint; if the graph predates entity keys, "
+                              "run neo4j_manager.py --migrate-entities")
+                    raise
+        self._schema_created = True
+
+    @staticmethod
+    def _graph_query(filters, limit):
+        conditions = ['r.row_id > $after']
+        for name, field in GRAPH_FILTERS.items():
+            if filters.get(name) is not None:
+                conditions.append(f"{field} = ${name}")
+        query = f'''
+        MATCH (e1:Entity)-[r:RELATED]->(e2:Entity)
+        WHERE {' AND '.join(conditions)}
+        RETURN r.row_id as RowId, e1.name as Entity1, e2.name as Entity2, r.relation as Relation,
+               r.sentiment as Sentiment, e1.brand as Brand, e1.category as Category, e1.sub_category as SubCategory
+        ORDER BY r.row_id
+        '''
+        if limit is not None:
+            query += 'LIMIT $limit'
+        return query
+
+    @staticmethod
+    def _graph_params(after, limit, filters):
+        unknown = set(filters) - set(GRAPH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown graph filters: {sorted(unknown)}")
+        params = {name: value for name, value in filters.items() if value is not None}
+        params['after'] = after or 0
+        if limit is not None:
+            params['limit'] = limit
+        return params
+
+    def query_graph(self, after=0, limit=100, **filters):
+        """
+        One page of RELATED edges with row_id above after, in row_id order,
+        narrowed by the GRAPH_FILTERS given as keyword arguments. Returns
+        {'edges': [...], 'next_cursor': row_id to pass as after for the next page,
+        or None on the last page}.
+        """
+        params = self._graph_params(after, limit + 1, filters)
+        edges = self._cached_read('query_graph', params, lambda: self._run_graph_query(filters, limit + 1, params))
+        next_cursor = None
+        if len(edges) > limit:
+            edges = edges[:limit]
+            next_cursor = edges[-1]['RowId']
+        return {'edges': edges, 'next_cursor': next_cursor}
+
+    def _run_graph_query(self, filters, limit, params):
+        self.create_schema()
+        with self.driver.session() as session:
+            return session.run(self._graph_query(filters, limit), params).data()
+
+    def _cached_read(self, name, params, loader):
+        if self.graph_cache is None:
+            return loader()
+        return self.graph_cache.get_or_load(name, params, loader)
+
+    def stream_graph(self, after=0, limit=None, **filters):
+        """
+        Yield edge dicts (same shape as query_graph) as the driver receives them,
+        without buffering the whole result. The session stays open until the
+        generator is exhausted or closed.
+        """
+        self.create_schema()
+        params = self._graph_params(after, limit, filters)
+        with self.driver.session(fetch_size=self.batch_size) as session:
+            for record in session.run(self._graph_query(filters, limit), params):
+                yield record.data()
 
     def retrieve_graph_data(self):
+        return self._cached_read('retrieve_graph_data', {}, self._retrieve_graph_data)
+
+    def _retrieve_graph_data(self):
         with self.driver.session() as session:
             result = session.run('''
             MATCH (e1:Entity)-[r:RELATED]->(e2:Entity)
             RETURN e1.name as Entity1, e2.name as Entity2, r.relation as Relation
             ''')
             return result.data()
+
+
+class GraphSyncScheduler:
+    """
+    Background thread that calls graph_store.load_data_from_sqlite(db_path)
+    every interval_seconds, so rows written by other processes (bulk_ingest.py)
+    and in-place rewrites (entity_canonicalizer.py) reach the graph without
+    waiting for the next ingested review.
+    """
+    def __init__(self, graph_store, db_path, interval_seconds=60):
+        self.graph_store = graph_store
+        self.db_path = db_path
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="graph-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.graph_store.load_data_from_sqlite(db_path=self.db_path)
+            except Exception as e:
+                print(f"Graph sync failed: {type(e).__name__}: {e}")
+
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync processed reviews from SQLite to Neo4j.")
+    parser.add_argument('--db-path', default='amazon_reviews.db')
+    parser.add_argument('--uri', default=os.getenv('NEO4J_URI', 'neo4j+s://67d73379.databases.neo4j.io'))
+    parser.add_argument('--user', default=os.getenv('NEO4J_USER', 'neo4j'))
+    parser.add_argument('--password', default=os.getenv('NEO4J_PASSWORD', ''))
+    parser.add_argument('--full-resync', action='store_true', help="Ignore the watermark and re-push every row.")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Rows per UNWIND transaction.")
+    parser.add_argument('--migrate-entities', action='store_true',
+                        help="Merge duplicate nodes from a graph written before entity keys (needs APOC), then resync.")
+    args = parser.parse_args()
+
+    neo4j_manager = Neo4jManager(args.uri, args.user, args.password, batch_size=args.batch_size,
+                                 create_schema=not args.migrate_entities)
+    try:
+        if args.migrate_entities:
+            print(f"Migrated entity keys: {neo4j_manager.migrate_entity_keys(args.db_path)}")
+        else:
+            pushed = neo4j_manager.load_data_from_sqlite(args.db_path, full_resync=args.full_resync)
+            print(f"Pushed {pushed} rows to Neo4j.")
+    finally:
+        neo4j_manager.close()
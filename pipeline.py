@@ -0,0 +1,74 @@
+from contextlib import nullcontext
+
+class ReviewPipeline:
+    """
+    Run a single review through preprocessing, entity extraction, entity
+    canonicalization (when a canonicalizer is given), SQLite storage and the
+    graph sync. With a PipelineMetrics, every stage is timed and the LLM's
+    token usage is counted.
+    """
+    def __init__(self, text_preprocessor, extraction_backend, db_manager, neo4j_manager, db_path, canonicalizer=None,
+                 metrics=None):
+        self.text_preprocessor = text_preprocessor
+        self.extraction_backend = extraction_backend
+        self.db_manager = db_manager
+        self.neo4j_manager = neo4j_manager
+        self.db_path = db_path
+        self.canonicalizer = canonicalizer
+        self.metrics = metrics
+
+    def _stage(self, name):
+        return self.metrics.stage(name) if self.metrics is not None else nullcontext()
+
+    def process(self, review, report_progress=None, resume_stage=None):
+        """
+        Process a review dict with the index form fields (review_text, user_id,
+        review_rating, brand, category, sub_category). A resume_stage of
+        'sync_graph' means an earlier run already stored the review, so only the
+        graph sync runs again and the entity count is None.
+        """
+        report_progress = report_progress or (lambda stage: None)
+
+        entity_count = None
+        if resume_stage != 'sync_graph':
+            entity_count = self._store_review(review, report_progress)
+
+        with self._stage('graph_sync'):
+            pushed = self.neo4j_manager.load_data_from_sqlite(db_path=self.db_path)
+        if self.metrics is not None:
+            self.metrics.entities.inc(entity_count or 0)
+            self.metrics.graph_rows.inc(pushed or 0)
+
+        return {'entities': entity_count}
+
+    def _store_review(self, review, report_progress):
+        report_progress('preprocess')
+        with self._stage('preprocess'):
+            cleaned_text = self.text_preprocessor.preprocess(review['review_text'])
+
+        report_progress('extract_entities')
+        with self._stage('llm_extract'):
+            entities_dict, usage = self.extraction_backend.extract_entities_with_usage(cleaned_text)
+        if self.metrics is not None:
+            self.metrics.record_usage(self.extraction_backend.model, usage)
+        print("Entities Dictionary:- \n", entities_dict)
+        with self._stage('prepare_dataframe'):
+            entities_df = self.extraction_backend.prepare_dataframe(
+                entities_dict, review['user_id'], review['review_rating'],
+                review['brand'], review['category'], review['sub_category']
+            )
+        if self.canonicalizer is not None:
+            report_progress('canonicalize')
+            with self._stage('canonicalize'):
+                entities_df = self.canonicalizer.canonicalize_dataframe(entities_df)
+
+        report_progress('store')
+        # Reporting the next stage inside the insert's transaction commits both together when the
+        # job table lives in the review database, so a resumed job knows whether its triples were stored
+        with self._stage('sqlite_insert'), self.db_manager.connections.writer():
+            self.db_manager.insert_data(cleaned_text, entities_df)
+            report_progress('sync_graph')
+        return len(entities_df)
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+FORMATS = ('collapsed', 'speedscope')
+_UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread: a background thread reads the target
+    thread's current frame every interval seconds and counts the call stacks
+    it sees. The profiled thread runs unmodified (no sys.setprofile hook), so
+    the overhead is the sampling thread's share of the GIL.
+    """
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.thread_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None or self._stop.is_set():
+            return self
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self.started_at
+        return self
+
+    def _run(self):
+        own_file = os.path.abspath(__file__)
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if os.path.abspath(code.co_filename) != own_file:
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+                self.samples += 1
+
+    @staticmethod
+    def frame_name(frame):
+        name, filename, line = frame
+        # ';' separates frames in the collapsed format
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ':')
+
+    def collapsed(self):
+        """
+        Brendan Gregg's collapsed-stack text: one 'root;...;leaf count' line
+        per distinct stack. flamegraph.pl and speedscope both read it.
+        """
+        return ''.join(f"{';'.join(self.frame_name(frame) for frame in stack)} {count}\n"
+                       for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name):
+        """
+        The samples as a speedscope 'sampled' profile (weights in seconds).
+        """
+        frames = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.most_common():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': [{'name': frame[0], 'file': frame[1], 'line': frame[2]} for frame in frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self.seconds,
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'profiling.StackSampler',
+        }
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of individual Flask requests.
+
+    A request is profiled only when its endpoint is in allowed_endpoints and it
+    asks for it with the X-Profile header or the profile query parameter (set
+    to token when one is configured, otherwise any non-empty value). Its
+    samples are written to output_dir as a collapsed-stack or speedscope file
+    named after the endpoint, and the file name is returned in the
+    X-Profile-Output response header. install() registers no request hooks
+    when the allowlist is empty, so a disabled profiler costs nothing.
+    """
+    def __init__(self, output_dir='profiles', allowed_endpoints=(), token=None, interval=0.005, output_format='collapsed'):
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown profile format: {output_format!r}")
+        self.output_dir = output_dir
+        self.allowed_endpoints = frozenset(allowed_endpoints)
+        self.token = token
+        self.interval = interval
+        self.output_format = output_format
+
+    @property
+    def enabled(self):
+        return bool(self.allowed_endpoints)
+
+    def install(self, app):
+        if not self.enabled:
+            return self
+        from flask import g, request
+
+        @app.before_request
+        def start_request_profile():
+            if request.endpoint not in self.allowed_endpoints or not self.requested(request.headers, request.args):
+                return
+            g.profile_sampler = StackSampler(interval=self.interval).start()
+            g.profile_path = self.output_path(request.endpoint)
+
+        @app.after_request
+        def finish_request_profile(response):
+            sampler = g.pop('profile_sampler', None)
+            if sampler is None:
+                return response
+            path = g.pop('profile_path')
+            response.headers['X-Profile-Output'] = os.path.basename(path)
+            if response.is_streamed:
+                # The body is generated while it is sent; stop once it is done
+                response.call_on_close(lambda: self.write(sampler.stop(), path))
+            else:
+                self.write(sampler.stop(), path)
+            return response
+
+        @app.teardown_request
+        def abandon_request_profile(exc):
+            # Requests that raised never reach after_request
+            sampler = g.pop('profile_sampler', None)
+            if sampler is not None:
+                self.write(sampler.stop(), g.pop('profile_path'))
+
+        return self
+
+    def requested(self, headers, args):
+        """
+        Whether a request with these headers and query args asked to be
+        profiled; for work that leaves the request thread (ingest jobs).
+        """
+        requested = headers.get('X-Profile') or args.get('profile')
+        return bool(self.enabled and requested and (self.token is None or requested == self.token))
+
+    @contextmanager
+    def profile(self, label):
+        """
+        Profile the calling thread for the duration of the block and write the
+        result like a request profile named label.
+        """
+        sampler = StackSampler(interval=self.interval).start()
+        path = self.output_path(label)
+        try:
+            yield path
+        finally:
+            self.write(sampler.stop(), path)
+
+    def output_path(self, label):
+        extension = '.collapsed' if self.output_format == 'collapsed' else '.speedscope.json'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{_UNSAFE_FILENAME.sub('_', label)}-{uuid.uuid4().hex[:8]}{extension}"
+        return os.path.join(self.output_dir, name)
+
+    def write(self, sampler, path):
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(path, 'w') as f:
+            if self.output_format == 'collapsed':
+                f.write(sampler.collapsed())
+            else:
+                json.dump(sampler.speedscope(os.path.basename(path)), f)
+        print(f"Profile: {sampler.samples} samples over {sampler.seconds:.3f}s written to {path}")
+        return path
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,90 @@
+import re
+import pandas as pd
+
+# Rules in priority order: the first rule with a keyword contained in entity2 wins.
+# Because keywords match as substrings, 'Liked By' claims everything containing
+# 'recommend' or 'like' (so 'not recommend' and 'dislike' too). 'Recommended By' can
+# therefore never fire, 'Not Recommended By' only fires through 'avoid' and 'Disliked By'
+# only through 'hate'. The dead entries are kept so results stay identical to the
+# original if-chain.
+RELATION_RULES = [
+    # Product-Feature Relations
+    ('Has Ingredient', ('ingredient', 'charcoal', 'magnesium')),
+    ('Causes', ('irritation', 'rash', 'sensitivity')),
+    ('Has Scent', ('scent', 'fragrance', 'smell')),
+    ('Provides Benefit', ('absorb', 'protection', 'long-lasting')),
+    ('Worth', ('price', 'expensive', 'cost')),
+    ('Easy To Apply', ('application', 'apply')),
+
+    # Product-Sentiment Relations
+    ('Liked By', ('like', 'love', 'recommend')),
+    ('Disliked By', ('dislike', 'hate', 'not recommend')),
+    ('Recommended By', ('recommend',)),
+    ('Not Recommended By', ('not recommend', 'avoid')),
+
+    # Product-Usage Relations
+    ('Suitable For', ('sensitive skin', 'dry skin', 'oily skin')),
+    ('Used For', ('daily use', 'travel')),
+
+    # Product-Performance Relations
+    ('Effective For', ('effective', 'works')),
+    ('Long-Lasting', ('lasts', 'durable')),
+    ('Quick Results', ('quick results', 'immediate')),
+
+    # Product-Comparison Relations
+    ('Better Than', ('better than', 'superior to')),
+    ('Worse Than', ('worse than', 'inferior to')),
+]
+
+DEFAULT_RELATION = 'Related To'
+
+
+class RelationClassifier:
+    """
+    Map entity2 strings to a relation using a rule table compiled into one regex.
+
+    Every keyword becomes an alternative inside a lookahead, so a single scan
+    finds all keyword occurrences, overlapping ones included. Alternatives are
+    ordered by rule priority, so where several keywords start at the same
+    position the highest-priority one is reported. The answer is the
+    highest-priority rule among all matches, which is exactly what the ordered
+    if-chain returned.
+    """
+    def __init__(self, rules=RELATION_RULES, default=DEFAULT_RELATION):
+        self.relations = [relation for relation, _ in rules]
+        self.default = default
+        self.priority = {}
+        for index, (_, keywords) in enumerate(rules):
+            for keyword in keywords:
+                self.priority.setdefault(keyword, index)
+        ordered = sorted(self.priority, key=lambda keyword: (self.priority[keyword], -len(keyword)))
+        self.pattern = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in ordered) + '))')
+
+    def classify(self, entity2):
+        matches = self.pattern.findall(entity2.lower())
+        if not matches:
+            return self.default
+        return self.relations[min(self.priority[match] for match in matches)]
+
+    def classify_series(self, entity2):
+        """
+        Classify a whole Series at once. Each distinct value is matched once and
+        the labels are broadcast back through the factorized codes.
+        """
+        codes, uniques = pd.factorize(entity2, use_na_sentinel=False)
+        labels = pd.Series([self.classify(value) for value in uniques], dtype=object)
+        return pd.Series(labels.to_numpy()[codes], index=entity2.index, dtype=object)
+
+
+RELATION_CLASSIFIER = RelationClassifier()
+
+
+def classify_relation(entity2):
+    return RELATION_CLASSIFIER.classify(entity2)
+
+
+def classify_relations(entity2):
+    return RELATION_CLASSIFIER.classify_series(entity2)
+
+if __name__ == "__main__":
+    pass
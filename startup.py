@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class StartupReport:
+    """
+    Import and initialization timings for the web app's cold start.
+
+    Imports are timed with timed_import() while the app module loads; components
+    are timed by LazyComponent when they are first used.
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.ready_seconds = None
+        self.imports = {}
+        self.components = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed_import(self, name):
+        start = time.perf_counter()
+        yield
+        self.imports[name] = time.perf_counter() - start
+
+    def mark_ready(self):
+        # Module import done, the app can take requests
+        self.ready_seconds = time.perf_counter() - self._start
+        total = sum(self.imports.values())
+        print(f"Startup: ready in {self.ready_seconds:.3f}s ({total:.3f}s in imports)")
+
+    def record_component(self, name, seconds, error=None):
+        with self._lock:
+            self.components[name] = {
+                'seconds': seconds,
+                'initialized_after': time.perf_counter() - self._start - seconds,
+                'error': error,
+            }
+        status = f"failed ({error})" if error else "initialized"
+        print(f"Startup: {name} {status} in {seconds:.3f}s")
+
+    def register_component(self, name):
+        # Listed as None until it is first used
+        with self._lock:
+            self.components.setdefault(name, None)
+
+    def as_dict(self):
+        with self._lock:
+            components = dict(self.components)
+        return {
+            'started_at': self.started_at,
+            'ready_seconds': self.ready_seconds,
+            'imports': dict(self.imports),
+            'components': components,
+        }
+
+
+class LazyComponent:
+    """
+    Stand-in for a component that is built by factory() on first attribute
+    access, so nothing touches the network or disk until it is needed. A failed
+    build is not cached; the next use tries again.
+    """
+    def __init__(self, name, factory, report=None):
+        self._name = name
+        self._factory = factory
+        self._report = report
+        self._instance = None
+        self._lock = threading.Lock()
+        if report is not None:
+            report.register_component(name)
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def resolve(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                start = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    if self._report is not None:
+                        self._report.record_component(self._name, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+                    raise
+                if self._report is not None:
+                    self._report.record_component(self._name, time.perf_counter() - start)
+            return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        state = 'initialized' if self.initialized else 'pending'
+        return f"<LazyComponent {self._name} ({state})>"
+
+if __name__ == "__main__":
+    pass
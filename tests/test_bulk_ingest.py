@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_ingest import CSV_COLUMNS, DONE, FAILED, BulkIngestor
+from database import DatabaseManager
+from extraction_backend import LocalExtractionBackend
+
+
+class LowercasePreprocessor:
+    # Keeps the test independent of the NLTK stopword corpus
+    def preprocess(self, text):
+        return str(text).lower()
+
+    def preprocess_batch(self, texts):
+        return [self.preprocess(text) for text in texts]
+
+
+class FlakyBackend(LocalExtractionBackend):
+    """
+    Local backend that fails on reviews containing any of the words in failing.
+    """
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.calls = 0
+
+    def extract_entities(self, text):
+        self.calls += 1
+        if self.failing & set(text.split()):
+            raise ValueError("extraction failed")
+        return super().extract_entities(text)
+
+
+class BulkIngestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, 'reviews.csv')
+        rows = [[f"id{i}", f"title {i}", f"review{i} deodorant scent great", 5, f"u{i}", 'Dove', 'Beauty', 'Deodorant']
+                for i in range(7)]
+        pd.DataFrame(rows, columns=CSV_COLUMNS).to_csv(self.csv_path, index=False)
+        self.db_manager = DatabaseManager(os.path.join(self.tmp.name, 'reviews.db'))
+
+    def tearDown(self):
+        self.db_manager.close_connection()
+        self.tmp.cleanup()
+
+    def ingestor(self, backend, **options):
+        return BulkIngestor(self.db_manager, backend, LowercasePreprocessor(), chunk_size=3, **options)
+
+    def progress(self):
+        with self.db_manager.connections.reader() as conn:
+            return dict(conn.execute('SELECT uniq_id, status FROM bulk_ingest_progress'))
+
+    def review_count(self):
+        with self.db_manager.connections.reader() as conn:
+            return conn.execute('SELECT COUNT(DISTINCT cleaned_review_content) FROM processed_reviews').fetchone()[0]
+
+    def test_restarted_run_skips_finished_reviews(self):
+        backend = FlakyBackend()
+        stats = self.ingestor(backend).ingest(self.csv_path, limit=4)
+        self.assertEqual((stats['processed'], stats['skipped']), (4, 0))
+
+        stats = self.ingestor(backend).ingest(self.csv_path)
+        self.assertEqual((stats['processed'], stats['skipped']), (3, 4))
+        self.assertEqual(backend.calls, 7)
+        self.assertEqual(self.review_count(), 7)
+        self.assertEqual(set(self.progress().values()), {DONE})
+
+    def test_failed_reviews_are_only_retried_when_asked(self):
+        self.ingestor(FlakyBackend(failing={'review2', 'review5'})).ingest(self.csv_path)
+        self.assertEqual(self.progress()['id2'], FAILED)
+        self.assertEqual(self.review_count(), 5)
+
+        backend = FlakyBackend()
+        stats = self.ingestor(backend).ingest(self.csv_path)
+        self.assertEqual((stats['processed'], stats['skipped'], backend.calls), (0, 7, 0))
+
+        stats = self.ingestor(backend, retry_failed=True).ingest(self.csv_path)
+        self.assertEqual((stats['processed'], stats['skipped']), (2, 5))
+        self.assertEqual(self.review_count(), 7)
+        self.assertEqual(set(self.progress().values()), {DONE})
+
+    def test_a_crash_while_storing_leaves_neither_triples_nor_progress(self):
+        insert_many = self.db_manager.insert_many
+        calls = []
+
+        def crash_on_second_chunk(reviews, batch_commit_size=None):
+            calls.append(1)
+            inserted = insert_many(reviews, batch_commit_size)
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return inserted
+
+        self.db_manager.insert_many = crash_on_second_chunk
+        with self.assertRaises(RuntimeError):
+            self.ingestor(FlakyBackend()).ingest(self.csv_path)
+        self.assertEqual(sorted(self.progress()), ['id0', 'id1', 'id2'])
+        self.assertEqual(self.review_count(), 3)
+
+        del self.db_manager.insert_many
+        stats = self.ingestor(FlakyBackend()).ingest(self.csv_path)
+        self.assertEqual((stats['processed'], stats['skipped']), (4, 3))
+        self.assertEqual(self.review_count(), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
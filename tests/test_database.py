@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import INSERT_COLUMNS, DatabaseManager
+
+LEGACY_TABLE = '''
+CREATE TABLE processed_reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cleaned_review_content TEXT, user_id TEXT, entity1 TEXT, entity2 TEXT, type TEXT, relation TEXT,
+    rating REAL, sentiment TEXT, brand TEXT, category TEXT, sub_category TEXT
+)
+'''
+
+VIEW_COLUMNS = ['id', 'cleaned_review_content'] + INSERT_COLUMNS
+
+LEGACY_ROWS = [
+    (1, 'smells great', 'u1', 'deodorant', 'scent', 'Product-Feature', 'Has Scent', 5.0, 'Positive', 'Dove', 'Beauty', 'Deodorant'),
+    (2, 'smells great', 'u1', 'deodorant', 'charcoal', 'Product-Feature', 'Has Ingredient', 5.0, 'Positive', 'Dove', 'Beauty', 'Deodorant'),
+    (4, 'smells great', 'u2', 'deodorant', 'scent', 'Product-Feature', 'Has Scent', 4.0, 'Positive', 'Dove', 'Beauty', 'Deodorant'),
+    (7, 'caused a rash', 'u3', 'stick', 'rash', None, 'Causes', 1.0, 'Negative', None, 'Beauty', None),
+    (9, 'caused a rash', 'u3', 'stick', None, 'Product-Feature', None, 1.0, 'Negative', None, 'Beauty', None),
+]
+
+
+def view_rows(conn):
+    return conn.execute(f"SELECT {', '.join(VIEW_COLUMNS)} FROM processed_reviews ORDER BY id").fetchall()
+
+
+class LegacyMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'reviews.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(LEGACY_TABLE)
+        conn.executemany(f"INSERT INTO processed_reviews VALUES ({', '.join('?' * 12)})", LEGACY_ROWS)
+        # A row inserted and deleted again still raised the AUTOINCREMENT counter
+        conn.execute("INSERT INTO processed_reviews (id, entity1) VALUES (12, 'gone')")
+        conn.execute('DELETE FROM processed_reviews WHERE id = 12')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_view_returns_the_legacy_rows_with_their_ids(self):
+        db_manager = DatabaseManager(self.db_path)
+        with db_manager.connections.reader() as conn:
+            self.assertEqual(view_rows(conn), LEGACY_ROWS)
+            kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'processed_reviews'").fetchone()[0]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        db_manager.close_connection()
+        self.assertEqual(kind, 'view')
+        self.assertNotIn('processed_reviews_legacy', tables)
+
+    def test_rows_sharing_review_fields_become_one_review(self):
+        db_manager = DatabaseManager(self.db_path)
+        with db_manager.connections.reader() as conn:
+            reviews = conn.execute('SELECT id, user_id FROM reviews ORDER BY id').fetchall()
+            review_ids = [row[0] for row in conn.execute('SELECT review_id FROM triples ORDER BY id')]
+            entities = conn.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+        db_manager.close_connection()
+        self.assertEqual(reviews, [(1, 'u1'), (4, 'u2'), (7, 'u3')])
+        self.assertEqual(review_ids, [1, 1, 4, 7, 7])
+        self.assertEqual(entities, 5)
+
+    def test_new_triples_get_ids_above_the_legacy_counter(self):
+        db_manager = DatabaseManager(self.db_path)
+        entities_df = pd.DataFrame([['u4', 'soap', 'lather', 'Product-Feature', 'Related To', 3.0, 'Neutral', 'Dove', 'Beauty', 'Soap']],
+                                   columns=INSERT_COLUMNS)
+        db_manager.insert_data('nice lather', entities_df)
+        with db_manager.connections.reader() as conn:
+            rows = view_rows(conn)
+        db_manager.close_connection()
+        self.assertEqual(rows[:-1], LEGACY_ROWS)
+        self.assertEqual(rows[-1], (13, 'nice lather', 'u4', 'soap', 'lather', 'Product-Feature', 'Related To',
+                                    3.0, 'Neutral', 'Dove', 'Beauty', 'Soap'))
+
+    def test_reopening_a_migrated_database_changes_nothing(self):
+        DatabaseManager(self.db_path).close_connection()
+        db_manager = DatabaseManager(self.db_path)
+        with db_manager.connections.reader() as conn:
+            self.assertEqual(view_rows(conn), LEGACY_ROWS)
+        db_manager.close_connection()
+
+
+class InsertManyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.tmp.name, 'reviews.db'), batch_commit_size=3)
+
+    def tearDown(self):
+        self.db_manager.close_connection()
+        self.tmp.cleanup()
+
+    def test_view_matches_the_inserted_frames(self):
+        reviews = []
+        expected = []
+        for i in range(5):
+            rows = [[f"u{i}", 'deodorant', f"feature {j}", 'Product-Feature', 'Related To', float(i), 'Positive',
+                     'Dove' if i % 2 else float('nan'), 'Beauty', 'Deodorant'] for j in range(i + 1)]
+            reviews.append((f"review {i}", pd.DataFrame(rows, columns=INSERT_COLUMNS)))
+            expected.extend((f"review {i}", *[None if value != value else value for value in row]) for row in rows)
+        reviews.append(('empty', pd.DataFrame(columns=INSERT_COLUMNS)))
+
+        self.assertEqual(self.db_manager.insert_many(reviews), len(expected))
+        with self.db_manager.connections.reader() as conn:
+            rows = [row[1:] for row in view_rows(conn)]
+            review_count = conn.execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+        self.assertEqual(rows, expected)
+        self.assertEqual(review_count, 5)
+
+    def test_rollback_forgets_interned_ids(self):
+        entities_df = pd.DataFrame([['u1', 'soap', 'lather', 'Product-Feature', 'Related To', 3.0, 'Neutral', 'Dove', 'Beauty', 'Soap']],
+                                   columns=INSERT_COLUMNS)
+        with self.assertRaises(RuntimeError):
+            with self.db_manager.connections.writer():
+                self.db_manager.insert_data('nice lather', entities_df)
+                raise RuntimeError("abort")
+        self.assertEqual(self.db_manager._ids['entities'], {})
+
+        self.db_manager.insert_data('nice lather', entities_df)
+        with self.db_manager.connections.reader() as conn:
+            self.assertEqual([row[3:5] for row in view_rows(conn)], [('soap', 'lather')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connection import ConnectionManager, get_connection_manager
+
+
+class ConnectionManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'test.db')
+        self.connections = ConnectionManager(self.db_path, read_pool_size=2)
+        with self.connections.writer() as conn:
+            conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+
+    def tearDown(self):
+        self.connections.close()
+        self.tmp.cleanup()
+
+    def count(self):
+        with self.connections.reader() as conn:
+            return conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def test_nested_blocks_share_the_outer_transaction(self):
+        with self.connections.writer() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+            with self.connections.writer() as inner:
+                self.assertIs(inner, conn)
+                inner.execute("INSERT INTO items (name) VALUES ('b')")
+                self.assertFalse(self.connections.commit())
+            self.assertEqual(self.count(), 0)
+        self.assertEqual(self.count(), 2)
+
+    def test_commit_inside_the_outer_block_is_visible_to_readers(self):
+        with self.connections.writer() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+            self.assertTrue(self.connections.commit())
+            self.assertEqual(self.count(), 1)
+            conn.execute("INSERT INTO items (name) VALUES ('b')")
+        self.assertEqual(self.count(), 2)
+
+    def test_exception_in_a_nested_block_rolls_back_everything_and_runs_hooks_once(self):
+        calls = []
+        hook = lambda: calls.append(1)
+        self.connections.add_rollback_hook(hook)
+        with self.assertRaises(RuntimeError):
+            with self.connections.writer() as conn:
+                conn.execute("INSERT INTO items (name) VALUES ('a')")
+                with self.connections.writer() as inner:
+                    inner.execute("INSERT INTO items (name) VALUES ('b')")
+                    raise RuntimeError("abort")
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(calls, [1])
+
+        self.connections.remove_rollback_hook(hook)
+        with self.assertRaises(RuntimeError):
+            with self.connections.writer():
+                raise RuntimeError("abort")
+        self.assertEqual(calls, [1])
+
+    def test_readers_are_query_only_and_pooled(self):
+        with self.connections.reader() as first, self.connections.reader() as second:
+            self.assertIsNot(first, second)
+            with self.assertRaises(Exception):
+                first.execute("INSERT INTO items (name) VALUES ('a')")
+        with self.connections.reader() as again:
+            self.assertIn(again, (first, second))
+        self.assertEqual(self.connections.stats()['readers_open'], 2)
+
+    def test_readers_see_the_last_commit_while_a_write_is_open(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def write():
+            with self.connections.writer() as conn:
+                conn.execute("INSERT INTO items (name) VALUES ('a')")
+                started.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        started.wait(5)
+        start = time.monotonic()
+        self.assertEqual(self.count(), 0)
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        thread.join()
+        self.assertEqual(self.count(), 1)
+
+
+class GetConnectionManagerTest(unittest.TestCase):
+    def test_one_manager_per_file_closed_by_the_last_release(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'test.db')
+            first = get_connection_manager(db_path)
+            second = get_connection_manager(os.path.join(tmp, '.', 'test.db'))
+            self.assertIs(first, second)
+            self.assertEqual(first.references, 2)
+
+            first.release()
+            with second.writer() as conn:
+                conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+            second.release()
+            third = get_connection_manager(db_path)
+            self.assertIsNot(third, first)
+            third.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
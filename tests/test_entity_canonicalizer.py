@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from entity_canonicalizer import EntityCanonicalizer, normalize_name, same_words
+
+
+class EntityCanonicalizerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.canonicalizer = EntityCanonicalizer(os.path.join(self.tmp.name, 'entities.db'))
+
+    def tearDown(self):
+        self.canonicalizer.close_connection()
+        self.tmp.cleanup()
+
+    def canonical(self, *names):
+        mapping = self.canonicalizer.canonicalize_names(names)
+        return [mapping[name] for name in names]
+
+    def test_merges_spelling_variants(self):
+        self.assertEqual(self.canonical("Schmidt's Deodorant", "schmidt deodorants"), ["Schmidt's Deodorant"] * 2)
+        self.assertEqual(self.canonical("charcoal deodorant", "Charcol Deodorant"), ["charcoal deodorant"] * 2)
+        self.assertEqual(self.canonical("The Scents", "scent"), ["The Scents", "The Scents"])
+        self.assertEqual(self.canonical("long-lasting smell", "long lasting smells"), ["long-lasting smell"] * 2)
+
+    def test_keeps_products_that_share_a_brand_prefix_apart(self):
+        for a, b in [
+            ("schmidt charcoal deodorant", "schmidt charcoal magnesium deodorant"),
+            ("schmidt natural deodorant sticks", "schmidt signature stick deodorant"),
+            ("schmidt lavender sage deodorant", "schmidt lavender deodorant"),
+            ("native deodorant 2 pack", "native deodorant 3 pack"),
+        ]:
+            with self.subTest(a=a, b=b):
+                self.assertEqual(self.canonical(a, b), [a, b])
+
+    def test_keeps_opposite_polarity_apart(self):
+        self.assertEqual(self.canonical("effective", "not effective"), ["effective", "not effective"])
+        self.assertEqual(self.canonical("scented deodorant", "unscented deodorant"),
+                         ["scented deodorant", "unscented deodorant"])
+
+    def test_mappings_survive_a_restart(self):
+        self.canonical("Schmidt Deodorant")
+        self.canonicalizer.close_connection()
+        self.canonicalizer = EntityCanonicalizer(os.path.join(self.tmp.name, 'entities.db'))
+        self.assertEqual(self.canonical("schmidt deoderant"), ["Schmidt Deodorant"])
+
+
+class SameWordsTest(unittest.TestCase):
+    def test_pairs_every_word(self):
+        self.assertTrue(same_words("stick deodorant", "deodorant stick"))
+        self.assertTrue(same_words(normalize_name("Deodorant Sticks"), normalize_name("deoderant stick")))
+        self.assertFalse(same_words("schmidt charcoal deodorant", "schmidt charcoal magnesium deodorant"))
+        self.assertFalse(same_words("soap soap", "soap bar"))
+        self.assertFalse(same_words("size 2", "size 3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
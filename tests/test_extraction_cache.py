@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_cache import ExtractionCache
+
+ENTITIES = {'entities': [{'entity1': 'soap', 'entity2': 'scent', 'type': 'Product-Feature', 'relation': 'has'}]}
+
+
+class CountingWrites:
+    # Wraps a ConnectionManager and counts writer() blocks
+    def __init__(self, connections):
+        self.connections = connections
+        self.writes = 0
+
+    def writer(self):
+        self.writes += 1
+        return self.connections.writer()
+
+    def __getattr__(self, name):
+        return getattr(self.connections, name)
+
+
+class ExtractionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def last_used(self, cache, key):
+        with cache.connections.reader() as conn:
+            return conn.execute('SELECT last_used_at FROM extraction_cache WHERE key = ?', (key,)).fetchone()[0]
+
+    def age(self, cache, key, seconds):
+        with cache.connections.writer() as conn:
+            conn.execute('UPDATE extraction_cache SET last_used_at = last_used_at - ?, created_at = created_at - ? WHERE key = ?',
+                         (seconds, seconds, key))
+
+    def test_hits_only_write_once_last_used_is_stale(self):
+        cache = ExtractionCache(self.db_path, touch_interval=60)
+        cache.put('a', 'gpt-4', ENTITIES)
+        cache.connections = CountingWrites(cache.connections)
+        stored = self.last_used(cache, 'a')
+        for _ in range(5):
+            self.assertEqual(cache.get('a'), ENTITIES)
+        self.assertEqual(cache.connections.writes, 0)
+        self.assertEqual(self.last_used(cache, 'a'), stored)
+
+        self.age(cache, 'a', 120)
+        cache.connections.writes = 0
+        self.assertEqual(cache.get('a'), ENTITIES)
+        self.assertEqual(cache.connections.writes, 1)
+        self.assertGreater(self.last_used(cache, 'a'), time.time() - 5)
+        self.assertEqual(cache.stats()['hits'], 6)
+        cache.close_connection()
+
+    def test_misses_and_expired_entries(self):
+        cache = ExtractionCache(self.db_path, max_age_seconds=60)
+        self.assertIsNone(cache.get('missing'))
+        cache.put('a', 'gpt-4', ENTITIES)
+        self.age(cache, 'a', 120)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.evict(), 1)
+        cache.close_connection()
+
+    def test_evicts_the_least_recently_used_entries(self):
+        cache = ExtractionCache(self.db_path, max_entries=3, evict_every=100, touch_interval=0)
+        for index, key in enumerate('abcd'):
+            cache.put(key, 'gpt-4', ENTITIES)
+            self.age(cache, key, 100 - index)
+        # Touching a makes b the least recently used entry
+        cache.get('a')
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual([cache.get(key) is not None for key in 'acd'], [True, True, True])
+        cache.close_connection()
+
+    def test_keys_depend_on_every_input(self):
+        base = ('gpt-4', 'system', 'user {text}', [{'name': 'f'}], 'text')
+        key = ExtractionCache.make_key(*base, max_tokens=100)
+        self.assertEqual(key, ExtractionCache.make_key(*base, max_tokens=100))
+        for i in range(len(base)):
+            changed = list(base)
+            changed[i] = 'other'
+            self.assertNotEqual(key, ExtractionCache.make_key(*changed, max_tokens=100))
+        self.assertNotEqual(key, ExtractionCache.make_key(*base, max_tokens=200))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_executor import AdaptiveConcurrency, ConcurrentExtractor, TokenBucket
+from gpt_processor import GPTProcessor
+
+ENTITIES = {'entities': [{'entity1': 'soap', 'entity2': 'scent', 'type': 'Product-Feature', 'relation': 'has'}]}
+
+
+class FakeRateLimitError(openai.RateLimitError):
+    # Built without an HTTP response; the executor only needs the type
+    def __init__(self):
+        Exception.__init__(self, "429 Too Many Requests")
+        self.status_code = 429
+        self.response = None
+
+
+class ThrottlingBackend:
+    """
+    Answers like an extraction backend, but fails with a 429 whenever more than
+    capacity calls are in flight at once. Texts starting with 'cached' are
+    cache hits.
+    """
+    model = 'fake'
+    max_tokens = 100
+
+    def __init__(self, capacity, latency=0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def cached_entities(self, text):
+        return ENTITIES if text.startswith('cached') else None
+
+    def extract_entities_with_usage(self, text, check_cache=True):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            overloaded = self.in_flight > self.capacity
+        try:
+            if overloaded:
+                with self._lock:
+                    self.throttled += 1
+                raise FakeRateLimitError()
+            time.sleep(self.latency)
+            return ENTITIES, {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_waits_for_refill_once_capacity_is_spent(self):
+        bucket = TokenBucket(rate_per_minute=600, capacity=2)
+        self.assertEqual(bucket.acquire(2), 0.0)
+        start = time.monotonic()
+        waited = bucket.acquire(1)
+        self.assertGreater(waited, 0.05)
+        self.assertGreater(time.monotonic() - start, 0.05)
+
+    def test_adjust_gives_back_unused_tokens(self):
+        bucket = TokenBucket(rate_per_minute=60, capacity=100)
+        bucket.acquire(80)
+        bucket.adjust(50)
+        self.assertAlmostEqual(bucket.tokens, 70, delta=1)
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+    def test_halves_on_throttle_and_grows_after_a_window_of_successes(self):
+        concurrency = AdaptiveConcurrency(max_limit=8, min_limit=1)
+        concurrency.on_throttle()
+        self.assertEqual(concurrency.limit, 4)
+        for _ in range(4):
+            concurrency.on_throttle()
+        self.assertEqual(concurrency.limit, 1)
+        concurrency.on_success()
+        self.assertEqual(concurrency.limit, 2)
+        concurrency.on_success()
+        self.assertEqual(concurrency.limit, 2)
+        concurrency.on_success()
+        self.assertEqual(concurrency.limit, 3)
+
+
+class ConcurrentExtractorTest(unittest.TestCase):
+    def test_backs_off_on_429_until_every_review_succeeds(self):
+        backend = ThrottlingBackend(capacity=2)
+        extractor = ConcurrentExtractor(backend, max_workers=8, requests_per_minute=None, tokens_per_minute=None,
+                                        max_retries=50, backoff_base=0.001, backoff_max=0.01)
+        results = extractor.extract_all([f"review {i}" for i in range(40)])
+
+        self.assertTrue(all(result['error'] is None and result['entities'] == ENTITIES for result in results))
+        self.assertGreater(backend.throttled, 0)
+        self.assertEqual(extractor.stats['throttled'], backend.throttled)
+        self.assertEqual(extractor.stats['requests'], backend.calls)
+        self.assertLess(extractor.concurrency.limit, 8)
+
+    def test_gives_up_after_max_retries(self):
+        backend = ThrottlingBackend(capacity=0)
+        extractor = ConcurrentExtractor(backend, max_workers=2, requests_per_minute=None, tokens_per_minute=None,
+                                        max_retries=2, backoff_base=0.001, backoff_max=0.01)
+        results = extractor.extract_all(['review'])
+        self.assertIsInstance(results[0]['error'], openai.RateLimitError)
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(extractor.stats['failed'], 1)
+
+    def test_cache_hits_use_no_slot_or_rate_budget(self):
+        backend = ThrottlingBackend(capacity=8, latency=0)
+        extractor = ConcurrentExtractor(backend, max_workers=4, requests_per_minute=60, tokens_per_minute=None)
+        results = extractor.extract_all([f"cached {i}" for i in range(10)] + ['review 1', 'review 2'])
+
+        self.assertTrue(all(result['error'] is None for result in results))
+        self.assertEqual(extractor.stats['cache_hits'], 10)
+        self.assertEqual(extractor.stats['requests'], 2)
+        self.assertEqual(backend.calls, 2)
+        self.assertAlmostEqual(extractor.rate_limiter.requests.tokens, 58, delta=0.5)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the chat completions endpoint. Answers with a
+    get_relation function call carrying self.arguments (ENTITIES as JSON by
+    default), or with the status codes queued in
+    self.failures (429s carry a Retry-After of retry_after seconds); with
+    capacity set, any request beyond capacity in flight gets a 429 as well.
+    """
+    daemon_threads = True
+
+    def __init__(self, capacity=None, retry_after=0.05, latency=0.01):
+        super().__init__(('127.0.0.1', 0), FakeOpenAIHandler)
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.latency = latency
+        self.arguments = json.dumps(ENTITIES)
+        self.failures = []
+        self.requests = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            status = server.failures.pop(0) if server.failures else 200
+            if status == 200 and server.capacity is not None and server.in_flight > server.capacity:
+                status = 429
+        try:
+            time.sleep(server.latency)
+            if status == 200:
+                self._reply(200, {
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4',
+                    'choices': [{'index': 0, 'finish_reason': 'function_call', 'message': {
+                        'role': 'assistant', 'content': None,
+                        'function_call': {'name': 'get_relation', 'arguments': server.arguments},
+                    }}],
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+                })
+            else:
+                headers = {'Retry-After': str(server.retry_after)} if status == 429 else {}
+                self._reply(status, {'error': {'message': f"fake {status}", 'type': 'fake', 'code': None}}, headers)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ConcurrentExtractorHTTPTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOpenAIServer()
+        # The client must not retry underneath the executor's backoff
+        self.processor = GPTProcessor(api_key='test', base_url=self.server.base_url, max_retries=0)
+
+    def tearDown(self):
+        self.processor.lm_client.close()
+        self.server.stop()
+
+    def extractor(self, **options):
+        options = dict({'max_workers': 8, 'requests_per_minute': None, 'tokens_per_minute': None, 'max_retries': 5,
+                        'backoff_base': 0.001, 'backoff_max': 0.01}, **options)
+        return ConcurrentExtractor(self.processor, **options)
+
+    def test_waits_for_retry_after_on_429(self):
+        self.server.retry_after = 0.3
+        self.server.failures = [429]
+        extractor = self.extractor(max_workers=4)
+        start = time.monotonic()
+        results = extractor.extract_all(['review'])
+
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[0]['entities'], ENTITIES)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(extractor.stats['throttled'], 1)
+        self.assertEqual(extractor.concurrency.limit, 2)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_backs_off_until_the_server_stops_throttling(self):
+        self.server.capacity = 2
+        self.server.retry_after = 0.01
+        extractor = self.extractor(max_retries=50)
+        results = extractor.extract_all([f"review {i}" for i in range(30)])
+
+        self.assertTrue(all(result['error'] is None for result in results))
+        self.assertGreater(extractor.stats['throttled'], 0)
+        self.assertEqual(extractor.stats['requests'], self.server.requests)
+        self.assertLess(extractor.concurrency.limit, 8)
+        self.assertEqual(extractor.stats['tokens'], 30 * 15)
+
+    def test_retries_server_errors_but_not_client_errors(self):
+        self.server.failures = [503]
+        extractor = self.extractor()
+        self.assertIsNone(extractor.extract_all(['review'])[0]['error'])
+        self.assertEqual(extractor.stats['retries'], 1)
+
+        self.server.failures = [400]
+        extractor = self.extractor()
+        result = extractor.extract_all(['review'])[0]
+        self.assertIsInstance(result['error'], openai.BadRequestError)
+        self.assertEqual(extractor.stats['retries'], 0)
+        self.assertEqual(extractor.stats['failed'], 1)
+
+    def test_gives_up_on_persistent_429s(self):
+        self.server.failures = [429] * 3
+        self.server.retry_after = 0.01
+        extractor = self.extractor(max_retries=2)
+        result = extractor.extract_all(['review'])[0]
+        self.assertIsInstance(result['error'], openai.RateLimitError)
+        self.assertEqual(self.server.requests, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+sys.path.insert(0, TESTS)
+
+from extraction_cache import ExtractionCache
+from gpt_processor import GPTProcessor
+from test_extraction_executor import ENTITIES, FakeOpenAIServer
+
+
+class ResponseParsingTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOpenAIServer(latency=0)
+        self.processor = GPTProcessor(api_key='test', base_url=self.server.base_url, max_retries=0)
+
+    def tearDown(self):
+        self.processor.lm_client.close()
+        self.server.stop()
+
+    def extract(self, arguments):
+        self.server.arguments = arguments
+        return self.processor.extract_entities('review')
+
+    def test_json_with_apostrophes(self):
+        entities = {'entities': [{'entity1': "Dove's stick", 'entity2': "doesn't stain", 'type': 'Product-Feature',
+                                  'relation': 'has'}]}
+        self.assertEqual(self.extract(json.dumps(entities)), entities)
+
+    def test_single_quoted_literal(self):
+        self.assertEqual(self.extract(repr(ENTITIES)), ENTITIES)
+
+    def test_code_is_never_run(self):
+        marker = os.path.join(tempfile.gettempdir(), 'gpt_processor_eval_marker')
+        result = self.extract(f"__import__('pathlib').Path({marker!r}).touch()")
+        self.assertEqual(result, {'error': 'Unable to parse the response.'})
+        self.assertFalse(os.path.exists(marker))
+
+    def test_unparseable_and_empty_answers(self):
+        self.assertEqual(self.extract('{"entities": [}'), {'error': 'Unable to parse the response.'})
+        self.assertEqual(self.extract('[1, 2]'), {'error': 'Unable to parse the response.'})
+        with self.assertRaises(ValueError):
+            self.extract('{"entities": []}')
+
+    def test_batch_answer_that_is_not_an_object_falls_back(self):
+        # Both the batch call and the single-review retry get a list back
+        self.server.arguments = '["not", "an", "object"]'
+        results = self.processor.extract_entities_batch(['first review'])
+        self.assertEqual(results, [{'error': 'Unable to parse the response.'}])
+        self.assertEqual(self.server.requests, 2)
+
+
+class BatchExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOpenAIServer(latency=0)
+        self.processor = GPTProcessor(api_key='test', base_url=self.server.base_url, max_retries=0)
+
+    def tearDown(self):
+        self.processor.lm_client.close()
+        self.server.stop()
+
+    def test_api_error_in_the_fallback_fails_only_that_review(self):
+        # The batch answer lacks a 'reviews' list, so every review falls back to a
+        # single call, and the first of those is rate limited
+        self.server.failures = [200, 429]
+        results, usage = self.processor.extract_entities_batch_with_usage(['first review', 'second review', 'first review'])
+
+        self.assertTrue(results[0]['error'].startswith('RateLimitError'))
+        self.assertIs(results[2], results[0])
+        self.assertEqual(results[1], ENTITIES)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(usage['total_tokens'], 2 * 15)
+
+    def test_failed_batch_request_falls_back_to_single_calls(self):
+        self.server.failures = [500]
+        results = self.processor.extract_entities_batch(['first review', 'second review'])
+        self.assertEqual(results, [ENTITIES, ENTITIES])
+        self.assertEqual(self.server.requests, 3)
+
+    def test_cached_reviews_are_not_sent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.processor.cache = ExtractionCache(os.path.join(tmp, 'cache.db'))
+            self.processor._batch_cache_put('cached review', ENTITIES)
+            self.assertEqual(self.processor.extract_entities_batch(['cached review']), [ENTITIES])
+            self.assertEqual(self.server.requests, 0)
+            self.processor.cache.close_connection()
+
+
+if __name__ == "__main__":
+    unittest.main()
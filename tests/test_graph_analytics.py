@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+from entity_canonicalizer import recanonicalize
+from graph_analytics import GraphAnalytics
+
+BRANDS = ['Dove', 'Native', 'Schmidt']
+ENTITIES = ['soap', 'scent', 'deodorant', 'price', 'smell', 'skin', 'Scents']
+
+
+def review(i):
+    rows = []
+    for j in range(3):
+        rows.append({
+            'user_id': f"user{i}", 'entity1': ENTITIES[(i + j) % len(ENTITIES)],
+            'entity2': ENTITIES[(2 * i + j + 1) % len(ENTITIES)], 'type': 'Product-Feature', 'relation': 'has',
+            'rating': i % 5 + 1, 'sentiment': 'Positive' if i % 3 else 'Negative', 'brand': BRANDS[i % len(BRANDS)],
+            'category': 'Beauty', 'sub_category': 'Deodorant' if i % 2 else 'Soap',
+        })
+    return f"review {i}", pd.DataFrame(rows)
+
+
+class GraphAnalyticsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'reviews.db')
+        self.db = DatabaseManager(self.db_path)
+        self.analytics = GraphAnalytics(self.db_path, write_chunk_size=7, scope_chunk_triples=10)
+
+    def tearDown(self):
+        self.analytics.close_connection()
+        self.db.close_connection()
+        self.tmp.cleanup()
+
+    def scopes(self):
+        return sorted(self.analytics._read('''
+        SELECT entity_id, brand_id, sub_category_id, type_id, sentiment, mentions FROM entity_scopes
+        '''), key=repr)
+
+    def test_skips_refresh_when_nothing_changed(self):
+        self.db.insert_many([review(i) for i in range(5)])
+        self.assertIsNotNone(self.analytics.refresh())
+        self.assertIsNone(self.analytics.refresh())
+
+    def test_incremental_scopes_match_a_full_recount(self):
+        self.db.insert_many([review(i) for i in range(10)])
+        self.analytics.refresh()
+        self.db.insert_many([review(i) for i in range(10, 40)])
+        self.analytics.refresh()
+        incremental = self.scopes()
+
+        self.analytics.refresh(force=True)
+        self.assertEqual(incremental, self.scopes())
+        self.assertEqual(sum(row[5] for row in incremental), 40 * 3 * 2)
+        top = self.analytics.top_entities(brand='Dove', limit=50)
+        self.assertTrue(top and all(row['mentions'] > 0 for row in top))
+
+    def test_rewrites_recount_the_scopes(self):
+        self.db.insert_many([review(i) for i in range(20)])
+        self.analytics.refresh()
+        recanonicalize(self.db_path)
+        self.assertIsNotNone(self.analytics.refresh())
+        names = [row['entity'] for row in self.analytics.top_entities(limit=50)]
+        self.assertEqual(len([name for name in names if name.lower() in ('scent', 'scents')]), 1)
+        self.assertEqual(sum(row[5] for row in self.scopes()), 20 * 3 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph_cache import GraphCache, estimate_size
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class GraphCacheTest(unittest.TestCase):
+    def test_hits_until_the_version_is_bumped(self):
+        cache = GraphCache()
+        loader = Loader([{'Entity1': 'a'}])
+        self.assertIs(cache.get_or_load('query_graph', {'after': 0}, loader), loader.value)
+        self.assertIs(cache.get_or_load('query_graph', {'after': 0}, loader), loader.value)
+        self.assertEqual(loader.calls, 1)
+        cache.get_or_load('query_graph', {'after': 5}, loader)
+        self.assertEqual(loader.calls, 2)
+
+        cache.bump_version()
+        cache.get_or_load('query_graph', {'after': 0}, loader)
+        self.assertEqual(loader.calls, 3)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 3, 1))
+
+    def test_evicts_the_least_recently_used_entry(self):
+        cache = GraphCache(max_entries=2)
+        loaders = {name: Loader(name) for name in 'abc'}
+        cache.get_or_load('a', {}, loaders['a'])
+        cache.get_or_load('b', {}, loaders['b'])
+        cache.get_or_load('a', {}, loaders['a'])
+        cache.get_or_load('c', {}, loaders['c'])
+        cache.get_or_load('a', {}, loaders['a'])
+        cache.get_or_load('b', {}, loaders['b'])
+        self.assertEqual({name: loader.calls for name, loader in loaders.items()}, {'a': 1, 'b': 2, 'c': 1})
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_stays_under_the_byte_budget(self):
+        value = [{'Entity1': 'x' * 100, 'Entity2': 'y' * 100}] * 10
+        size = estimate_size(value)
+        cache = GraphCache(max_bytes=int(size * 2.5))
+        for after in range(5):
+            cache.get_or_load('query_graph', {'after': after}, Loader(value))
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], 2 * size)
+
+        # A result larger than the whole budget is returned but not cached
+        big = Loader(value * 10)
+        cache.get_or_load('retrieve_graph_data', {}, big)
+        cache.get_or_load('retrieve_graph_data', {}, big)
+        self.assertEqual(big.calls, 2)
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+
+    def test_result_loaded_across_a_write_is_not_cached(self):
+        cache = GraphCache()
+
+        def loader():
+            cache.bump_version()
+            return 'stale'
+
+        self.assertEqual(cache.get_or_load('retrieve_graph_data', {}, loader), 'stale')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_entries_expire_after_max_age(self):
+        cache = GraphCache(max_age_seconds=0.05)
+        loader = Loader('value')
+        cache.get_or_load('retrieve_graph_data', {}, loader)
+        time.sleep(0.1)
+        cache.get_or_load('retrieve_graph_data', {}, loader)
+        self.assertEqual(loader.calls, 2)
+
+    def test_concurrent_readers_get_consistent_results(self):
+        cache = GraphCache(max_entries=4)
+        errors = []
+
+        def read(n):
+            for i in range(200):
+                key = (n + i) % 8
+                if cache.get_or_load('query_graph', {'after': key}, lambda: key) != key:
+                    errors.append(key)
+                if i % 50 == 0:
+                    cache.bump_version()
+
+        threads = [threading.Thread(target=read, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(cache.stats()['entries'], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+import networkx as nx
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import INSERT_COLUMNS, DatabaseManager
+from graph_visualizer import GraphVisualizer
+
+
+class GraphVisualizerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'reviews.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_empty_database_gets_the_schema(self):
+        graph_visualizer = GraphVisualizer(self.db_path)
+        self.assertEqual(len(graph_visualizer.load_view(top_k=10)), 0)
+        self.assertEqual(graph_visualizer.render_communities(os.path.join(self.tmp.name, 'communities')), {})
+        graph_visualizer.close_connection()
+
+    def test_legacy_table_is_migrated_before_the_first_read(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+        CREATE TABLE processed_reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cleaned_review_content TEXT, user_id TEXT, entity1 TEXT, entity2 TEXT, type TEXT, relation TEXT,
+            rating REAL, sentiment TEXT, brand TEXT, category TEXT, sub_category TEXT
+        )
+        ''')
+        conn.execute('''
+        INSERT INTO processed_reviews (cleaned_review_content, user_id, entity1, entity2, type, relation, rating,
+                                       sentiment, brand, category, sub_category)
+        VALUES ('smells great', 'u1', 'deodorant', 'scent', 'Product-Feature', 'Has Scent', 5, 'Positive', 'Dove',
+                'Beauty', 'Deodorant')
+        ''')
+        conn.commit()
+        conn.close()
+
+        graph_visualizer = GraphVisualizer(self.db_path)
+        G = graph_visualizer.load_view()
+        self.assertEqual(list(G.edges(data='relation')), [('deodorant', 'scent', 'Has Scent')])
+        graph_visualizer.close_connection()
+
+    def test_load_view_matches_select_subgraph(self):
+        db_manager = DatabaseManager(self.db_path)
+        reviews = []
+        for i in range(40):
+            category, sub_category = [('Beauty', 'Deodorant'), ('Beauty', 'Soap'), ('Home', 'Candles')][i % 3]
+            rows = [[f"u{i}", f"product {i % 7}", f"feature {(i * j) % 11}", 'Product-Feature', 'Related To', 4.0,
+                     'Positive', 'Dove', category, sub_category] for j in range(1, 4)]
+            reviews.append((f"review {i}", pd.DataFrame(rows, columns=INSERT_COLUMNS)))
+        db_manager.insert_many(reviews)
+        db_manager.close_connection()
+
+        graph_visualizer = GraphVisualizer(self.db_path)
+        G = graph_visualizer.create_graph_from_db()
+        for top_k in (5, 12, None):
+            with self.subTest(top_k=top_k):
+                view = graph_visualizer.load_view(top_k=top_k)
+                expected = GraphVisualizer.select_subgraph(G, top_k)
+                self.assertEqual(set(view.nodes), set(expected.nodes))
+                self.assertTrue(nx.utils.edges_equal(view.edges(data='relation'), expected.edges(data='relation')))
+        graph_visualizer.close_connection()
+
+
+if __name__ == "__main__":
+    unittest.main()
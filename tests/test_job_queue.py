@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import FAILED, RUNNING, SUCCEEDED, JobQueue
+
+
+class FlakyJobQueue(JobQueue):
+    """
+    Fails to save its first `failures` status updates, like a database that is
+    locked by another writer.
+    """
+    def __init__(self, *args, failures=1, **kwargs):
+        self.failures = failures
+        super().__init__(*args, **kwargs)
+
+    def _update(self, job_id, **fields):
+        if self.failures > 0:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        super()._update(job_id, **fields)
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'jobs.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_runs_jobs_and_reports_results(self):
+        jobs = JobQueue(lambda payload, report_progress, resume_stage: {'echo': payload['n']}, num_workers=2, db_path=self.db_path)
+        jobs.start()
+        job_ids = [jobs.submit({'n': i}) for i in range(5)]
+        jobs._queue.join()
+        for i, job_id in enumerate(job_ids):
+            job = jobs.get(job_id)
+            self.assertEqual(job['status'], SUCCEEDED)
+            self.assertEqual(job['result'], {'echo': i})
+        jobs.shutdown()
+
+    def test_records_handler_errors(self):
+        def handler(payload, report_progress, resume_stage):
+            report_progress('extract_entities')
+            raise ValueError("bad review")
+
+        jobs = JobQueue(handler, num_workers=1, db_path=self.db_path)
+        jobs.start()
+        job_id = jobs.submit({})
+        jobs._queue.join()
+        job = jobs.get(job_id)
+        self.assertEqual(job['status'], FAILED)
+        self.assertEqual(job['stage'], 'extract_entities')
+        self.assertEqual(job['error'], "ValueError: bad review")
+        jobs.shutdown()
+
+    def test_worker_survives_failed_status_updates(self):
+        # The first job cannot be marked running, and then cannot be marked failed either
+        jobs = FlakyJobQueue(lambda payload, report_progress, resume_stage: payload, num_workers=1, db_path=self.db_path, failures=2)
+        jobs.start()
+        first = jobs.submit({'n': 1})
+        second = jobs.submit({'n': 2})
+        jobs._queue.join()
+
+        self.assertTrue(all(worker.is_alive() for worker in jobs._workers))
+        self.assertEqual(jobs.get(second)['status'], SUCCEEDED)
+        self.assertNotEqual(jobs.get(first)['status'], SUCCEEDED)
+        jobs.shutdown()
+
+    def test_finished_jobs_leave_memory_and_are_read_from_the_table(self):
+        jobs = JobQueue(lambda payload, report_progress, resume_stage: {'echo': payload['n']}, num_workers=2, db_path=self.db_path)
+        jobs.start()
+        job_ids = [jobs.submit({'n': i}) for i in range(20)]
+        jobs._queue.join()
+        self.assertEqual(jobs.jobs, {})
+        self.assertEqual(len(jobs._finished), 0)
+        self.assertEqual([jobs.get(job_id)['result'] for job_id in job_ids], [{'echo': i} for i in range(20)])
+        jobs.shutdown()
+
+    def test_in_memory_queue_keeps_only_the_most_recent_finished_jobs(self):
+        jobs = JobQueue(lambda payload, report_progress, resume_stage: payload['n'], num_workers=1, max_finished_jobs=5)
+        jobs.start()
+        job_ids = [jobs.submit({'n': i}) for i in range(12)]
+        jobs._queue.join()
+        self.assertEqual(jobs.jobs, {})
+        self.assertEqual(list(jobs._finished), job_ids[-5:])
+        self.assertIsNone(jobs.get(job_ids[0]))
+        self.assertEqual(jobs.get(job_ids[-1])['result'], 11)
+        self.assertNotIn('payload', jobs.get(job_ids[-1]))
+        jobs.shutdown()
+
+    def test_queues_sharing_a_table_run_each_job_once(self):
+        runs = []
+        lock = threading.Lock()
+
+        def handler(payload, report_progress, resume_stage):
+            with lock:
+                runs.append(payload['n'])
+            time.sleep(0.001)
+
+        first = JobQueue(handler, num_workers=2, db_path=self.db_path)
+        job_ids = [first.submit({'n': i}) for i in range(30)]
+        # A second process starting now finds all 30 jobs queued and queues them too
+        second = JobQueue(handler, num_workers=2, db_path=self.db_path)
+        self.assertEqual(len(second.jobs), 30)
+        first.start()
+        second.start()
+        first._queue.join()
+        second._queue.join()
+
+        self.assertEqual(sorted(runs), list(range(30)))
+        self.assertTrue(all(first.get(job_id)['status'] == SUCCEEDED for job_id in job_ids))
+        first.shutdown()
+        second.shutdown()
+
+    def test_stale_running_jobs_resume_from_their_last_stage(self):
+        jobs = JobQueue(None, db_path=self.db_path)
+        now = time.time()
+        with jobs.connections.writer() as conn:
+            conn.executemany('''
+            INSERT INTO ingest_jobs (id, status, stage, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                ('crashed', RUNNING, 'sync_graph', '{}', now - 600, now - 600),
+                ('alive', RUNNING, 'extract_entities', '{}', now - 5, now - 5),
+            ])
+        jobs.shutdown()
+
+        resumed = {}
+        jobs = JobQueue(lambda payload, report_progress, resume_stage: resumed.setdefault('stage', resume_stage),
+                        num_workers=1, db_path=self.db_path, stale_after=60)
+        self.assertEqual(list(jobs.jobs), ['crashed'])
+        jobs.start()
+        jobs._queue.join()
+        self.assertEqual(resumed, {'stage': 'sync_graph'})
+        self.assertEqual(jobs.get('crashed')['status'], SUCCEEDED)
+        self.assertEqual(jobs.get('alive')['status'], RUNNING)
+        jobs.shutdown()
+
+    def test_heartbeat_keeps_running_jobs_from_being_reclaimed(self):
+        release = threading.Event()
+        jobs = JobQueue(lambda payload, report_progress, resume_stage: release.wait(5), num_workers=1,
+                        db_path=self.db_path, heartbeat_seconds=0.05, stale_after=0.2)
+        jobs.start()
+        job_id = jobs.submit({})
+        time.sleep(0.6)
+        # Another process looking for stale work finds nothing to take
+        other = JobQueue(None, db_path=self.db_path, stale_after=0.2)
+        self.assertEqual(other.jobs, {})
+        self.assertEqual(other.get(job_id)['status'], RUNNING)
+        release.set()
+        jobs._queue.join()
+        self.assertEqual(jobs.get(job_id)['status'], SUCCEEDED)
+        other.shutdown()
+        jobs.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
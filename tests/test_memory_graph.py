@@ -0,0 +1,132 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from collections import Counter
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_pipeline import stand_in_neo4j_manager
+from database import INSERT_COLUMNS, DatabaseManager, mark_triples_rewritten
+from graph_cache import GraphCache
+from memory_graph import MemoryGraph
+from neo4j_manager import entity_key
+
+NAMES = ['Deodorant', 'deodorant', 'DEODORANT  ', 'scent', 'Scent', 'charcoal', 'stick', 'rash', 'price', 'lather']
+RELATIONS = ['Has Scent', 'Has Ingredient', 'Causes', 'Worth', 'Related To']
+SENTIMENTS = ['Positive', 'Negative', 'Neutral']
+SCOPES = [('Dove', 'Beauty', 'Deodorant'), ('Dove', 'Beauty', None), ('Native', 'Beauty', 'Deodorant'),
+          ('Native', 'Personal Care', 'Soap')]
+
+
+def random_reviews(rng, count, start=0):
+    reviews = []
+    for i in range(start, start + count):
+        brand, category, sub_category = rng.choice(SCOPES)
+        rows = [[f"u{i}", rng.choice(NAMES), rng.choice(NAMES), 'Product-Feature', rng.choice(RELATIONS),
+                 float(rng.randint(1, 5)), rng.choice(SENTIMENTS), brand, category, sub_category]
+                for _ in range(rng.randint(1, 4))]
+        reviews.append((f"review {i}", pd.DataFrame(rows, columns=INSERT_COLUMNS)))
+    return reviews
+
+
+def edge_counts(records):
+    return Counter((record['Entity1'], record['Entity2'], record['Relation']) for record in records)
+
+
+class MemoryGraphParityTest(unittest.TestCase):
+    """
+    MemoryGraph must answer every read the way Neo4jManager does over the same
+    rows; the Neo4j side runs on the benchmark's in-process driver, which
+    applies the same MERGE semantics (entities by key, edges by row_id).
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'reviews.db')
+        self.db_manager = DatabaseManager(self.db_path)
+        self.rng = random.Random(3)
+        self.db_manager.insert_many(random_reviews(self.rng, 150))
+        self.neo4j = stand_in_neo4j_manager(batch_size=64)
+        self.memory = MemoryGraph(self.db_path, batch_size=64, graph_cache=GraphCache())
+        self.neo4j.load_data_from_sqlite(self.db_path)
+
+    def tearDown(self):
+        self.memory.close()
+        self.neo4j.close()
+        self.db_manager.close_connection()
+        self.tmp.cleanup()
+
+    def assertSameGraph(self):
+        self.assertEqual(edge_counts(self.memory.retrieve_graph_data()), edge_counts(self.neo4j.retrieve_graph_data()))
+        for filters in ({}, {'brand': 'Dove'}, {'sub_category': 'Unknown'}, {'category': 'Beauty', 'sentiment': 'Negative'},
+                        {'relation': 'Has Scent', 'brand': 'Native'}, {'brand': 'Missing'}):
+            with self.subTest(filters=filters):
+                edges = []
+                after = 0
+                while after is not None:
+                    page = self.memory.query_graph(after=after, limit=17, **filters)
+                    self.assertEqual(page, self.neo4j.query_graph(after=after, limit=17, **filters))
+                    edges.extend(page['edges'])
+                    after = page['next_cursor']
+                self.assertEqual(list(self.memory.stream_graph(**filters)), edges)
+
+    def test_reads_match_neo4j(self):
+        self.assertGreater(self.memory.num_edges, 150)
+        # Every spelling of deodorant within a scope is one node, named by its latest spelling
+        self.assertEqual(len(self.memory.find_nodes('deodorant')), len(SCOPES))
+        self.assertSameGraph()
+
+    def test_incremental_loads_match_neo4j(self):
+        self.memory.retrieve_graph_data()
+        self.db_manager.insert_many(random_reviews(self.rng, 40, start=150))
+        self.assertGreater(self.memory.load_data_from_sqlite(self.db_path), 0)
+        self.neo4j.load_data_from_sqlite(self.db_path)
+        self.assertEqual(self.memory.num_edges, len(self.neo4j.driver.edges))
+        self.assertSameGraph()
+
+    def test_rewritten_triples_are_reloaded(self):
+        with self.db_manager.connections.writer() as conn:
+            scent, = conn.execute("SELECT id FROM entities WHERE name = 'scent'").fetchone()
+            conn.execute("UPDATE triples SET entity2_id = ? WHERE entity2_id = (SELECT id FROM entities WHERE name = 'Scent')",
+                         (scent,))
+            mark_triples_rewritten(conn, 'test')
+        self.memory.load_data_from_sqlite(self.db_path)
+        self.neo4j.load_data_from_sqlite(self.db_path)
+        self.assertNotIn('Scent', {record['Entity2'] for record in self.memory.retrieve_graph_data()})
+        self.assertSameGraph()
+
+    def test_k_hop_matches_a_breadth_first_search_over_the_edges(self):
+        records = self.neo4j.query_graph(limit=10 ** 6)['edges']
+        names = {record['Entity1'] for record in records} | {record['Entity2'] for record in records}
+
+        def node(record, side):
+            # Entity2 shares the scope of its row, which is Entity1's scope
+            return entity_key(record[side], record['Brand'], record['Category'], record['SubCategory'])
+
+        def normalized(name):
+            return ' '.join(name.lower().split())
+
+        for name in sorted(names):
+            for k in (1, 2):
+                frontier = {node(record, side) for record in records for side in ('Entity1', 'Entity2')
+                            if normalized(record[side]) == normalized(name)}
+                seen = set(frontier)
+                reached = set()
+                for _ in range(k):
+                    step = {record['RowId'] for record in records
+                            if node(record, 'Entity1') in frontier or node(record, 'Entity2') in frontier}
+                    reached |= step
+                    endpoints = {node(record, side) for record in records if record['RowId'] in step
+                                 for side in ('Entity1', 'Entity2')}
+                    frontier = endpoints - seen
+                    seen |= frontier
+                with self.subTest(name=name, k=k):
+                    self.assertEqual([record['RowId'] for record in self.memory.k_hop(name, k=k)], sorted(reached))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+from neo4j.exceptions import TransientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_pipeline import StandInNeo4jDriver, stand_in_neo4j_manager
+from database import INSERT_COLUMNS, DatabaseManager
+
+
+class FailingDriver(StandInNeo4jDriver):
+    """
+    Stand-in driver whose UNWIND writes fail from the fail_at'th one on, after
+    first failing transient_failures times with a retryable TransientError.
+    """
+    def __init__(self, fail_at=None, transient_failures=0):
+        super().__init__()
+        self.fail_at = fail_at
+        self.transient_failures = transient_failures
+        self.batches = []
+
+    def run(self, query, params):
+        if 'UNWIND $rows' in query:
+            if self.transient_failures:
+                self.transient_failures -= 1
+                raise TransientError("deadlock detected")
+            if self.fail_at is not None and len(self.batches) + 1 >= self.fail_at:
+                raise RuntimeError("connection lost")
+            self.batches.append([row['id'] for row in params['rows']])
+        return super().run(query, params)
+
+
+def reviews(start, count):
+    return [(f"review {i}", pd.DataFrame([[f"u{i}", 'deodorant', f"feature {i}", 'Product-Feature', 'Related To', 5.0,
+                                           'Positive', 'Dove', 'Beauty', 'Deodorant']], columns=INSERT_COLUMNS))
+            for i in range(start, start + count)]
+
+
+class WatermarkSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'reviews.db')
+        self.db_manager = DatabaseManager(self.db_path)
+        self.db_manager.insert_many(reviews(0, 10))
+        self.neo4j = stand_in_neo4j_manager(batch_size=4)
+        self.neo4j.driver = FailingDriver()
+
+    def tearDown(self):
+        self.neo4j.close()
+        self.db_manager.close_connection()
+        self.tmp.cleanup()
+
+    def watermark(self):
+        with self.db_manager.connections.reader() as conn:
+            return self.neo4j._get_sync_state(conn.cursor())[0]
+
+    def test_only_rows_above_the_watermark_are_pushed(self):
+        self.assertEqual(self.neo4j.load_data_from_sqlite(self.db_path), 10)
+        self.assertEqual(self.watermark(), 10)
+        self.assertEqual(self.neo4j.load_data_from_sqlite(self.db_path), 0)
+
+        self.db_manager.insert_many(reviews(10, 3))
+        self.assertEqual(self.neo4j.load_data_from_sqlite(self.db_path), 3)
+        self.assertEqual(self.watermark(), 13)
+        self.assertEqual(sorted(self.neo4j.driver.edges), list(range(1, 14)))
+
+    def test_full_resync_pushes_every_row_again(self):
+        self.neo4j.load_data_from_sqlite(self.db_path)
+        self.assertEqual(self.neo4j.full_resync(self.db_path), 10)
+        self.assertEqual(len(self.neo4j.driver.edges), 10)
+
+    def test_failed_sync_resumes_after_the_last_written_batch(self):
+        self.neo4j.driver.fail_at = 3
+        with self.assertRaises(RuntimeError):
+            self.neo4j.load_data_from_sqlite(self.db_path)
+        self.assertEqual(self.watermark(), 8)
+
+        self.neo4j.driver.fail_at = None
+        self.assertEqual(self.neo4j.load_data_from_sqlite(self.db_path), 2)
+        self.assertEqual(self.neo4j.driver.batches[-1], [9, 10])
+
+    def test_each_target_keeps_its_own_watermark(self):
+        self.neo4j.load_data_from_sqlite(self.db_path)
+        other = stand_in_neo4j_manager(batch_size=4)
+        other.uri = 'bolt://replica:7687'
+        self.assertEqual(other.load_data_from_sqlite(self.db_path), 10)
+        other.close()
+
+
+class BatchedWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.neo4j = stand_in_neo4j_manager(batch_size=4)
+        self.neo4j.driver = FailingDriver()
+        self.neo4j.retry_backoff = 0.001
+
+    def tearDown(self):
+        self.neo4j.close()
+
+    def rows(self, count):
+        return [self.neo4j._row_params((i, f"u{i}", 'Deodorant', f"feature {i}", 'Product-Feature', 'Related To',
+                                        'Positive', 'Dove', 'Beauty', None, f"review {i}", 5.0))
+                for i in range(1, count + 1)]
+
+    def test_rows_are_written_in_batches_of_batch_size(self):
+        self.assertEqual(self.neo4j.write_rows(iter(self.rows(10))), 10)
+        self.assertEqual(self.neo4j.driver.batches, [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]])
+        self.assertEqual(self.neo4j.write_rows(self.rows(3), batch_size=2), 3)
+        self.assertEqual(self.neo4j.driver.batches[-2:], [[1, 2], [3]])
+        self.assertEqual(self.neo4j.last_load_stats['rows'], 3)
+
+    def test_row_params_key_entities_by_scope(self):
+        row = self.rows(1)[0]
+        self.assertEqual(row['sub_category'], 'Unknown')
+        self.assertEqual(row['entity1_key'], 'deodorant|dove|beauty|unknown')
+        self.neo4j.write_rows(self.rows(3))
+        # The same entity in three rows is one node
+        self.assertEqual(len(self.neo4j.driver.entities), 4)
+
+    def test_transient_errors_are_retried(self):
+        self.neo4j.driver.transient_failures = 2
+        self.assertEqual(self.neo4j.write_rows(self.rows(4)), 4)
+        self.assertEqual(self.neo4j.driver.batches, [[1, 2, 3, 4]])
+
+    def test_gives_up_after_max_retries(self):
+        self.neo4j.driver.transient_failures = self.neo4j.max_retries + 1
+        with self.assertRaises(TransientError):
+            self.neo4j.write_rows(self.rows(4))
+        self.assertEqual(self.neo4j.driver.batches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
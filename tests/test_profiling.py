@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import RequestProfiler, StackSampler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_app(profiler):
+    app = Flask(__name__)
+
+    @app.route('/graph')
+    def show_graph():
+        busy(0.05)
+        return 'graph'
+
+    @app.route('/other')
+    def other():
+        busy(0.01)
+        return 'other'
+
+    @app.route('/fail')
+    def fail():
+        busy(0.02)
+        raise RuntimeError("boom")
+
+    profiler.install(app)
+    return app
+
+
+class RequestProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def profiler(self, **options):
+        return RequestProfiler(self.tmp.name, interval=0.001, **options)
+
+    def outputs(self):
+        return sorted(os.listdir(self.tmp.name)) if os.path.isdir(self.tmp.name) else []
+
+    def test_disabled_profiler_registers_no_hooks(self):
+        app = make_app(self.profiler())
+        self.assertEqual(app.before_request_funcs, {})
+        self.assertEqual(app.after_request_funcs, {})
+        response = app.test_client().get('/graph', headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Output', response.headers)
+        self.assertEqual(self.outputs(), [])
+
+    def test_only_allowed_endpoints_that_ask_are_profiled(self):
+        client = make_app(self.profiler(allowed_endpoints={'show_graph'})).test_client()
+        self.assertNotIn('X-Profile-Output', client.get('/graph').headers)
+        self.assertNotIn('X-Profile-Output', client.get('/other?profile=1').headers)
+        self.assertEqual(self.outputs(), [])
+
+        name = client.get('/graph?profile=1').headers['X-Profile-Output']
+        self.assertEqual(self.outputs(), [name])
+        with open(os.path.join(self.tmp.name, name)) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any('show_graph' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_token_must_match(self):
+        client = make_app(self.profiler(allowed_endpoints={'show_graph'}, token='secret')).test_client()
+        self.assertNotIn('X-Profile-Output', client.get('/graph', headers={'X-Profile': '1'}).headers)
+        self.assertIn('X-Profile-Output', client.get('/graph', headers={'X-Profile': 'secret'}).headers)
+
+    def test_speedscope_output_and_failed_requests(self):
+        client = make_app(self.profiler(allowed_endpoints={'show_graph', 'fail'}, output_format='speedscope')).test_client()
+        name = client.get('/graph?profile=1').headers['X-Profile-Output']
+        with open(os.path.join(self.tmp.name, name)) as f:
+            profile = json.load(f)['profiles'][0]
+        self.assertEqual(profile['type'], 'sampled')
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+
+        response = client.get('/fail?profile=1')
+        self.assertEqual(response.status_code, 500)
+        # Flask sends error pages as iterables, so the profile is written when the server closes the response
+        response.close()
+        self.assertEqual(len(self.outputs()), 2)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RequestProfiler(self.tmp.name, output_format='pprof')
+
+
+class StackSamplerTest(unittest.TestCase):
+    def test_samples_the_calling_thread(self):
+        sampler = StackSampler(interval=0.001).start()
+        busy(0.05)
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertEqual(sum(sampler.stacks.values()), sampler.samples)
+        self.assertTrue(any(frame[0] == 'busy' for stack in sampler.stacks for frame in stack))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_relation_classifier import legacy_classify_relation, synthetic_entities
+from relation_classifier import DEFAULT_RELATION, RELATION_RULES, classify_relation, classify_relations
+
+
+class RelationClassifierTest(unittest.TestCase):
+    def test_matches_the_legacy_if_chain_on_synthetic_phrases(self):
+        entity2 = synthetic_entities(20000, 2000, seed=7)
+        expected = [legacy_classify_relation({'entity2': value}) for value in entity2]
+        self.assertEqual([classify_relation(value) for value in entity2], expected)
+        self.assertEqual(classify_relations(entity2).tolist(), expected)
+
+    def test_every_keyword_alone_and_in_pairs(self):
+        keywords = [keyword for _, rule_keywords in RELATION_RULES for keyword in rule_keywords]
+        phrases = keywords + [f"{first} and {second}".upper() for first in keywords for second in keywords]
+        for phrase in phrases:
+            with self.subTest(phrase=phrase):
+                self.assertEqual(classify_relation(phrase), legacy_classify_relation({'entity2': phrase}))
+
+    def test_overlapping_keywords_pick_the_higher_priority_rule(self):
+        # 'dislike' contains 'like', and 'not recommend' contains 'recommend'
+        self.assertEqual(classify_relation('I dislike it'), 'Liked By')
+        self.assertEqual(classify_relation('would not recommend'), 'Liked By')
+        self.assertEqual(classify_relation('recommended'), 'Liked By')
+        self.assertEqual(classify_relation('hate the smell'), 'Has Scent')
+        self.assertEqual(classify_relation('hate it'), 'Disliked By')
+        self.assertEqual(classify_relation('avoid this one'), 'Not Recommended By')
+        self.assertEqual(classify_relation('long-lasting scent'), 'Has Scent')
+        self.assertEqual(classify_relation('packaging'), DEFAULT_RELATION)
+
+    def test_series_keeps_its_index_and_empty_strings(self):
+        entity2 = pd.Series(['Fragrance', '', 'travel size', 'Fragrance'], index=[10, 11, 12, 13])
+        labels = classify_relations(entity2)
+        self.assertEqual(labels.index.tolist(), [10, 11, 12, 13])
+        self.assertEqual(labels.tolist(), ['Has Scent', DEFAULT_RELATION, 'Used For', 'Has Scent'])
+
+
+if __name__ == "__main__":
+    unittest.main()
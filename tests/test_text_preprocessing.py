@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+import unittest
+import nltk
+import pandas as pd
+from nltk.tokenize import word_tokenize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_preprocessing import CONTRACTION_SPLITS, TextPreprocessor, fast_preprocess, fast_tokenize
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'amazon_com-product_reviews__20200101_20200331_sample.csv')
+
+STOP_WORDS = {'the', 'a', 'it', 'is', 'not', 'and', 'i', 'this', 'to', 'of', 'can', 'na'}
+
+EDGE_CASES = [
+    '',
+    '   ',
+    "I cannot believe it's not butter!!",
+    'Gonna wanna gotta gimme lemme CANNOT',
+    'cannotbe cannot_ x_cannot',
+    'snake_case and__double under_scores_',
+    '100% worth $12.99 -- 5/5 stars...',
+    'Café crème brûlée, naïve façade',
+    'ÉTÉ straße İstanbul',
+    'tabs\tand\nnewlines\r\nmixed',
+    '"quoted" (parens) [brackets] {braces}',
+    "doesn't won't y'all o'clock",
+    '日本語のレビュー 最高',
+    'emoji 😀 smells 👍 great',
+    None,
+    12345,
+]
+
+
+def legacy_clean(text):
+    return re.sub(r'\s+', ' ', re.sub(r'\W', ' ', str(text))).lower()
+
+
+def legacy_preprocess(text, stop_words):
+    # clean_text followed by tokenize_text, with the Treebank tokenizer run on the
+    # whole line (clean_text output has no sentence punctuation for Punkt to split on)
+    cleaned = legacy_clean(text)
+    return ' '.join(word for word in word_tokenize(cleaned, preserve_line=True) if word not in stop_words)
+
+
+class FastTokenizeTest(unittest.TestCase):
+    def test_matches_word_tokenize_on_edge_cases(self):
+        for text in EDGE_CASES + list(CONTRACTION_SPLITS):
+            cleaned = legacy_clean(text)
+            with self.subTest(text=text):
+                self.assertEqual(fast_tokenize(cleaned), word_tokenize(cleaned, preserve_line=True))
+                self.assertEqual(fast_preprocess(text, STOP_WORDS), legacy_preprocess(text, STOP_WORDS))
+
+    def test_matches_word_tokenize_on_the_sample_reviews(self):
+        df = pd.read_csv(SAMPLE_CSV, usecols=['Review Title', 'Review Content'], dtype=str)
+        texts = (df['Review Title'].fillna('') + ' ' + df['Review Content'].fillna('')).tolist()
+        self.assertEqual([fast_preprocess(text, STOP_WORDS) for text in texts],
+                         [legacy_preprocess(text, STOP_WORDS) for text in texts])
+
+
+class TextPreprocessorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            nltk.data.find('corpora/stopwords')
+        except LookupError:
+            raise unittest.SkipTest("NLTK stopwords are not installed")
+        cls.text_preprocessor = TextPreprocessor()
+
+    def test_batch_matches_preprocess_serial_and_parallel(self):
+        texts = [str(text) for text in EDGE_CASES] * 10
+        expected = [self.text_preprocessor.preprocess(text) for text in texts]
+        self.assertEqual(expected, [legacy_preprocess(text, self.text_preprocessor.stop_words) for text in texts])
+        self.assertEqual(self.text_preprocessor.preprocess_batch(texts, workers=1), expected)
+        self.assertEqual(self.text_preprocessor.preprocess_batch(texts, workers=2, chunk_size=7, parallel_threshold=0),
+                         expected)
+
+
+if __name__ == "__main__":
+    unittest.main()